@@ -6,7 +6,7 @@ import argparse
 
 from ansiblite import constants as C
 from ansiblite.test.module import run_test
-from ansiblite.runners import run_playbooks
+from ansiblite.runners import run_playbooks, run_agent
 
 
 __version__ = '0.0.1'
@@ -16,6 +16,7 @@ ANSIBLITE_USAGE = '''ansiblite <command> [<args>]
 The list of commands:
    test        testing Ansiblite modules
    playbook    run playbook
+   agent       run the workers of remote controllers
 '''
 
 
@@ -85,6 +86,9 @@ class Ansiblite(object):
         parser.add_argument('--syntax-check', dest='syntax',
                             action='store_true',
                             help="perform a syntax check on the playbook, but do not execute it")
+        parser.add_argument('--resume', dest='resume',
+                            action='store_true',
+                            help="resume the run from the checkpoint a previous run left (see checkpoint_path)")
         parser.add_argument('-M', '--module-path', dest='module_path',
                             default=None,
                             help="specify path(s) to module library (default=%s)" % C.DEFAULT_MODULE_PATH,
@@ -97,3 +101,14 @@ class Ansiblite(object):
             sys.exit(1)
 
         run_playbooks(args.module_playbook, options=args)
+
+    def agent(self):
+
+        parser = argparse.ArgumentParser(usage=ANSIBLITE_USAGE,
+                                         description='run the workers of controllers using the remote execution engine')
+        parser.add_argument('-l', '--listen', dest='listen',
+                            required=True,
+                            help="the host:port address to listen on, the key being set with ANSIBLE_REMOTE_AUTHKEY")
+        args = parser.parse_args(sys.argv[2:])
+
+        run_agent(args.listen)
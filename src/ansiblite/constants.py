@@ -234,7 +234,35 @@ DEFAULT_LOG_PATH          = get_config(p, DEFAULTS, 'log_path',           'ANSIB
 DEFAULT_FORCE_HANDLERS    = get_config(p, DEFAULTS, 'force_handlers', 'ANSIBLE_FORCE_HANDLERS', False, value_type='boolean')
 DEFAULT_INVENTORY_IGNORE  = get_config(p, DEFAULTS, 'inventory_ignore_extensions', 'ANSIBLE_INVENTORY_IGNORE', ["~", ".orig", ".bak", ".ini", ".cfg", ".retry", ".pyc", ".pyo"], value_type='list')
 DEFAULT_VAR_COMPRESSION_LEVEL = get_config(p, DEFAULTS, 'var_compression_level', 'ANSIBLE_VAR_COMPRESSION_LEVEL', 0, value_type='integer')
+RESULT_COMPRESSION_THRESHOLD = get_config(p, DEFAULTS, 'result_compression_threshold', 'ANSIBLE_RESULT_COMPRESSION_THRESHOLD', 16384, value_type='integer')
+RESULT_OUT_OF_BAND_THRESHOLD = get_config(p, DEFAULTS, 'result_out_of_band_threshold', 'ANSIBLE_RESULT_OUT_OF_BAND_THRESHOLD', 1048576, value_type='integer')
 DEFAULT_INTERNAL_POLL_INTERVAL = get_config(p, DEFAULTS, 'internal_poll_interval', None, 0.001, value_type='float')
+DEFAULT_INTERNAL_WAIT_TIMEOUT = get_config(p, DEFAULTS, 'internal_wait_timeout', None, 1.0, value_type='float')
+DEFAULT_WORKER_SHUTDOWN_TIMEOUT = get_config(p, DEFAULTS, 'worker_shutdown_timeout', 'ANSIBLE_WORKER_SHUTDOWN_TIMEOUT', 5, value_type='float')
+DEFAULT_EXECUTION_ENGINE = get_config(p, DEFAULTS, 'execution_engine', 'ANSIBLE_EXECUTION_ENGINE', 'process')
+DEFAULT_CONTROLLER_THREADS = get_config(p, DEFAULTS, 'controller_threads', 'ANSIBLE_CONTROLLER_THREADS', 4, value_type='integer')
+DEFAULT_HOST_AFFINITY = get_config(p, DEFAULTS, 'host_affinity', 'ANSIBLE_HOST_AFFINITY', False, value_type='boolean')
+DEFAULT_FORKS_ADAPTIVE = get_config(p, DEFAULTS, 'forks_adaptive', 'ANSIBLE_FORKS_ADAPTIVE', False, value_type='boolean')
+DEFAULT_FORKS_MIN = get_config(p, DEFAULTS, 'forks_min', 'ANSIBLE_FORKS_MIN', 1, value_type='integer')
+DEFAULT_FORKS_MAX = get_config(p, DEFAULTS, 'forks_max', 'ANSIBLE_FORKS_MAX', 0, value_type='integer')
+DEFAULT_FORKS_ADJUST_INTERVAL = get_config(p, DEFAULTS, 'forks_adjust_interval', 'ANSIBLE_FORKS_ADJUST_INTERVAL', 5, value_type='float')
+DEFAULT_FORKS_MAX_LOAD = get_config(p, DEFAULTS, 'forks_max_load', 'ANSIBLE_FORKS_MAX_LOAD', 1.0, value_type='float')
+DEFAULT_ROLLING_SERIAL = get_config(p, DEFAULTS, 'rolling_serial', 'ANSIBLE_ROLLING_SERIAL', False, value_type='boolean')
+DEFAULT_WORKER_MEMORY_REPORT = get_config(p, DEFAULTS, 'worker_memory_report', 'ANSIBLE_WORKER_MEMORY_REPORT', False, value_type='boolean')
+DEFAULT_WORKER_FULL_GC_JOBS = get_config(p, DEFAULTS, 'worker_full_gc_jobs', 'ANSIBLE_WORKER_FULL_GC_JOBS', 100, value_type='integer')
+DEFAULT_REMOTE_AGENTS = get_config(p, DEFAULTS, 'remote_agents', 'ANSIBLE_REMOTE_AGENTS', [], value_type='list')
+DEFAULT_REMOTE_AUTHKEY = get_config(p, DEFAULTS, 'remote_authkey', 'ANSIBLE_REMOTE_AUTHKEY', None)
+DEFAULT_REMOTE_SHARDING = get_config(p, DEFAULTS, 'remote_sharding', 'ANSIBLE_REMOTE_SHARDING', 'hash')
+DEFAULT_CHECKPOINT_PATH = get_config(p, DEFAULTS, 'checkpoint_path', 'ANSIBLE_CHECKPOINT_PATH', None, value_type='path')
+DEFAULT_CHECKPOINT_INTERVAL = get_config(p, DEFAULTS, 'checkpoint_interval', 'ANSIBLE_CHECKPOINT_INTERVAL', 60, value_type='float')
+DEFAULT_RESULT_CACHE_PATH = get_config(p, DEFAULTS, 'result_cache_path', 'ANSIBLE_RESULT_CACHE_PATH', '~/.ansible/result_cache', value_type='path')
+DEFAULT_RESULT_CACHE_TIMEOUT = get_config(p, DEFAULTS, 'result_cache_timeout', 'ANSIBLE_RESULT_CACHE_TIMEOUT', 86400, value_type='integer')
+DEFAULT_COALESCE_DELEGATED = get_config(p, DEFAULTS, 'coalesce_delegated', 'ANSIBLE_COALESCE_DELEGATED', False, value_type='boolean')
+DEFAULT_ASYNC_POLL_THREADS = get_config(p, DEFAULTS, 'async_poll_threads', 'ANSIBLE_ASYNC_POLL_THREADS', 0, value_type='integer')
+DEFAULT_TEMPLATE_CACHE_SIZE = get_config(p, DEFAULTS, 'template_cache_size', 'ANSIBLE_TEMPLATE_CACHE_SIZE', 1000, value_type='integer')
+DEFAULT_TEMPLATE_BYTECODE_CACHE = get_config(p, DEFAULTS, 'template_bytecode_cache', 'ANSIBLE_TEMPLATE_BYTECODE_CACHE', '~/.ansible/tmp/jinja2_cache', value_type='path')
+DEFAULT_TEMPLATE_BYTECODE_CACHE_SIZE = get_config(p, DEFAULTS, 'template_bytecode_cache_size', 'ANSIBLE_TEMPLATE_BYTECODE_CACHE_SIZE', 64, value_type='integer')
+DEFAULT_TEMPLATE_FAST_PATH = get_config(p, DEFAULTS, 'template_fast_path', 'ANSIBLE_TEMPLATE_FAST_PATH', True, value_type='boolean')
 ERROR_ON_MISSING_HANDLER  = get_config(p, DEFAULTS, 'error_on_missing_handler', 'ANSIBLE_ERROR_ON_MISSING_HANDLER', True, value_type='boolean')
 SHOW_CUSTOM_STATS = get_config(p, DEFAULTS, 'show_custom_stats', 'ANSIBLE_SHOW_CUSTOM_STATS', False, value_type='boolean')
 
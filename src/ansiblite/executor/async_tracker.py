@@ -0,0 +1,276 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+import time
+import uuid
+
+from six import iteritems
+from six.moves import queue as Queue
+
+from ansiblite import constants as C
+from ansiblite.executor.task_result import TaskResult
+
+from ansiblite.utils.display import Display
+display = Display()
+
+__all__ = ['AsyncTracker', 'tracks_async_job']
+
+# Controller side tracking of async jobs.
+#
+# A task run with async and poll used to keep its worker for as long as its
+# job ran, most of it sleeping between two runs of async_status. With
+# async_poll_threads set, the worker returns as soon as the job is started,
+# tagging its result with _ansible_async_tracked, and the strategy hands the
+# job over to the tracker instead of processing that result.
+#
+# The tracker gathers the jobs running on each host (as the same user), and
+# polls them all at once every poll interval, with the async_poll action: a
+# single command reading the status files of all the jobs. The polls run on
+# a few threads of the controller, which always run the async_poll action.
+# Once a job is finished (or its time is up), its result is handed back to
+# the strategy as the result of the task, along with what the worker added
+# to the result it returned.
+#
+# Tasks whose result is evaluated again after the job is done (until,
+# changed_when and failed_when) and looped tasks are still polled by their
+# worker.
+
+# the keys of the result the worker returned which belong in the final one
+_KEPT_KEYS = ('_ansible_no_log', '_ansible_notify', '_ansible_delegated_vars', '_ansible_metrics')
+
+
+def tracks_async_job(task):
+    '''
+    Returns True if the job started by the given (post validated) task is
+    to be polled by the controller rather than by the worker.
+    '''
+
+    return C.DEFAULT_ASYNC_POLL_THREADS > 0 and task.async > 0 and task.poll > 0 and \
+        not task.loop and not task.until and not task.changed_when and not task.failed_when
+
+
+class _AsyncJob:
+
+    def __init__(self, task_result, task_vars, play_context):
+        tracked = task_result._result['_ansible_async_tracked']
+
+        self.host         = task_result._host
+        self.task         = task_result._task
+        self.task_vars    = task_vars
+        self.play_context = play_context
+        self.jid          = task_result._result['ansible_job_id']
+        self.poll         = tracked['poll']
+        self.deadline     = time.time() + tracked['timeout']
+        self.kept         = dict((k, task_result._result[k]) for k in _KEPT_KEYS if k in task_result._result)
+        self.status       = dict()
+
+
+class _PollGroup:
+
+    def __init__(self):
+        self.jobs      = []
+        self.next_poll = None
+        self.polling   = False
+
+
+class _PollResultQueue:
+    '''
+    Results queue of the threads running the polls, handing their results
+    to the tracker.
+    '''
+
+    def __init__(self, tracker):
+        self._tracker = tracker
+
+    def put(self, result, block=True, timeout=None):
+        self._tracker._poll_done(result)
+
+
+class AsyncTracker:
+    '''
+    Polls the async jobs left running by the workers, putting their final
+    results on the given queue.
+    '''
+
+    def __init__(self, loader, shared_loader_obj, final_q):
+        self._loader            = loader
+        self._shared_loader_obj = shared_loader_obj
+        self._final_q           = final_q
+
+        # the jobs, by host and user they run as, and the polls in flight
+        self._groups    = dict()
+        self._in_flight = dict()
+        self._lock      = threading.Condition(threading.Lock())
+        self._stopped   = False
+
+        self._poll_q    = Queue.Queue()
+        self._threads   = []
+        self._scheduler = None
+
+    def _start(self):
+        # imported here, as the workers import the executor
+        from ansiblite.executor.process.threads import WorkerThread
+        from ansiblite.executor.task_executor import AsyncPollExecutor
+
+        rslt_q = _PollResultQueue(self)
+        for i in range(C.DEFAULT_ASYNC_POLL_THREADS):
+            thread = WorkerThread(rslt_q, self._poll_q, self._loader, self._shared_loader_obj, executor_class=AsyncPollExecutor)
+            thread.start()
+            self._threads.append(thread)
+
+        self._scheduler = threading.Thread(target=self._schedule)
+        self._scheduler.daemon = True
+        self._scheduler.start()
+
+    def track(self, task_result, task_vars, play_context):
+        '''
+        Starts polling the job started by the task of the given result, the
+        task vars and play context being the ones it was run with.
+        '''
+
+        job = _AsyncJob(task_result, task_vars, play_context)
+        task = job.task
+        key = (job.host.name, task.delegate_to, task.remote_user, task.become, task.become_user)
+
+        self._lock.acquire()
+        try:
+            if self._scheduler is None:
+                self._start()
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _PollGroup()
+            group.jobs.append(job)
+            next_poll = time.time() + job.poll
+            if group.next_poll is None or next_poll < group.next_poll:
+                group.next_poll = next_poll
+            self._lock.notify_all()
+        finally:
+            self._lock.release()
+        display.debug("tracking async job %s of %s" % (job.jid, job.host.name))
+
+    def stop(self):
+        self._lock.acquire()
+        try:
+            self._stopped = True
+            self._lock.notify_all()
+        finally:
+            self._lock.release()
+
+        for thread in self._threads:
+            self._poll_q.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _schedule(self):
+        '''
+        Queues up the polls of the groups whose next poll is due.
+        '''
+
+        self._lock.acquire()
+        try:
+            while not self._stopped:
+                now = time.time()
+                wait = None
+                for (key, group) in iteritems(self._groups):
+                    if group.polling:
+                        continue
+                    if group.next_poll <= now:
+                        self._queue_poll(key, group)
+                    elif wait is None or group.next_poll - now < wait:
+                        wait = group.next_poll - now
+                self._lock.wait(wait)
+        finally:
+            self._lock.release()
+
+    def _queue_poll(self, key, group):
+        # must be called with self._lock held
+        first = group.jobs[0]
+
+        # the poll is run as the first job's task, so on the same host as
+        # the same user, with the async_poll action
+        poll_task = first.task.copy(exclude_tasks=True)
+        poll_task._uuid = uuid.uuid4()
+        poll_task.action = 'async_poll'
+        poll_task.args = dict(jids=[job.jid for job in group.jobs])
+        poll_task.async = 0
+        poll_task.loop = None
+        poll_task.when = []
+        poll_task.register = None
+        poll_task.notify = None
+        poll_task.memoize = None
+
+        group.polling = True
+        self._in_flight[poll_task._uuid] = key
+        self._poll_q.put((first.host, poll_task, first.task_vars, first.play_context))
+
+    def _poll_done(self, task_result):
+        '''
+        Updates the jobs polled with the given result, and hands back the
+        results of those which are done.
+        '''
+
+        final = []
+        now = time.time()
+
+        self._lock.acquire()
+        try:
+            key = self._in_flight.pop(task_result._task, None)
+            group = self._groups.get(key)
+            if group is None:
+                return
+
+            statuses = task_result._result.get('jobs')
+            if not isinstance(statuses, dict):
+                # the host could not be polled (eg. a network bounce or a
+                # reboot), which is not fatal as long as the jobs have time
+                display.vvvv("async poll of %s failed, retrying... (%s)" % (key[0], task_result._result.get('msg')))
+                statuses = dict()
+
+            running = []
+            for job in group.jobs:
+                if job.jid in statuses:
+                    job.status = statuses[job.jid]
+                result = self._final_result(job, now)
+                if result is None:
+                    running.append(job)
+                else:
+                    final.append(TaskResult(job.host.name, job.task._uuid, result))
+
+            group.polling = False
+            if running:
+                group.jobs = running
+                group.next_poll = now + min(job.poll for job in running)
+            else:
+                del self._groups[key]
+            self._lock.notify_all()
+        finally:
+            self._lock.release()
+
+        for result in final:
+            self._final_q.put(result)
+
+    def _final_result(self, job, now):
+        '''
+        Returns the final result of the given job if it is done (or out of
+        time), None otherwise.
+        '''
+
+        status = job.status
+        if int(status.get('finished', 0)) == 1 or ('failed' in status and status.get('_ansible_parsed', False)) or 'skipped' in status:
+            result = status.copy()
+            if result.get('rc', 0) != 0:
+                result['failed'] = True
+        elif now >= job.deadline:
+            if status.get('_ansible_parsed', True):
+                result = dict(failed=True, msg="async task did not complete within the requested time")
+            else:
+                result = dict(failed=True, msg="async task produced unparseable results", async_result=status)
+        else:
+            return None
+
+        if 'changed' not in result:
+            result['changed'] = False
+        result.update(job.kept)
+        return result
@@ -0,0 +1,315 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import errno
+import hashlib
+import os
+import time
+
+from io import BytesIO
+
+from six import iteritems
+from six.moves import cPickle as pickle
+
+from ansiblite import constants as C
+from ansiblite.errors import AnsibleError
+from ansiblite.playbook.block import Block
+from ansiblite.utils._text import to_bytes, to_native
+from ansiblite.utils.path import makedirs_safe
+
+from ansiblite.utils.display import Display
+display = Display()
+
+__all__ = ['Checkpoint']
+
+# Checkpoints of a playbook run.
+#
+# A checkpoint records where the run is, as the (playbook, play, serial batch)
+# position it is at, along with what the hosts carry from one play to the
+# next: the stats, the failed and unreachable hosts, and the facts and
+# variables set on them (including registered results). It is saved before
+# each batch is run, and while it runs, every checkpoint_interval seconds, at
+# a point where no task is running.
+#
+# The latter also hold the state of the play: the iterator's state of every
+# host, the notified handlers, the roles which have run and the hosts which
+# gathered facts. When resuming, the play is loaded and compiled again, which
+# rebuilds the same blocks and tasks in the same order (new uuids aside), so
+# the host states only refer to them by their position in that order. Only
+# the blocks the includes changed are saved in full.
+#
+# Checkpoints are written to a temporary file renamed over the previous one,
+# so a crash while saving leaves the last one intact.
+
+_VERSION = 1
+
+
+def _play_objects(iterator):
+    '''
+    Returns the blocks and tasks of the play, and its roles, in the order
+    the iterator compiled them.
+    '''
+
+    objects = []
+
+    def _walk(block):
+        objects.append(block)
+        for portion in (block.block, block.rescue, block.always):
+            for task in portion or []:
+                if isinstance(task, Block):
+                    _walk(task)
+                else:
+                    objects.append(task)
+
+    for block in iterator._blocks + iterator._play.handlers:
+        _walk(block)
+
+    roles = []
+    for role in iterator._play.get_roles():
+        for r in [role] + role.get_all_dependencies():
+            if not any(r is known for known in roles):
+                roles.append(r)
+
+    return (objects, roles)
+
+
+def _play_signature(objects):
+    '''
+    Identifies the compiled play, so that a checkpoint is not resumed on a
+    playbook which changed since.
+    '''
+
+    digest = hashlib.sha1()
+    for obj in objects:
+        if isinstance(obj, Block):
+            entry = u'block %d %d %d\n' % (len(obj.block or []), len(obj.rescue or []), len(obj.always or []))
+        else:
+            entry = u'%s %s %s\n' % (obj.__class__.__name__, obj.action, obj.get_name())
+        digest.update(to_bytes(entry, errors='surrogate_or_strict'))
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    '''
+    Saves the state of a run of the given playbooks to path, and restores
+    the one saved by a previous run of the same playbooks.
+
+    The position of the run (self.position) is kept up to date by the
+    playbook executor. Once a checkpoint is loaded, resume_from holds the
+    position it was saved at, which the earlier plays and batches are
+    skipped up to.
+    '''
+
+    def __init__(self, path, playbooks):
+        self.path = path
+        self.position = (0, 0, 0)
+        self.resume_from = None
+
+        self._playbooks = [os.path.realpath(p) for p in playbooks]
+        self._run_state = None
+        self._play_state = None
+        self._last_saved = time.time()
+
+    def load(self):
+        '''
+        Loads the checkpoint saved at path. Returns False if there is none.
+        '''
+
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+        except (IOError, OSError) as e:
+            if e.errno == errno.ENOENT:
+                return False
+            raise AnsibleError("Could not read the checkpoint %s: %s" % (self.path, to_native(e)))
+        except Exception as e:
+            raise AnsibleError("Could not read the checkpoint %s: %s" % (self.path, to_native(e)))
+
+        if data.get('version') != _VERSION:
+            raise AnsibleError("The checkpoint %s was saved by an incompatible version" % self.path)
+        if data.get('playbooks') != self._playbooks:
+            raise AnsibleError("The checkpoint %s was saved by a run of other playbooks" % self.path)
+
+        self.resume_from = self.position = data['position']
+        self._run_state = data['run']
+        self._play_state = data['play']
+        return True
+
+    def skips(self, *position):
+        '''
+        Returns True if the given (possibly partial) position comes before
+        the one the run resumes from.
+        '''
+
+        return self.resume_from is not None and position < self.resume_from[:len(position)]
+
+    def resuming(self):
+        '''
+        Returns True if the state of a play is still to be restored.
+        '''
+
+        return self._play_state is not None
+
+    def due(self):
+        return time.time() - self._last_saved >= C.DEFAULT_CHECKPOINT_INTERVAL
+
+    def save(self, tqm, iterator=None):
+        '''
+        Saves the state of the run at the current position, along with the
+        state of its play if the iterator is given. No task may be running,
+        so that every host resumes at its next task.
+        '''
+
+        makedirs_safe(os.path.dirname(os.path.abspath(self.path)))
+        tmp_path = '%s.tmp' % self.path
+        try:
+            data = dict(
+                version   = _VERSION,
+                playbooks = self._playbooks,
+                position  = self.position,
+                run       = self._dump_run(tqm),
+                play      = None,
+            )
+            if iterator is not None:
+                data['play'] = self._dump_play(tqm, iterator)
+
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_path, self.path)
+        except (IOError, OSError, TypeError, pickle.PicklingError) as e:
+            display.warning("Could not save the checkpoint %s: %s" % (self.path, to_native(e)))
+        else:
+            display.debug("saved checkpoint at %s" % (self.position,))
+
+        self._last_saved = time.time()
+
+    def remove(self):
+        '''
+        Removes the checkpoint once the run is over.
+        '''
+
+        try:
+            os.unlink(self.path)
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                display.warning("Could not remove the checkpoint %s: %s" % (self.path, to_native(e)))
+
+    def _dump_run(self, tqm):
+        return dict(
+            stats       = tqm._stats.__dict__,
+            failed      = tqm._failed_hosts,
+            unreachable = tqm._unreachable_hosts,
+            host_data   = tqm.get_variable_manager().get_host_data(),
+        )
+
+    def restore_run(self, tqm):
+        '''
+        Restores the stats, the failed and unreachable hosts and the facts
+        and variables of the hosts from the loaded checkpoint.
+        '''
+
+        if self._run_state is None:
+            return
+
+        tqm._stats.__dict__.update(self._run_state['stats'])
+        tqm._failed_hosts.update(self._run_state['failed'])
+        tqm._unreachable_hosts.update(self._run_state['unreachable'])
+        tqm.get_variable_manager().restore_host_data(self._run_state['host_data'])
+        self._run_state = None
+
+    def _dump_play(self, tqm, iterator):
+        (objects, roles) = _play_objects(iterator)
+
+        # the objects the resumed run has too are referred to by position,
+        # everything else in the host states is saved by value
+        refs = dict()
+        for (idx, obj) in enumerate(objects):
+            refs[id(obj)] = ('object', idx)
+        for (idx, role) in enumerate(roles):
+            refs[id(role)] = ('role', idx)
+        refs[id(iterator._play)] = ('play', None)
+        refs[id(tqm.get_loader())] = ('loader', None)
+        refs[id(tqm.get_variable_manager())] = ('variable_manager', None)
+        refs[id(tqm.get_inventory())] = ('inventory', None)
+
+        handler_idx = dict()
+        for (idx, obj) in enumerate(objects):
+            handler_idx.setdefault(obj._uuid, idx)
+        notified = dict()
+        for (handler_uuid, hosts) in iteritems(tqm._notified_handlers):
+            if hosts and handler_uuid in handler_idx:
+                notified[handler_idx[handler_uuid]] = [h.name for h in hosts]
+
+        state = dict(
+            host_states   = iterator._host_states,
+            removed_hosts = iterator._play._removed_hosts,
+            notified      = notified,
+            roles         = [(role._had_task_run, role._completed) for role in roles],
+            gathered      = [h.name for h in tqm.get_inventory().get_hosts(iterator._play.hosts) if h._gathered_facts],
+        )
+
+        buf = BytesIO()
+        pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+        pickler.persistent_id = lambda obj: refs.get(id(obj))
+        pickler.dump(state)
+        return dict(signature=_play_signature(objects), state=buf.getvalue())
+
+    def restore_play(self, tqm, iterator):
+        '''
+        Puts the play back in the state saved by the loaded checkpoint, if
+        the position of the run is the one it was saved at.
+        '''
+
+        if self._play_state is None or self.position != self.resume_from:
+            return
+
+        data = self._play_state
+        self._play_state = None
+
+        (objects, roles) = _play_objects(iterator)
+        if data['signature'] != _play_signature(objects):
+            raise AnsibleError("The play changed since the checkpoint %s was saved, it cannot be resumed" % self.path)
+
+        shared = dict(
+            play             = iterator._play,
+            loader           = tqm.get_loader(),
+            variable_manager = tqm.get_variable_manager(),
+            inventory        = tqm.get_inventory(),
+        )
+
+        def _load_ref(ref):
+            (kind, idx) = ref
+            if kind == 'object':
+                return objects[idx]
+            elif kind == 'role':
+                return roles[idx]
+            return shared[kind]
+
+        unpickler = pickle.Unpickler(BytesIO(data['state']))
+        unpickler.persistent_load = _load_ref
+        state = unpickler.load()
+
+        iterator._host_states = state['host_states']
+        # the tasks brought in by includes are known by their original uuid
+        for host_state in iterator._host_states.values():
+            for block in host_state._blocks:
+                iterator.cache_block_tasks(block)
+        iterator._play._removed_hosts[:] = state['removed_hosts']
+
+        inventory = tqm.get_inventory()
+        for (idx, host_names) in iteritems(state['notified']):
+            hosts = [inventory.get_host(name) for name in host_names]
+            tqm._notified_handlers[objects[idx]._uuid] = [h for h in hosts if h is not None]
+
+        for (role, (had_task_run, completed)) in zip(roles, state['roles']):
+            role._had_task_run.update(had_task_run)
+            role._completed.update(completed)
+
+        for host_name in state['gathered']:
+            host = inventory.get_host(host_name)
+            if host is not None:
+                host.set_gathered_facts(True)
+
+        display.display("resuming the play from the checkpoint %s" % self.path)
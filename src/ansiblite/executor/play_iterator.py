@@ -273,6 +273,19 @@ class PlayIterator:
         return (s, task)
 
 
+    def set_state_for_host(self, host, state, task):
+        '''
+        Makes a state returned by get_next_task_for_host() with peek=True the
+        current state of the host, which is the same as getting the next task
+        again without peeking, provided nothing changed the host state since.
+        '''
+
+        if task is not None and state.run_state == self.ITERATING_SETUP:
+            # see _get_next_task_from_state(), the only task returned while
+            # in the setup state is the fact gathering one
+            host.set_gathered_facts(True)
+        self._host_states[host.name] = state
+
     def _get_next_task_from_state(self, state, host, peek, in_child=False):
 
         task = None
@@ -22,6 +22,8 @@ __metaclass__ = type
 import os
 
 from ansiblite import constants as C
+from ansiblite.errors import AnsibleError
+from ansiblite.executor.checkpoint import Checkpoint
 from ansiblite.executor.task_queue_manager import TaskQueueManager
 from ansiblite.utils._text import to_native, to_text
 
@@ -57,6 +59,22 @@ class PlaybookExecutor:
         else:
             self._tqm = TaskQueueManager(inventory=inventory, variable_manager=variable_manager, loader=loader, options=options, passwords=self.passwords)
 
+        # the run is saved to a checkpoint as it goes, and resumed from the
+        # one a previous run left with --resume
+        resume = getattr(options, 'resume', False)
+        self._checkpoint = None
+        if self._tqm is not None and C.DEFAULT_CHECKPOINT_PATH:
+            self._checkpoint = Checkpoint(C.DEFAULT_CHECKPOINT_PATH, playbooks)
+            if resume:
+                if self._checkpoint.load():
+                    self._checkpoint.restore_run(self._tqm)
+                    self._unreachable_hosts.update(self._tqm._unreachable_hosts)
+                else:
+                    display.warning("No checkpoint was found at %s, the run starts from the beginning" % C.DEFAULT_CHECKPOINT_PATH)
+            self._tqm._checkpoint = self._checkpoint
+        elif resume and self._tqm is not None:
+            raise AnsibleError("Resuming a run requires checkpoint_path (ANSIBLE_CHECKPOINT_PATH) to be set")
+
         # Note: We run this here to cache whether the default ansible ssh
         # executable supports control persist.  Sometime in the future we may
         # need to enhance this to check that ansible_ssh_executable specified
@@ -75,8 +93,13 @@ class PlaybookExecutor:
         result = 0
         entrylist = []
         entry = {}
+        # whether a play was broken off, which leaves the run unfinished
+        stopped = False
         try:
-            for playbook_path in self._playbooks:
+            for (playbook_idx, playbook_path) in enumerate(self._playbooks):
+                if self._checkpoint is not None and self._checkpoint.skips(playbook_idx):
+                    continue
+
                 pb = Playbook.load(playbook_path, variable_manager=self._variable_manager, loader=self._loader)
                 self._inventory.set_playbook_basedir(os.path.realpath(os.path.dirname(playbook_path)))
 
@@ -92,7 +115,10 @@ class PlaybookExecutor:
                 plays = pb.get_plays()
                 display.vv(u'%d plays in %s' % (len(plays), to_text(playbook_path)))
 
-                for play in plays:
+                for (play_idx, play) in enumerate(plays):
+                    if self._checkpoint is not None and self._checkpoint.skips(playbook_idx, play_idx):
+                        continue
+
                     if play._included_path is not None:
                         self._loader.set_basedir(play._included_path)
                     else:
@@ -140,8 +166,29 @@ class PlaybookExecutor:
                         previously_unreachable = len(self._tqm._unreachable_hosts)
 
                         break_play = False
+                        serialized_batches = self._get_serialized_batches(new_play)
+
+                        # rolling batches are all run at once, the strategy letting
+                        # the hosts of a batch in as those of the previous one are done
+                        if C.DEFAULT_ROLLING_SERIAL and len(serialized_batches) > 1:
+                            self._inventory.restrict_to_hosts([host for batch in serialized_batches for host in batch])
+                            self._save_checkpoint((playbook_idx, play_idx, 0))
+                            result = self._tqm.run(play=play, serial_batches=serialized_batches)
+
+                            # the strategy breaks the play as a serial run would, when a batch
+                            # is over the max fail percentage or has failed entirely
+                            if result & self._tqm.RUN_FAILED_BREAK_PLAY != 0:
+                                result = self._tqm.RUN_FAILED_HOSTS
+                                break_play = True
+
+                            self._unreachable_hosts.update(self._tqm._unreachable_hosts)
+                            serialized_batches = []
+
                         # we are actually running plays
-                        for batch in self._get_serialized_batches(new_play):
+                        for (batch_idx, batch) in enumerate(serialized_batches):
+                            if self._checkpoint is not None and self._checkpoint.skips(playbook_idx, play_idx, batch_idx):
+                                continue
+
                             if len(batch) == 0:
                                 self._tqm.send_callback('v2_playbook_on_play_start', new_play)
                                 self._tqm.send_callback('v2_playbook_on_no_hosts_matched')
@@ -149,6 +196,7 @@ class PlaybookExecutor:
 
                             # restrict the inventory to the hosts in the serialized batch
                             self._inventory.restrict_to_hosts(batch)
+                            self._save_checkpoint((playbook_idx, play_idx, batch_idx))
                             # and run it...
                             result = self._tqm.run(play=play)
 
@@ -177,6 +225,7 @@ class PlaybookExecutor:
                             self._unreachable_hosts.update(self._tqm._unreachable_hosts)
 
                         if break_play:
+                            stopped = True
                             break
 
                     i = i + 1  # per play
@@ -209,6 +258,11 @@ class PlaybookExecutor:
                 if result != 0:
                     break
 
+            # once every play ran to its end, there is nothing left to
+            # resume, otherwise the checkpoint is kept for --resume
+            if self._checkpoint is not None and result == 0 and not stopped and not self._tqm._terminated:
+                self._checkpoint.remove()
+
             if entrylist:
                 return entrylist
 
@@ -224,6 +278,20 @@ class PlaybookExecutor:
 
         return result
 
+    def _save_checkpoint(self, position):
+        '''
+        Moves the checkpoint to the batch about to be run, saving it unless
+        the run is resuming that very batch, whose saved state is still to
+        be restored.
+        '''
+
+        if self._checkpoint is None:
+            return
+
+        self._checkpoint.position = position
+        if not self._checkpoint.resuming():
+            self._checkpoint.save(self._tqm)
+
     def _get_serialized_batches(self, play):
         '''
         Returns a list of hosts, subdivided into batches based on
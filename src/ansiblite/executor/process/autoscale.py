@@ -0,0 +1,209 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import multiprocessing
+import os
+import time
+
+from ansiblite import constants as C
+
+from ansiblite.utils.display import Display
+display = Display()
+
+__all__ = ['ForkAutoscaler']
+
+# Adaptive fork count.
+#
+# The worker pool is sized for the upper bound (forks_max), and the autoscaler
+# decides how many of its workers the strategy may keep busy at once. The
+# decision is taken at most once every forks_adjust_interval seconds, from what
+# was measured over that window:
+#
+# - the load average of the controller, per CPU, and the CPU used by the
+#   controller process itself (which runs the strategy and the results thread)
+#   both shrink the limit when they are too high, as more workers would only
+#   make the controller slower at feeding them;
+# - the latency of each task, relative to the fastest host seen for the same
+#   task, shrinks the limit back when it went up after the last growth, ie.
+#   when the hosts or the network did not keep up with the extra concurrency;
+# - tasks having had to wait for a worker grow the limit, unless the workers
+#   are already busy on the CPU (measured from /proc, where available).
+#
+# Growth is additive and shrinking multiplicative, so the limit backs off
+# quickly and probes upwards slowly.
+
+# controller process and worker CPU use (as a fraction of one CPU) above
+# which more concurrency is not going to help
+_CPU_BUSY = 0.9
+
+# how much the relative task latency may grow after the limit was raised
+# before the growth is undone
+_LATENCY_TOLERANCE = 1.5
+
+
+def _cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def _load_average():
+    try:
+        return os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+
+
+def _process_cpu_time(pid):
+    '''
+    Returns the CPU time (user and system, in seconds) used so far by the
+    given process, or None if it cannot be read on this platform.
+    '''
+
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            stat = f.read()
+    except (IOError, OSError):
+        return None
+
+    # the command name may contain spaces, the fields we need come after it
+    fields = stat[stat.rfind(')') + 2:].split()
+    try:
+        return (int(fields[11]) + int(fields[12])) / float(os.sysconf('SC_CLK_TCK'))
+    except (IndexError, ValueError, OSError):
+        return None
+
+
+class ForkAutoscaler:
+    '''
+    Decides how many workers of the pool may be busy at once, within the
+    given bounds. Every change made is kept in self.adjustments.
+
+    Not thread safe, the strategy only uses it with its results lock held.
+    '''
+
+    def __init__(self, minimum, maximum, initial):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = max(self.minimum, min(initial, self.maximum))
+        self.adjustments = []
+
+        self._cpu_count = _cpu_count()
+
+        # the fastest latency seen for each task uuid
+        self._task_latency = dict()
+        # the relative latency measured before the last growth, which is
+        # None when the last decision was not a growth
+        self._latency_before_growth = None
+        # the CPU time of the workers, by pid
+        self._worker_cpu = dict()
+
+        self._start_window(time.time())
+
+    def _start_window(self, now):
+        self._window_start = now
+        self._window_cpu = sum(os.times()[:2])
+        self._waits = 0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+
+    def record_wait(self):
+        ''' Records that a task had to wait for a worker. '''
+        self._waits += 1
+
+    def record_latency(self, task_uuid, latency):
+        ''' Records the time it took a host to run the given task. '''
+
+        fastest = self._task_latency.get(task_uuid)
+        if fastest is None or latency < fastest:
+            self._task_latency[task_uuid] = fastest = latency
+        if fastest > 0:
+            self._latency_sum += latency / fastest
+        else:
+            self._latency_sum += 1.0
+        self._latency_count += 1
+
+    def _workers_cpu(self, pids, elapsed):
+        '''
+        Returns the average CPU use of the given worker processes over the
+        window, or None if it cannot be measured.
+        '''
+
+        if not pids:
+            return None
+
+        used = 0.0
+        worker_cpu = dict()
+        for pid in pids:
+            cpu_time = _process_cpu_time(pid)
+            if cpu_time is None:
+                return None
+            worker_cpu[pid] = cpu_time
+            used += cpu_time - self._worker_cpu.get(pid, 0.0)
+        self._worker_cpu = worker_cpu
+
+        return used / (elapsed * len(pids))
+
+    def due(self):
+        ''' Returns True once the current window is over. '''
+        return time.time() - self._window_start >= C.DEFAULT_FORKS_ADJUST_INTERVAL
+
+    def adjust(self, worker_pids=None):
+        '''
+        Reviews the limit once the current window is over, given the pids of
+        the workers in use (if they are processes). Returns the new limit if
+        it changed, None otherwise.
+        '''
+
+        now = time.time()
+        elapsed = now - self._window_start
+        if elapsed < C.DEFAULT_FORKS_ADJUST_INTERVAL:
+            return None
+
+        load = _load_average()
+        if load is not None:
+            load /= self._cpu_count
+        controller_cpu = (sum(os.times()[:2]) - self._window_cpu) / elapsed
+        workers_cpu = self._workers_cpu(worker_pids, elapsed)
+        latency = None
+        if self._latency_count:
+            latency = self._latency_sum / self._latency_count
+
+        new_limit = self.limit
+        reason = None
+        if load is not None and load > C.DEFAULT_FORKS_MAX_LOAD:
+            reason = 'controller load'
+        elif controller_cpu > _CPU_BUSY:
+            reason = 'controller cpu'
+        elif self._latency_before_growth is not None and latency is not None and latency > self._latency_before_growth * _LATENCY_TOLERANCE:
+            reason = 'host latency'
+        if reason is not None:
+            new_limit = max(self.minimum, self.limit * 3 // 4)
+        elif self._waits and (workers_cpu is None or workers_cpu < _CPU_BUSY):
+            reason = 'dispatch wait'
+            new_limit = min(self.maximum, self.limit + max(1, self.limit // 4))
+
+        if new_limit > self.limit:
+            self._latency_before_growth = latency
+        elif latency is not None:
+            self._latency_before_growth = None
+
+        changed = new_limit != self.limit
+        if changed:
+            display.debug("adjusting the number of forks from %d to %d (%s)" % (self.limit, new_limit, reason))
+            self.adjustments.append(dict(
+                time           = now,
+                old_forks      = self.limit,
+                new_forks      = new_limit,
+                reason         = reason,
+                waits          = self._waits,
+                load           = load,
+                controller_cpu = controller_cpu,
+                workers_cpu    = workers_cpu,
+                latency        = latency,
+            ))
+            self.limit = new_limit
+
+        self._start_window(now)
+        return new_limit if changed else None
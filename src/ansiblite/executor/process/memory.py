@@ -0,0 +1,104 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import gc
+
+from ansiblite import constants as C
+
+__all__ = ['freeze_heap', 'thaw_heap', 'setup_worker_gc', 'collect_worker_garbage', 'process_memory']
+
+# Keeping the controller's heap shared with the forked workers.
+#
+# The workers inherit the controller's memory copy-on-write, so pages are only
+# copied when written to. The cyclic garbage collector writes to the header of
+# every object it traverses, so a full collection in a worker ends up copying
+# most of the inventory, fact cache and parsed playbooks it inherited.
+#
+# Before forking, the controller runs a full collection so the workers start
+# with no garbage and every surviving object in the oldest generation. Where
+# the interpreter supports it (gc.freeze, Python 3.7+) those objects are also
+# moved to the permanent generation, which the collector never looks at, and
+# the workers keep collecting as usual. Otherwise the workers turn automatic
+# collection off and only collect the young generations between jobs: those
+# hold the objects the worker allocated itself, and collecting them never
+# traverses the inherited ones. The objects of the worker which live through
+# those collections end up in the oldest generation too, so a full collection
+# is still run every worker_full_gc_jobs jobs to free the cycles among them,
+# trading some shared pages for a bounded heap.
+
+
+def freeze_heap():
+    '''
+    Prepares the controller's heap for forking workers.
+    '''
+
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+def thaw_heap():
+    '''
+    Lets the controller collect the objects frozen by freeze_heap() again,
+    once the workers have been forked.
+    '''
+
+    if hasattr(gc, 'unfreeze'):
+        gc.unfreeze()
+
+
+def setup_worker_gc():
+    '''
+    Called in a worker right after the fork.
+    '''
+
+    if not hasattr(gc, 'freeze'):
+        gc.disable()
+
+
+def collect_worker_garbage(jobs):
+    '''
+    Called in a worker between two jobs, with the number of jobs it ran so
+    far, collects the garbage they left when automatic collection was
+    turned off.
+    '''
+
+    if not gc.isenabled():
+        if C.DEFAULT_WORKER_FULL_GC_JOBS > 0 and jobs % C.DEFAULT_WORKER_FULL_GC_JOBS == 0:
+            gc.collect()
+        else:
+            gc.collect(1)
+
+
+def process_memory(pid):
+    '''
+    Returns the memory of the given process, in kB, as a dict with its
+    resident set size (rss), its proportional set size (pss), and how much
+    of it is shared with other processes (shared) or private (private).
+    Returns None if it cannot be read on this platform (it relies on the
+    smaps of /proc).
+    '''
+
+    memory = dict(rss=0, pss=0, shared=0, private=0)
+    for path in ('/proc/%d/smaps_rollup' % pid, '/proc/%d/smaps' % pid):
+        try:
+            with open(path) as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 2:
+                        continue
+                    name = fields[0]
+                    if name == 'Rss:':
+                        memory['rss'] += int(fields[1])
+                    elif name == 'Pss:':
+                        memory['pss'] += int(fields[1])
+                    elif name in ('Shared_Clean:', 'Shared_Dirty:'):
+                        memory['shared'] += int(fields[1])
+                    elif name in ('Private_Clean:', 'Private_Dirty:'):
+                        memory['private'] += int(fields[1])
+            return memory
+        except (IOError, OSError):
+            continue
+        except ValueError:
+            return None
+    return None
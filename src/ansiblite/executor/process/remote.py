@@ -0,0 +1,273 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+import uuid
+import zlib
+
+from multiprocessing import AuthenticationError, Process, active_children
+from multiprocessing.connection import Client, Listener
+
+from six.moves import cPickle as pickle
+
+from ansiblite import constants as C
+from ansiblite.errors import AnsibleError
+from ansiblite.executor.process.worker import WorkerProcess
+from ansiblite.plugins import module_loader
+from ansiblite.utils._text import to_bytes
+
+from ansiblite.utils.display import Display
+display = Display()
+
+__all__ = ['parse_agents', 'dumps_setup', 'RemoteSession', 'RemoteJobQueue', 'RemoteWorker', 'serve']
+
+# Remote execution engine.
+#
+# The controller keeps the play iterator and the strategy, and its workers run
+# on agents (`ansiblite agent`), possibly on other machines. Every connection
+# is authenticated with the shared remote_authkey, and carries messages framed
+# and pickled by multiprocessing.connection.
+#
+# For each play, the controller opens a session on every agent: a connection
+# sending the tasks of the play, the inventory, the loader and the variable
+# manager, which the agent keeps for as long as the connection stays open.
+# Each worker slot then opens a connection of its own, for which the agent
+# forks a worker from that session, so the session is shared copy-on-write by
+# all the workers of the agent, just as the controller's memory is with the
+# process engine. Jobs and results go through the worker's connection in the
+# same wire format as with the process engine, task vars being sent as deltas
+# against the session's variable manager, and with every body inline as the
+# two ends do not share a tmp dir.
+
+
+def parse_address(spec):
+    '''
+    Parses a host:port address, the host defaulting to the loopback.
+    '''
+
+    (host, sep, port) = spec.rpartition(':')
+    if not sep or not port.isdigit():
+        raise AnsibleError("invalid agent address '%s', expected host:port" % spec)
+    return (host or '127.0.0.1', int(port))
+
+
+def parse_agents(specs):
+    '''
+    Parses the remote_agents setting, a list of [group@]host:port entries,
+    into a list of (group or None, address) tuples.
+    '''
+
+    agents = []
+    for spec in specs:
+        (group, sep, address) = spec.rpartition('@')
+        agents.append((group or None, parse_address(address)))
+    return agents
+
+
+def _authkey():
+    if not C.DEFAULT_REMOTE_AUTHKEY:
+        raise AnsibleError("the remote execution engine requires remote_authkey (ANSIBLE_REMOTE_AUTHKEY) to be set")
+    return to_bytes(C.DEFAULT_REMOTE_AUTHKEY, errors='surrogate_or_strict')
+
+
+def dumps_setup(task_cache, inventory, loader, variable_manager, module_paths):
+    '''
+    Pickles what the workers of a play are forked with, once for all the
+    agents.
+    '''
+
+    data = (task_cache, inventory, loader, variable_manager, module_paths)
+    return zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL), 1)
+
+
+def _loads_setup(data):
+    return pickle.loads(zlib.decompress(data))
+
+
+class RemoteSession:
+    '''
+    Controller side of the session opened on an agent for a play. The
+    versions of the variable manager and the inventory the session was built
+    from are the base of the task vars deltas sent to its workers.
+    '''
+
+    def __init__(self, address, setup, versions):
+        self.address = address
+        self.token = uuid.uuid4().hex
+        self.versions = versions
+
+        self._conn = Client(address, authkey=_authkey())
+        self._conn.send(('session', self.token))
+        self._conn.send_bytes(setup)
+        reply = self._conn.recv()
+        if reply != 'ok':
+            raise AnsibleError("the agent at %s:%d refused the session: %s" % (address[0], address[1], reply))
+
+    def close(self):
+        self._conn.close()
+
+
+class RemoteJobQueue:
+    '''
+    Job queue of a remote worker, sending the jobs put on it over the
+    connection of the worker it is bound to.
+    '''
+
+    def __init__(self):
+        self._conn = None
+
+    def bind(self, conn):
+        self._conn = conn
+
+    def put(self, job, block=True, timeout=None):
+        if self._conn is None:
+            raise IOError("the remote worker is not connected")
+        # the empty frame stands for the None sentinel
+        if job is None:
+            job = b''
+        self._conn.send_bytes(job)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class RemoteWorker(threading.Thread):
+    '''
+    Stands in for the worker of a slot with the remote engine: connects to
+    the agent of its session, which forks the actual worker, and forwards
+    the results it sends to the final results queue.
+    '''
+
+    def __init__(self, final_q, job_q, session):
+        super(RemoteWorker, self).__init__()
+        self.daemon = True
+
+        self._final_q = final_q
+        self._job_q   = job_q
+        self._session = session
+        self._conn    = None
+
+    def start(self):
+        self._conn = Client(self._session.address, authkey=_authkey())
+        self._conn.send(('worker', self._session.token))
+        self._job_q.bind(self._conn)
+        super(RemoteWorker, self).start()
+
+    def run(self):
+        while True:
+            try:
+                data = self._conn.recv_bytes()
+            except (IOError, EOFError, OSError):
+                break
+            self._final_q.put(data)
+        display.debug("connection to the remote worker on %s:%d closed" % self._session.address)
+
+
+class _ConnectionQueue:
+    '''
+    Agent side queue over a worker's connection, used by the worker as
+    both its job queue and its results queue.
+    '''
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def get(self):
+        data = self._conn.recv_bytes()
+        if not data:
+            return None
+        return data
+
+    def put(self, data, block=True, timeout=None):
+        self._conn.send_bytes(data)
+
+
+def _run_worker(conn, setup):
+    (task_cache, inventory, loader, variable_manager) = setup
+
+    # imported here, as the strategy plugins import the executor
+    from ansiblite.plugins.strategy import SharedPluginLoaderObj
+
+    queue = _ConnectionQueue(conn)
+    # the controller cannot read our tmp dir, so results are always inline
+    worker = WorkerProcess(queue, queue, task_cache, inventory, loader, variable_manager, SharedPluginLoaderObj(), out_of_band=False)
+    # we already are the forked process
+    worker.run()
+    conn.close()
+
+
+def _hold_session(conn, token, sessions):
+    # the controller never sends anything else, this returns once it
+    # closes the session
+    try:
+        conn.recv()
+    except (IOError, EOFError, OSError):
+        pass
+    display.debug("session %s closed" % token)
+    sessions.pop(token, None)
+    conn.close()
+
+
+def _open_session(conn, token, sessions):
+    (task_cache, inventory, loader, variable_manager, module_paths) = _loads_setup(conn.recv_bytes())
+    for path in module_paths:
+        module_loader.add_directory(path)
+    sessions[token] = (task_cache, inventory, loader, variable_manager)
+    conn.send('ok')
+
+    thread = threading.Thread(target=_hold_session, args=(conn, token, sessions))
+    thread.daemon = True
+    thread.start()
+    display.debug("session %s opened" % token)
+
+
+def _fork_worker(conn, token, sessions):
+    setup = sessions.get(token)
+    if setup is None:
+        display.warning("a worker was requested for the unknown session %s" % token)
+        conn.close()
+        return
+
+    worker = Process(target=_run_worker, args=(conn, setup))
+    worker.start()
+    # the worker has its own copy of the connection
+    conn.close()
+
+
+def serve(address):
+    '''
+    Runs an agent listening on the given (host, port) address, until it is
+    interrupted.
+    '''
+
+    listener = Listener(address, authkey=_authkey())
+    sessions = dict()
+    display.display("agent listening on %s:%d" % address)
+
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, IOError, EOFError) as e:
+                display.warning("rejected a connection: %s" % e)
+                continue
+
+            # reap the workers which exited since
+            active_children()
+
+            try:
+                (kind, token) = conn.recv()
+                if kind == 'session':
+                    _open_session(conn, token, sessions)
+                elif kind == 'worker':
+                    _fork_worker(conn, token, sessions)
+                else:
+                    display.warning("unknown request from the controller: %s" % kind)
+                    conn.close()
+            except (IOError, EOFError, ValueError, pickle.UnpicklingError) as e:
+                display.warning("error handling a connection: %s" % e)
+                conn.close()
+    finally:
+        listener.close()
@@ -0,0 +1,174 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import copy
+
+from io import BytesIO
+
+from six import iteritems
+from six.moves import cPickle as pickle
+
+from ansiblite.vars.hostvars import HostVars
+
+__all__ = ['TaskVarsSender', 'TaskVarsReceiver']
+
+# Task vars are sent to each worker as a delta against the vars it received
+# with its previous job.
+#
+# The base snapshot is the fork itself: a worker starts with a copy of the
+# controller's variable manager and inventory, so the facts and variables of
+# every host, and the hosts and groups added by add_host and group_by, are
+# only sent once they change, using the versions kept by the variable manager
+# and the inventory. The hostvars object is never pickled, both sides replace
+# it with a reference to their own.
+#
+# The top level task vars are sent one key at a time. A value which is the
+# very object last sent to that worker is skipped without being pickled, so
+# things like groups or ansible_play_hosts_all, which the controller builds
+# once for every host of a play, cost next to nothing; other values are
+# pickled and only sent if their pickle differs from the one last sent. The
+# vars key, a copy of all the other task vars, is rebuilt by the worker from
+# them instead of being sent.
+
+_HOSTVARS_ID = 'hostvars'
+
+# the key holding a copy of the other task vars, and what is sent for it
+_VARS_KEY = 'vars'
+_VARS_MIRROR = b''
+
+# values the executor changes in place two levels down (ie. the play context
+# sets connection defaults in the vars of the delegated host)
+_DEEP_KEYS = frozenset(['ansible_delegated_vars'])
+
+
+def _dumps(value):
+    buf = BytesIO()
+    pickler = pickle.Pickler(buf, pickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = _persistent_id
+    pickler.dump(value)
+    return buf.getvalue()
+
+
+def _persistent_id(obj):
+    if isinstance(obj, HostVars):
+        return _HOSTVARS_ID
+    return None
+
+
+def _mirrors_task_vars(task_vars):
+    mirror = task_vars.get(_VARS_KEY)
+    if not isinstance(mirror, dict) or len(mirror) != len(task_vars) - 1:
+        return False
+    for (key, value) in iteritems(mirror):
+        if key == _VARS_KEY or key not in task_vars or task_vars[key] is not value:
+            return False
+    return True
+
+
+class TaskVarsSender:
+    '''
+    Controller side record of the task vars held by one worker, used to
+    build the delta sent along with each of its jobs. The worker holds the
+    variable manager and the inventory as of the given versions, their
+    current ones by default.
+    '''
+
+    def __init__(self, variable_manager, inventory, versions=None):
+        self._variable_manager = variable_manager
+        self._inventory = inventory
+        if versions is None:
+            versions = (variable_manager.version, inventory.version)
+        (self._version, self._inventory_version) = versions
+        # key -> (value, pickled value) last sent
+        self._sent = dict()
+
+    def make_delta(self, task_vars):
+        '''
+        Returns the delta to send for the given task vars, and records them
+        as the ones now held by the worker.
+        '''
+
+        mirrored = _mirrors_task_vars(task_vars)
+        changed = dict()
+        for (key, value) in iteritems(task_vars):
+            if key == _VARS_KEY and mirrored:
+                value = _VARS_MIRROR
+            sent = self._sent.get(key)
+            if sent is not None and sent[0] is value:
+                continue
+            b_value = value if value is _VARS_MIRROR else _dumps(value)
+            if sent is None or sent[1] != b_value:
+                changed[key] = b_value
+            self._sent[key] = (value, b_value)
+
+        removed = [key for key in self._sent if key not in task_vars]
+        for key in removed:
+            del self._sent[key]
+
+        (self._inventory_version, inventory_changes) = self._inventory.get_changes(self._inventory_version)
+        (self._version, host_changes) = self._variable_manager.get_host_changes(self._version)
+        return (inventory_changes, host_changes, changed, removed)
+
+
+class TaskVarsReceiver:
+    '''
+    Worker side copy of the task vars, rebuilt from the deltas sent by the
+    matching TaskVarsSender.
+    '''
+
+    def __init__(self, inventory, variable_manager, loader):
+        self._inventory = inventory
+        self._variable_manager = variable_manager
+        self._hostvars = HostVars(inventory=inventory, variable_manager=variable_manager, loader=loader)
+        self._vars = dict()
+        self._mirrored = False
+
+    def _persistent_load(self, pid):
+        if pid != _HOSTVARS_ID:
+            raise pickle.UnpicklingError("unknown persistent id: %s" % pid)
+        return self._hostvars
+
+    def _loads(self, b_value):
+        unpickler = pickle.Unpickler(BytesIO(b_value))
+        unpickler.persistent_load = self._persistent_load
+        return unpickler.load()
+
+    def apply_delta(self, delta):
+        '''
+        Applies a delta built by TaskVarsSender.make_delta() and returns the
+        resulting task vars, as a copy the caller is free to modify: the
+        dicts and lists they hold are copied as well, one level down (two for
+        the ones in _DEEP_KEYS), as far as the executor changes them.
+        '''
+
+        (inventory_changes, host_changes, changed, removed) = delta
+
+        if inventory_changes:
+            self._inventory.apply_changes(inventory_changes)
+        if host_changes:
+            self._variable_manager.apply_host_changes(host_changes)
+
+        for key in removed:
+            self._vars.pop(key, None)
+            if key == _VARS_KEY:
+                self._mirrored = False
+        for (key, b_value) in iteritems(changed):
+            if key == _VARS_KEY:
+                self._mirrored = b_value == _VARS_MIRROR
+                if self._mirrored:
+                    self._vars.pop(key, None)
+                    continue
+            self._vars[key] = self._loads(b_value)
+
+        task_vars = dict()
+        for (key, value) in iteritems(self._vars):
+            if isinstance(value, (dict, list)):
+                if key in _DEEP_KEYS and isinstance(value, dict):
+                    value = dict((k, copy.copy(v)) for (k, v) in iteritems(value))
+                else:
+                    value = copy.copy(value)
+            task_vars[key] = value
+
+        if self._mirrored:
+            task_vars[_VARS_KEY] = dict((k, v) for (k, v) in iteritems(task_vars) if k != _VARS_KEY)
+        return task_vars
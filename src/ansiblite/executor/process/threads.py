@@ -0,0 +1,65 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import sys
+import threading
+
+from ansiblite.executor.process.worker import JobRunner
+
+from ansiblite.utils.display import Display
+display = Display()
+
+__all__ = ['WorkerThread']
+
+
+class WorkerThread(JobRunner, threading.Thread):
+    '''
+    Worker of the thread execution engine, running jobs in a thread of the
+    controller instead of a forked process. Tasks which mostly wait on their
+    connection release the GIL while doing so, which lets a single controller
+    keep far more hosts in flight than it could fork processes for.
+
+    Jobs are passed as objects rather than pickled, so each one is run on
+    private copies of the task, task vars and play context, which the
+    executor modifies.
+    '''
+
+    _usage_scope = 'thread'
+
+    def __init__(self, rslt_q, job_q, loader, shared_loader_obj, keep_connections=False, executor_class=None):
+
+        super(WorkerThread, self).__init__()
+        self.daemon = True
+
+        self._rslt_q            = rslt_q
+        self._job_q             = job_q
+        self._loader            = loader
+        self._shared_loader_obj = shared_loader_obj
+        self._new_stdin         = sys.stdin
+
+        # with host affinity, the connections of the hosts pinned to this
+        # worker are kept open from one task to the next
+        if keep_connections:
+            self._connections = dict()
+        else:
+            self._connections = None
+
+        if executor_class is not None:
+            self._executor_class = executor_class
+
+    def run(self):
+        '''
+        Reads jobs off the job queue until the None sentinel is received,
+        running each one and pushing its result onto the results queue.
+        '''
+
+        while True:
+            job = self._job_q.get()
+            if job is None:
+                break
+
+            (host, task, task_vars, play_context) = job
+            self._run_job(host, task.copy(exclude_tasks=True), task_vars.copy(), play_context.copy())
+
+        self._close_connections()
+        display.debug("WORKER THREAD EXITING")
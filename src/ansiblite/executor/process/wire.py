@@ -0,0 +1,200 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import struct
+import tempfile
+import time
+import uuid
+import zlib
+
+from six.moves import cPickle as pickle
+
+from ansiblite import constants as C
+from ansiblite.errors import AnsibleError
+from ansiblite.executor.task_result import TaskResult
+from ansiblite.utils._text import to_bytes, to_text
+
+__all__ = ['ResultQueue', 'encode_job', 'decode_job', 'encode_result', 'decode_result', 'benchmark']
+
+# Compact wire format used between the controller and its worker processes.
+#
+# Every message is a single byte string made of a fixed header followed by a
+# pickled body. The header carries a format version, so both sides can refuse
+# frames they do not understand, and flags describing how the body is stored:
+# bodies above RESULT_COMPRESSION_THRESHOLD are zlib compressed, and bodies
+# above RESULT_OUT_OF_BAND_THRESHOLD are written to a file in the local tmp
+# dir (which the workers inherit) so only the path goes through the pipe.
+# That tmp dir is not shared with the agents of the remote engine, so their
+# messages are always sent inline.
+#
+# Task results are not sent as pickled TaskResult objects; the header carries
+# the host name and the 16 bytes of the task uuid, and the body only holds the
+# result dictionary.
+
+WIRE_VERSION     = 1
+
+FLAG_COMPRESSED  = 1
+FLAG_OUT_OF_BAND = 2
+
+# version, flags
+_JOB_HEADER    = struct.Struct('!BB')
+# version, flags, task uuid, host name length
+_RESULT_HEADER = struct.Struct('!BB16sH')
+
+# keys only used by callbacks at higher verbosity levels
+_VERBOSE_ONLY_KEYS = frozenset(['invocation'])
+
+
+def _pack_body(data, compression_level, out_of_band=True):
+    flags = 0
+    body = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+    if compression_level > 0 and len(body) > C.RESULT_COMPRESSION_THRESHOLD:
+        body = zlib.compress(body, compression_level)
+        flags |= FLAG_COMPRESSED
+
+    if out_of_band and C.RESULT_OUT_OF_BAND_THRESHOLD > 0 and len(body) > C.RESULT_OUT_OF_BAND_THRESHOLD:
+        (fd, path) = tempfile.mkstemp(prefix='wire-', dir=C.DEFAULT_LOCAL_TMP)
+        try:
+            os.write(fd, body)
+        finally:
+            os.close(fd)
+        body = to_bytes(path, errors='surrogate_or_strict')
+        flags |= FLAG_OUT_OF_BAND
+
+    return (flags, body)
+
+
+def _unpack_body(flags, body):
+    if flags & FLAG_OUT_OF_BAND:
+        path = to_text(body, errors='surrogate_or_strict')
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        finally:
+            os.unlink(path)
+
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+
+    return pickle.loads(body)
+
+
+def _check_version(version):
+    if version != WIRE_VERSION:
+        raise AnsibleError("unsupported worker wire format version %d (expected %d)" % (version, WIRE_VERSION))
+
+
+def encode_job(host, task, vars_delta, play_context, out_of_band=True):
+    '''
+    Encodes a job (host, task or task uuid, task vars delta and play context)
+    for a worker's job queue. Large jobs are only sent out of band if
+    out_of_band is set, ie. when the worker shares our local tmp dir.
+    '''
+
+    (flags, body) = _pack_body((host, task, vars_delta, play_context), C.DEFAULT_VAR_COMPRESSION_LEVEL, out_of_band)
+    return _JOB_HEADER.pack(WIRE_VERSION, flags) + body
+
+
+def decode_job(data):
+    '''
+    Decodes a job encoded by encode_job(), returning the tuple of
+    (host, task or task uuid, task vars delta, play context).
+    '''
+
+    (version, flags) = _JOB_HEADER.unpack_from(data)
+    _check_version(version)
+    return _unpack_body(flags, data[_JOB_HEADER.size:])
+
+
+def encode_result(task_result, keep_invocation=True, out_of_band=True):
+    '''
+    Encodes a worker side TaskResult, whose host and task are a host name and
+    a task uuid. Anything else is returned untouched, and is pickled by the
+    queue as usual. Large results are only sent out of band if out_of_band
+    is set.
+    '''
+
+    if not isinstance(task_result._task, uuid.UUID):
+        return task_result
+
+    result = task_result._result
+    if not keep_invocation and _VERBOSE_ONLY_KEYS.intersection(result):
+        result = dict((k, v) for (k, v) in result.items() if k not in _VERBOSE_ONLY_KEYS)
+
+    b_host = to_bytes(task_result._host, errors='surrogate_or_strict')
+    # results are compressed at the fastest level, as they are all decoded
+    # on the controller's single results thread
+    (flags, body) = _pack_body(result, 1, out_of_band)
+    return _RESULT_HEADER.pack(WIRE_VERSION, flags, task_result._task.bytes, len(b_host)) + b_host + body
+
+
+def decode_result(data):
+    '''
+    Decodes a frame built by encode_result() back into a TaskResult. Anything
+    which is not a byte string (ie. the results thread sentinel) is returned
+    as is.
+    '''
+
+    if not isinstance(data, bytes):
+        return data
+
+    (version, flags, b_uuid, host_len) = _RESULT_HEADER.unpack_from(data)
+    _check_version(version)
+    offset = _RESULT_HEADER.size
+    host_name = to_text(data[offset:offset + host_len], errors='surrogate_or_strict')
+    result = _unpack_body(flags, data[offset + host_len:])
+    return TaskResult(host_name, uuid.UUID(bytes=b_uuid), result)
+
+
+class ResultQueue:
+    '''
+    Wraps the final results queue on the worker side, so every TaskResult
+    put on it by the worker or the TaskExecutor is sent in the wire format,
+    large ones out of band unless out_of_band is False.
+    '''
+
+    def __init__(self, queue, out_of_band=True):
+        self._queue = queue
+        self._out_of_band = out_of_band
+        self.keep_invocation = True
+
+    def put(self, task_result, block=True, timeout=None):
+        self._queue.put(encode_result(task_result, keep_invocation=self.keep_invocation, out_of_band=self._out_of_band), block, timeout)
+
+
+def benchmark(return_data, rounds=1000):
+    '''
+    Compares sending the given result data as a pickled TaskResult (as the
+    workers used to) against the wire format, both carrying all of the data
+    (the invocation included, as kept at -vvv). Returns a dict with the size
+    in bytes and the encode plus decode time in microseconds per result for
+    both.
+    '''
+
+    task_result = TaskResult(u'localhost', uuid.uuid4(), return_data)
+
+    pickled = pickle.dumps(task_result, pickle.HIGHEST_PROTOCOL)
+    start = time.time()
+    for i in range(rounds):
+        pickle.loads(pickle.dumps(task_result, pickle.HIGHEST_PROTOCOL))
+    pickle_usec = (time.time() - start) * 1000000 / rounds
+
+    encoded = encode_result(task_result)
+    wire_bytes = len(encoded)
+    (version, flags, b_uuid, host_len) = _RESULT_HEADER.unpack_from(encoded)
+    if flags & FLAG_OUT_OF_BAND:
+        wire_bytes += os.path.getsize(encoded[_RESULT_HEADER.size + host_len:])
+    decode_result(encoded)
+    start = time.time()
+    for i in range(rounds):
+        decode_result(encode_result(task_result))
+    wire_usec = (time.time() - start) * 1000000 / rounds
+
+    return dict(
+        pickle_bytes=len(pickled),
+        pickle_usec=pickle_usec,
+        wire_bytes=wire_bytes,
+        wire_usec=wire_usec,
+    )
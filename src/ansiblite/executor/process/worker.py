@@ -22,6 +22,7 @@ __metaclass__ = type
 import multiprocessing
 import os
 import sys
+import time
 import traceback
 
 from jinja2.exceptions import TemplateNotFound
@@ -34,37 +35,173 @@ try:
 except ImportError:
     HAS_ATFORK=False
 
+HAS_RESOURCE=True
+try:
+    import resource
+except ImportError:
+    HAS_RESOURCE=False
+
+from ansiblite import constants as C
 from ansiblite.errors import AnsibleConnectionFailure
+from ansiblite.executor.process.memory import collect_worker_garbage, setup_worker_gc
+from ansiblite.executor.process.taskvars import TaskVarsReceiver
+from ansiblite.executor.process.wire import ResultQueue, decode_job
 from ansiblite.executor.task_executor import TaskExecutor
 from ansiblite.executor.task_result import TaskResult
+from ansiblite.playbook.task import Task
 from ansiblite.utils._text import to_text
 
 from ansiblite.utils.display import Display
 display = Display()
 
-__all__ = ['WorkerProcess']
+__all__ = ['JobRunner', 'WorkerProcess']
+
+
+def _resource_usage(scope):
+    '''
+    Returns the wall clock time, the CPU time used so far and the peak RSS
+    (in kB, or None where it cannot be read) of the current process, or of
+    the current thread where the platform can tell them apart.
+    '''
+
+    if not HAS_RESOURCE:
+        times = os.times()
+        return (time.time(), times[0] + times[1], None)
+
+    if scope == 'thread':
+        who = getattr(resource, 'RUSAGE_THREAD', resource.RUSAGE_SELF)
+    else:
+        who = resource.RUSAGE_SELF
+    usage = resource.getrusage(who)
+
+    max_rss = usage.ru_maxrss
+    if sys.platform == 'darwin':
+        # reported in bytes there
+        max_rss //= 1024
+    return (time.time(), usage.ru_utime + usage.ru_stime, max_rss)
+
+
+def _job_metrics(started, scope):
+    '''
+    Returns the resources used since the given _resource_usage() snapshot,
+    as sent along with the result of a task. The bytes it took to send the
+    result are added by the controller.
+    '''
+
+    (wall_time, cpu_time, max_rss) = _resource_usage(scope)
+    metrics = dict(
+        wall_time = wall_time - started[0],
+        cpu_time  = cpu_time - started[1],
+    )
+    if max_rss is not None and started[2] is not None:
+        metrics['max_rss_delta'] = max_rss - started[2]
+    return metrics
+
+
+class JobRunner:
+    '''
+    Mixin running a single job with TaskExecutor, used by the workers of
+    every execution engine. Expects the _rslt_q, _new_stdin, _loader,
+    _shared_loader_obj and _connections attributes to be set, the latter
+    being either None or the dict in which connections are kept open
+    between jobs (with host affinity).
+    '''
+
+    # whether the resources used by a job are measured for the whole
+    # process or for the thread running it
+    _usage_scope = 'process'
+
+    # what runs the jobs
+    _executor_class = TaskExecutor
+
+    def _run_job(self, host, task, task_vars, play_context):
+        '''
+        Runs a single task for a host and pushes the result onto the
+        results queue, along with the resources it used.
+        '''
+
+        started = _resource_usage(self._usage_scope)
+        try:
+            # execute the task and build a TaskResult from the result
+            display.debug("running TaskExecutor() for %s/%s" % (host, task))
+            executor_result = self._executor_class(
+                host,
+                task,
+                task_vars,
+                play_context,
+                self._new_stdin,
+                self._loader,
+                self._shared_loader_obj,
+                self._rslt_q,
+                connection_cache=self._connections,
+            ).run()
+
+            display.debug("done running TaskExecutor() for %s/%s" % (host, task))
+            executor_result['_ansible_metrics'] = _job_metrics(started, self._usage_scope)
+            task_result = TaskResult(host.name, task._uuid, executor_result)
+
+            # put the result on the result queue
+            display.debug("sending task result")
+            self._rslt_q.put(task_result)
+            display.debug("done sending task result")
+
+        except AnsibleConnectionFailure:
+            task_result = TaskResult(host.name, task._uuid, dict(unreachable=True, _ansible_metrics=_job_metrics(started, self._usage_scope)))
+            self._rslt_q.put(task_result, block=False)
 
+        except Exception as e:
+            if not isinstance(e, (IOError, EOFError, KeyboardInterrupt, SystemExit)) or isinstance(e, TemplateNotFound):
+                try:
+                    task_result = TaskResult(host.name, task._uuid, dict(failed=True, exception=to_text(traceback.format_exc()), stdout='',
+                                             _ansible_metrics=_job_metrics(started, self._usage_scope)))
+                    self._rslt_q.put(task_result, block=False)
+                except:
+                    display.debug(u"WORKER EXCEPTION: %s" % to_text(e))
+                    display.debug(u"WORKER TRACEBACK: %s" % to_text(traceback.format_exc()))
 
-class WorkerProcess(multiprocessing.Process):
+    def _close_connections(self):
+        '''
+        Closes the connections kept open between jobs.
+        '''
+
+        for connection in (self._connections or {}).values():
+            try:
+                connection.close()
+            except Exception as e:
+                display.debug(u"error closing connection: %s" % to_text(e))
+        self._connections = None
+
+
+class WorkerProcess(JobRunner, multiprocessing.Process):
     '''
-    The worker thread class, which uses TaskExecutor to run tasks
-    read from a job queue and pushes results into a results queue
-    for reading later.
+    The worker process class, which is started once per play and uses
+    TaskExecutor to run tasks read from its job queue, pushing results
+    into the shared results queue for reading later.
     '''
 
-    def __init__(self, rslt_q, task_vars, host, task, play_context, loader, variable_manager, shared_loader_obj):
+    def __init__(self, rslt_q, job_q, task_cache, inventory, loader, variable_manager, shared_loader_obj, out_of_band=True):
 
         super(WorkerProcess, self).__init__()
-        # takes a task queue manager as the sole param:
-        self._rslt_q            = rslt_q
-        self._task_vars         = task_vars
-        self._host              = host
-        self._task              = task
-        self._play_context      = play_context
+        # the final results queue (shared by all workers) and the job
+        # queue which only this worker reads from, large results being
+        # passed through the local tmp dir if out_of_band is set
+        self._rslt_q            = ResultQueue(rslt_q, out_of_band)
+        self._job_q             = job_q
+        # tasks known to the controller when this worker was forked,
+        # keyed by uuid, so they can be referenced instead of pickled
+        self._task_cache        = task_cache
+        self._inventory         = inventory
         self._loader            = loader
         self._variable_manager  = variable_manager
         self._shared_loader_obj = shared_loader_obj
 
+        # with host affinity, the connections of the hosts pinned to this
+        # worker are kept open from one task to the next
+        if C.DEFAULT_HOST_AFFINITY:
+            self._connections = dict()
+        else:
+            self._connections = None
+
         # dupe stdin, if we have one
         self._new_stdin = sys.stdin
         try:
@@ -83,9 +220,9 @@ class WorkerProcess(multiprocessing.Process):
 
     def run(self):
         '''
-        Called when the process is started.  Pushes the result onto the
-        results queue. We also remove the host from the blocked hosts list, to
-        signify that they are ready for their next task.
+        Called when the process is started. Reads jobs off the job queue
+        until the None sentinel is received, running each one and pushing
+        its result onto the results queue.
         '''
 
         #import cProfile, pstats, StringIO
@@ -95,47 +232,41 @@ class WorkerProcess(multiprocessing.Process):
         if HAS_ATFORK:
             atfork()
 
-        try:
-            # execute the task and build a TaskResult from the result
-            display.debug("running TaskExecutor() for %s/%s" % (self._host, self._task))
-            executor_result = TaskExecutor(
-                self._host,
-                self._task,
-                self._task_vars,
-                self._play_context,
-                self._new_stdin,
-                self._loader,
-                self._shared_loader_obj,
-                self._rslt_q
-            ).run()
+        # keep the collector off the objects inherited from the controller
+        setup_worker_gc()
 
-            display.debug("done running TaskExecutor() for %s/%s" % (self._host, self._task))
-            self._host.vars = dict()
-            self._host.groups = []
-            task_result = TaskResult(self._host.name, self._task._uuid, executor_result)
+        # built after the fork, as it binds a new HostVars to our copy of
+        # the variable manager
+        self._task_vars = TaskVarsReceiver(self._inventory, self._variable_manager, self._loader)
 
-            # put the result on the result queue
-            display.debug("sending task result")
-            self._rslt_q.put(task_result)
-            display.debug("done sending task result")
+        jobs = 0
+        while True:
+            try:
+                job = self._job_q.get()
+            except (IOError, EOFError, KeyboardInterrupt):
+                break
 
-        except AnsibleConnectionFailure:
-            self._host.vars = dict()
-            self._host.groups = []
-            task_result = TaskResult(self._host.name, self._task._uuid, dict(unreachable=True))
-            self._rslt_q.put(task_result, block=False)
+            if job is None:
+                break
 
-        except Exception as e:
-            if not isinstance(e, (IOError, EOFError, KeyboardInterrupt, SystemExit)) or isinstance(e, TemplateNotFound):
-                try:
-                    self._host.vars = dict()
-                    self._host.groups = []
-                    task_result = TaskResult(self._host.name, self._task._uuid, dict(failed=True, exception=to_text(traceback.format_exc()), stdout=''))
-                    self._rslt_q.put(task_result, block=False)
-                except:
-                    display.debug(u"WORKER EXCEPTION: %s" % to_text(e))
-                    display.debug(u"WORKER TRACEBACK: %s" % to_text(traceback.format_exc()))
+            (host, task, vars_delta, play_context) = decode_job(job)
+            if not isinstance(task, Task):
+                # the task was sent by reference, so make a private copy of
+                # our inherited one, as the executor modifies it in place
+                task = self._task_cache[task].copy(exclude_tasks=True)
+
+            task_vars = self._task_vars.apply_delta(vars_delta)
+
+            # results only carry the module invocation when it will be displayed
+            self._rslt_q.keep_invocation = play_context.verbosity >= 3
+
+            self._run_job(host, task, task_vars, play_context)
+
+            del task, task_vars
+            jobs += 1
+            collect_worker_garbage(jobs)
 
+        self._close_connections()
         display.debug("WORKER PROCESS EXITING")
 
         #pr.disable()
@@ -0,0 +1,94 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import errno
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from ansiblite import constants as C
+from ansiblite.utils._text import to_bytes, to_native, to_text
+from ansiblite.utils.path import makedirs_safe
+
+from ansiblite.utils.display import Display
+display = Display()
+
+__all__ = ['ResultStore', 'memo_key']
+
+# Memoized task results.
+#
+# Tasks which set `memoize` are taken to be pure functions of what they are
+# given: their final action and arguments, the host they run on (or are
+# delegated to), the connection and privilege escalation settings, and the
+# facts or variables they name as the state they depend on. The result of a
+# run which succeeded without changing anything is kept under the hash of all
+# of that, and the next run of the task with the same inputs returns it
+# instead of running the module again. Tasks with no_log are never memoized.
+#
+# The store is a directory on the controller, with one JSON file per result,
+# written to a temporary file renamed into place so that workers storing
+# results at the same time never see a partial one. Entries older than
+# result_cache_timeout seconds are ignored, and replaced when next stored.
+
+
+def memo_key(data):
+    '''
+    Returns the key of the result of a task given its inputs, which must
+    be JSON serializable (anything else is keyed by its text).
+    '''
+
+    b_data = to_bytes(json.dumps(data, sort_keys=True, default=to_text), errors='surrogate_or_strict')
+    return hashlib.sha1(b_data).hexdigest()
+
+
+class ResultStore:
+    '''
+    Stores the results of memoized tasks under the given directory.
+    '''
+
+    def __init__(self, path):
+        self._path = path
+
+    def _entry_path(self, key):
+        return os.path.join(self._path, key[:2], key)
+
+    def get(self, key):
+        '''
+        Returns the result stored under the given key, or None if there is
+        none or it expired.
+        '''
+
+        path = self._entry_path(key)
+        try:
+            if C.DEFAULT_RESULT_CACHE_TIMEOUT > 0 and time.time() - os.path.getmtime(path) > C.DEFAULT_RESULT_CACHE_TIMEOUT:
+                return None
+            with open(path, 'rb') as f:
+                return json.loads(to_text(f.read(), errors='surrogate_or_strict'))
+        except (IOError, OSError) as e:
+            if e.errno != errno.ENOENT:
+                display.debug("could not read the memoized result %s: %s" % (key, to_native(e)))
+        except ValueError as e:
+            display.debug("ignoring the corrupted memoized result %s: %s" % (key, to_native(e)))
+        return None
+
+    def put(self, key, result):
+        '''
+        Stores the given result under the given key.
+        '''
+
+        path = self._entry_path(key)
+        try:
+            b_data = to_bytes(json.dumps(result, sort_keys=True, default=to_text), errors='surrogate_or_strict')
+            makedirs_safe(os.path.dirname(path))
+            (fd, tmp_path) = tempfile.mkstemp(dir=os.path.dirname(path))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(b_data)
+                os.rename(tmp_path, path)
+            except:
+                os.unlink(tmp_path)
+                raise
+        except (IOError, OSError, TypeError, ValueError) as e:
+            display.warning("Could not store the memoized result %s: %s" % (key, to_native(e)))
@@ -36,6 +36,16 @@ class AggregateStats:
         # user defined stats, which can be per host or global
         self.custom = {}
 
+        # worker dispatch metrics, aggregated over the plays of the run
+        self.dispatch = {}
+
+        # changes made to the number of forks in adaptive mode
+        self.forks = []
+
+        # resources used by the tasks, per task (by uuid) and per host
+        self.task_metrics = {}
+        self.host_metrics = {}
+
     def increment(self, what, host):
         ''' helper function to bump a statistic '''
 
@@ -81,3 +91,39 @@ class AggregateStats:
         else:
             # let overloaded + take care of other types
             self.custom[host][which] += what
+
+    def update_dispatch_stats(self, stats):
+        ''' aggregate the worker dispatch metrics of a play '''
+
+        for (k, v) in stats.items():
+            if k not in self.dispatch:
+                self.dispatch[k] = v
+            elif k.startswith('max_'):
+                self.dispatch[k] = max(self.dispatch[k], v)
+            elif k.startswith('min_'):
+                self.dispatch[k] = min(self.dispatch[k], v)
+            else:
+                self.dispatch[k] += v
+
+    def record_forks_adjustments(self, adjustments):
+        ''' keep the changes made to the number of forks during a play '''
+
+        self.forks.extend(adjustments)
+
+    def update_task_metrics(self, host, task, metrics):
+        ''' aggregate the resources used by a task on a host '''
+
+        if task._uuid not in self.task_metrics:
+            self.task_metrics[task._uuid] = dict(name=task.get_name(), count=0)
+        if host not in self.host_metrics:
+            self.host_metrics[host] = dict(count=0)
+
+        for totals in (self.task_metrics[task._uuid], self.host_metrics[host]):
+            totals['count'] += 1
+            for (k, v) in metrics.items():
+                if k not in totals:
+                    totals[k] = v
+                elif k.startswith('max_'):
+                    totals[k] = max(totals[k], v)
+                else:
+                    totals[k] += v
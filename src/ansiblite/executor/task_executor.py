@@ -22,13 +22,18 @@ __metaclass__ = type
 import base64
 import subprocess
 import sys
+import threading
 import time
 import traceback
 
-from six import iteritems, string_types, binary_type
+from collections import deque
+
+from six import iteritems, reraise, string_types, binary_type
 
 from ansiblite import constants as C
 from ansiblite.errors import AnsibleError, AnsibleParserError, AnsibleUndefinedVariable, AnsibleConnectionFailure
+from ansiblite.executor.async_tracker import tracks_async_job
+from ansiblite.executor.result_store import ResultStore, memo_key
 from ansiblite.executor.task_result import TaskResult
 from ansiblite.utils._text import to_bytes, to_text
 from ansiblite.playbook.conditional import Conditional
@@ -45,6 +50,20 @@ display = Display()
 __all__ = ['TaskExecutor']
 
 
+class _SerializedQueue:
+    '''
+    Lets several threads put results on the results queue of the worker.
+    '''
+
+    def __init__(self, queue):
+        self._queue = queue
+        self._lock = threading.Lock()
+
+    def put(self, obj, block=True, timeout=None):
+        with self._lock:
+            self._queue.put(obj, block, timeout)
+
+
 class TaskExecutor:
 
     '''
@@ -58,7 +77,7 @@ class TaskExecutor:
     # the module
     SQUASH_ACTIONS = frozenset(C.DEFAULT_SQUASH_ACTIONS)
 
-    def __init__(self, host, task, job_vars, play_context, new_stdin, loader, shared_loader_obj, rslt_q):
+    def __init__(self, host, task, job_vars, play_context, new_stdin, loader, shared_loader_obj, rslt_q, connection_cache=None):
         self._host              = host
         self._task              = task
         self._job_vars          = job_vars
@@ -69,6 +88,12 @@ class TaskExecutor:
         self._connection        = None
         self._rslt_q            = rslt_q
         self._loop_eval_error   = None
+        # connections kept open by the worker between tasks, if any
+        self._connection_cache  = connection_cache
+        # where memoized results are kept, opened when first needed
+        self._result_store      = None
+        # the (item, args) of the loop items run in a single invocation
+        self._loop_batch        = None
 
         self._task.squash()
 
@@ -150,7 +175,8 @@ class TaskExecutor:
             return dict(failed=True, msg='Unexpected failure during module execution.', exception=to_text(traceback.format_exc()), stdout='')
         finally:
             try:
-                self._connection.close()
+                if self._connection_cache is None:
+                    self._connection.close()
             except AttributeError:
                 pass
             except Exception as e:
@@ -213,7 +239,7 @@ class TaskExecutor:
                 del self._job_vars[k]
 
         if items:
-            from ansible.vars.unsafe_proxy import UnsafeProxy
+            from ansiblite.vars.unsafe_proxy import UnsafeProxy
             for idx, item in enumerate(items):
                 if item is not None and not isinstance(item, UnsafeProxy):
                     items[idx] = UnsafeProxy(item)
@@ -241,11 +267,18 @@ class TaskExecutor:
         loop_var = 'item'
         label = None
         loop_pause = 0
+        loop_parallel = 1
         if self._task.loop_control:
             # the value may be 'None', so we still need to default it back to 'item'
             loop_var = self._task.loop_control.loop_var or 'item'
             label = self._task.loop_control.label or ('{{' + loop_var + '}}')
             loop_pause = self._task.loop_control.pause or 0
+            if self._task.loop_control.parallel:
+                templar = Templar(loader=self._loader, shared_loader_obj=self._shared_loader_obj, variables=task_vars)
+                try:
+                    loop_parallel = int(templar.template(self._task.loop_control.parallel))
+                except (TypeError, ValueError):
+                    raise AnsibleError("loop_control.parallel must be the number of items to run at once, got '%s'" % self._task.loop_control.parallel)
 
         if loop_var in task_vars:
             display.warning(u"The loop variable '%s' is already in use. "
@@ -254,6 +287,15 @@ class TaskExecutor:
 
         ran_once = False
         items = self._squash_items(items, loop_var, task_vars)
+
+        batch_size = 0
+        if not loop_pause:
+            batch_size = self._get_batch_size(task_vars)
+        if batch_size and len(items) > 1:
+            return self._run_batched_loop(items, batch_size, loop_var, label, task_vars)
+        if loop_parallel > 1 and not loop_pause and len(items) > 1:
+            return self._run_parallel_loop(items, loop_parallel, loop_var, label, task_vars)
+
         for item in items:
             task_vars[loop_var] = item
 
@@ -281,19 +323,249 @@ class TaskExecutor:
 
             # now update the result with the item info, and append the result
             # to the list of results
-            res[loop_var] = item
-            res['_ansible_item_result'] = True
+            self._add_item_result(results, res, item, loop_var, label)
+            del task_vars[loop_var]
 
-            if label is not None:
-                templar = Templar(loader=self._loader, shared_loader_obj=self._shared_loader_obj, variables=self._job_vars)
-                res['_ansible_item_label'] = templar.template(label)
+        return results
+
+    def _add_item_result(self, results, res, item, loop_var, label):
+        '''
+        Tags the result of a loop item with the item, sends it back and adds
+        it to the results of the loop. The loop variable must still be set
+        to the item.
+        '''
+
+        res[loop_var] = item
+        res['_ansible_item_result'] = True
+
+        if label is not None:
+            templar = Templar(loader=self._loader, shared_loader_obj=self._shared_loader_obj, variables=self._job_vars)
+            res['_ansible_item_label'] = templar.template(label)
+
+        self._rslt_q.put(TaskResult(self._host.name, self._task._uuid, res), block=False)
+        results.append(res)
+
+    def _run_parallel_loop(self, items, parallel, loop_var, label, task_vars):
+        '''
+        Runs the loop items on up to the given number of threads at once,
+        each item being run by a TaskExecutor of its own, with its own copy
+        of the task, play context and variables, and its own connection.
+        The results of the items are sent back in the order of the items,
+        each of them having retried on its own if the task has an until.
+        '''
+
+        results = []
+        count = len(items)
+        item_results = [None] * count
+        done = [threading.Event() for item in items]
+        pending = deque(range(count))
+        pending_lock = threading.Lock()
+
+        # the results of the attempts are sent by all the threads
+        rslt_q = _SerializedQueue(self._rslt_q)
+
+        def _run_item(idx):
+            item_vars = task_vars.copy()
+            item_vars[loop_var] = items[idx]
+            try:
+                item_task = self._task.copy(exclude_parent=True, exclude_tasks=True)
+                item_task._parent = self._task._parent
+                executor = TaskExecutor(self._host, item_task, item_vars, self._play_context.copy(), self._new_stdin,
+                                        self._loader, self._shared_loader_obj, rslt_q)
+            except AnsibleParserError as e:
+                return dict(failed=True, msg=to_text(e))
+
+            try:
+                return executor._execute(variables=item_vars)
+            finally:
+                if executor._connection is not None:
+                    try:
+                        executor._connection.close()
+                    except Exception as e:
+                        display.debug(u"error closing connection: %s" % to_text(e))
+
+        def _run_items():
+            while True:
+                with pending_lock:
+                    if not pending:
+                        return
+                    idx = pending.popleft()
+                try:
+                    item_results[idx] = (True, _run_item(idx))
+                except:
+                    item_results[idx] = (False, sys.exc_info())
+                done[idx].set()
+
+        threads = []
+        for i in range(min(parallel, count)):
+            thread = threading.Thread(target=_run_items)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        def _wait(event):
+            # without a timeout, the wait cannot be interrupted on python 2
+            while not event.wait(C.DEFAULT_INTERNAL_WAIT_TIMEOUT):
+                pass
 
-            self._rslt_q.put(TaskResult(self._host.name, self._task._uuid, res), block=False)
-            results.append(res)
+        def _add_result(idx, res):
+            task_vars[loop_var] = items[idx]
+            if 'ansible_facts' in res:
+                task_vars.update(res['ansible_facts'])
+            self._add_item_result(results, res, items[idx], loop_var, label)
             del task_vars[loop_var]
 
+        (self._rslt_q, rslt_q) = (rslt_q, self._rslt_q)
+        try:
+            for idx in range(count):
+                _wait(done[idx])
+                (ok, res) = item_results[idx]
+                if not ok:
+                    # as when running the items one by one, an error stops
+                    # the loop, once the items already running are done,
+                    # whose results are still sent back
+                    with pending_lock:
+                        pending.clear()
+                    for thread in threads:
+                        while thread.is_alive():
+                            thread.join(C.DEFAULT_INTERNAL_WAIT_TIMEOUT)
+                    for later in range(idx + 1, count):
+                        if item_results[later] is not None and item_results[later][0]:
+                            _add_result(later, item_results[later][1])
+                    reraise(*res)
+
+                _add_result(idx, res)
+        finally:
+            (self._rslt_q, rslt_q) = (rslt_q, self._rslt_q)
+
         return results
 
+    def _get_batch_size(self, variables):
+        '''
+        Returns how many loop items the action of the task takes in a single
+        invocation (-1 for all of them), or 0 if they are to be run one by
+        one.
+        '''
+
+        task = self._task
+        # everything evaluated per attempt or depending on the action run for
+        # each item has to be, and so do the actions which vary with the item
+        if task.until or task.changed_when or task.failed_when or task.async or task.memoize:
+            return 0
+
+        templar = Templar(loader=self._loader, shared_loader_obj=self._shared_loader_obj, variables=variables)
+        if templar._contains_vars(task.action):
+            return 0
+
+        return getattr(self._get_action_class(task.action), 'BATCH_ITEMS', 0)
+
+    def _run_batched_loop(self, items, batch_size, loop_var, label, task_vars):
+        '''
+        Runs the loop items in batches handed to the action plugin in one
+        invocation each (see ActionBase.run_batch()), and splits its results
+        back into the results of the items.
+
+        The task is templated for each item first: the items it skips are
+        not part of any batch, and a batch only holds items for which the
+        task runs on the same host, as the same user, and with the same
+        environment, as everything but the args is taken from its first one.
+        '''
+
+        results = []
+        batch = []
+        batch_settings = None
+        omit_token = task_vars.get('omit')
+
+        for item in items:
+            task_vars[loop_var] = item
+            templar = Templar(loader=self._loader, shared_loader_obj=self._shared_loader_obj, variables=task_vars)
+
+            item_task = self._task.copy(exclude_parent=True, exclude_tasks=True)
+            item_task._parent = self._task._parent
+            if not item_task.evaluate_conditional(templar, task_vars):
+                # the batch so far is run with its own items set
+                del task_vars[loop_var]
+                self._run_batch(batch, results, loop_var, label, task_vars)
+                batch = []
+                task_vars[loop_var] = item
+                res = dict(changed=False, skipped=True, skip_reason='Conditional check failed', _ansible_no_log=self._play_context.no_log)
+                self._add_item_result(results, res, item, loop_var, label)
+                del task_vars[loop_var]
+                continue
+
+            item_task.post_validate(templar=templar)
+            args = item_task.args
+            if '_variable_params' in args:
+                variable_params = args.pop('_variable_params')
+                if isinstance(variable_params, dict):
+                    variable_params.update(args)
+                    args = variable_params
+            if omit_token is not None:
+                args = dict((k, v) for (k, v) in iteritems(args) if v != omit_token)
+
+            settings = [getattr(item_task, attr) for attr in ('delegate_to', 'remote_user', 'become', 'become_user', 'become_method',
+                                                              'check_mode', 'no_log', 'environment')]
+            del task_vars[loop_var]
+            if batch and (settings != batch_settings or len(batch) == batch_size):
+                self._run_batch(batch, results, loop_var, label, task_vars)
+                batch = []
+            if not batch:
+                batch_settings = settings
+            batch.append((item, args))
+
+        self._run_batch(batch, results, loop_var, label, task_vars)
+        return results
+
+    def _run_batch(self, batch, results, loop_var, label, task_vars):
+        '''
+        Runs a batch of loop items, given as a list of (item, args), and adds
+        the result of each of them to the results of the loop.
+        '''
+
+        if not batch:
+            return
+
+        # the task is run as for the first item, with the args of all of them
+        task_vars[loop_var] = batch[0][0]
+        try:
+            tmp_task = self._task.copy(exclude_parent=True, exclude_tasks=True)
+            tmp_task._parent = self._task._parent
+            tmp_play_context = self._play_context.copy()
+        except AnsibleParserError as e:
+            for (item, args) in batch:
+                task_vars[loop_var] = item
+                self._add_item_result(results, dict(failed=True, msg=to_text(e)), item, loop_var, label)
+            del task_vars[loop_var]
+            return
+
+        (self._task, tmp_task) = (tmp_task, self._task)
+        (self._play_context, tmp_play_context) = (tmp_play_context, self._play_context)
+        self._loop_batch = batch
+        try:
+            res = self._execute(variables=task_vars)
+        finally:
+            self._loop_batch = None
+            (self._task, tmp_task) = (tmp_task, self._task)
+            (self._play_context, tmp_play_context) = (tmp_play_context, self._play_context)
+
+        item_results = res.pop('results', None)
+        if not isinstance(item_results, list) or len(item_results) != len(batch):
+            # the batch did not run, or failed as a whole
+            if item_results is not None:
+                res = dict(failed=True, msg="The %s action returned %d results for a batch of %d items" % (self._task.action, len(item_results), len(batch)))
+            item_results = [res.copy() for entry in batch]
+
+        # the keys _execute() added to the result of the batch belong in the
+        # result of each item
+        shared = dict((k, res[k]) for k in ('_ansible_no_log', '_ansible_notify', '_ansible_delegated_vars') if k in res)
+        for ((item, args), item_res) in zip(batch, item_results):
+            task_vars[loop_var] = item
+            item_res.update(shared)
+            if 'ansible_facts' in item_res:
+                task_vars.update(item_res['ansible_facts'])
+            self._add_item_result(results, item_res, item, loop_var, label)
+        del task_vars[loop_var]
+
     def _squash_items(self, items, loop_var, variables):
         '''
         Squash items down to a comma-separated list for certain modules which support it
@@ -447,6 +719,10 @@ class TaskExecutor:
                 variable_params.update(self._task.args)
                 self._task.args = variable_params
 
+        # pick up the connection the worker kept open for this host, if any
+        if self._connection is None and self._connection_cache is not None:
+            self._connection = self._connection_cache.get(self._get_connection_key())
+
         # get the connection and the handler for this execution
         if not self._connection or not getattr(self._connection, 'connected', False) or self._play_context.remote_addr != self._connection._play_context.remote_addr:
             self._connection = self._get_connection(variables=variables, templar=templar)
@@ -461,6 +737,8 @@ class TaskExecutor:
             else:
                 target_hostvars = dict()
             self._connection.set_host_overrides(host=self._host, hostvars=target_hostvars)
+            if self._connection_cache is not None:
+                self._cache_connection(self._connection)
         else:
             # if connection is reused, its _play_context is no longer valid and needs
             # to be replaced with the one templated above, in case other data changed
@@ -493,12 +771,25 @@ class TaskExecutor:
         # with the registered variable value later on when testing conditions
         vars_copy = variables.copy()
 
-        display.debug("starting attempt loop")
+        # a memoized result from a previous run stands for all the attempts
+        memo = self._get_memo_key(variables)
         result = None
+        if memo is not None:
+            result = self._result_store.get(memo)
+            if result is not None:
+                display.debug("using the memoized result %s" % memo)
+                result['memoized'] = True
+                result["_ansible_no_log"] = self._play_context.no_log
+                retries = 0
+
+        display.debug("starting attempt loop")
         for attempt in range(1, retries + 1):
             display.debug("running the handler")
             try:
-                result = self._handler.run(task_vars=variables)
+                if self._loop_batch is not None:
+                    result = dict(results=self._handler.run_batch(self._loop_batch, task_vars=variables))
+                else:
+                    result = self._handler.run(task_vars=variables)
             except AnsibleConnectionFailure as e:
                 return dict(unreachable=True, msg=to_text(e))
             display.debug("handler run complete")
@@ -513,7 +804,12 @@ class TaskExecutor:
 
             if self._task.async > 0:
                 if self._task.poll > 0 and not result.get('skipped'):
-                    result = self._poll_async_result(result=result, templar=templar, task_vars=vars_copy)
+                    if result.get('ansible_job_id') and not result.get('failed') and tracks_async_job(self._task):
+                        # the job is polled by the controller, which frees
+                        # this worker while it runs
+                        result['_ansible_async_tracked'] = dict(poll=self._task.poll, timeout=self._task.async)
+                    else:
+                        result = self._poll_async_result(result=result, templar=templar, task_vars=vars_copy)
 
                 # ensure no log is preserved
                 result["_ansible_no_log"] = self._play_context.no_log
@@ -569,6 +865,11 @@ class TaskExecutor:
                 result['attempts'] = retries - 1
                 result['failed'] = True
 
+        # only the runs which succeeded without changing anything are memoized
+        if memo is not None and not result.get('memoized') and not result.get('failed') and not result.get('changed') \
+           and not result.get('unreachable') and 'skipped' not in result:
+            self._result_store.put(memo, result)
+
         # do the final update of the local variables here, for both registered
         # values and any facts which may have been created
         if self._task.register:
@@ -598,6 +899,40 @@ class TaskExecutor:
         display.debug("attempt loop complete, returning result")
         return result
 
+    def _get_memo_key(self, variables):
+        '''
+        Returns the key of the result of the task in the result store, if
+        it is memoized (see executor/result_store.py), None otherwise.
+        '''
+
+        # the store keeps results in plain text, so those of no_log tasks
+        # are never put there
+        if not self._task.memoize or self._task.async > 0 or self._play_context.no_log:
+            return None
+
+        # "memoize: yes" depends on nothing else, otherwise it names the
+        # facts and variables the result depends on
+        state_keys = [key for key in self._task.memoize if isinstance(key, string_types)]
+
+        pc = self._play_context
+        if self._result_store is None:
+            self._result_store = ResultStore(C.DEFAULT_RESULT_CACHE_PATH)
+        return memo_key(dict(
+            host        = self._host.name,
+            delegate_to = self._task.delegate_to,
+            remote_addr = pc.remote_addr,
+            port        = pc.port,
+            remote_user = pc.remote_user,
+            connection  = pc.connection,
+            become      = pc.become,
+            become_user = pc.become_user,
+            check_mode  = pc.check_mode,
+            diff        = pc.diff,
+            action      = self._task.action,
+            args        = self._task.args,
+            state       = dict((key, variables.get(key)) for key in state_keys),
+        ))
+
     def _poll_async_result(self, result, templar, task_vars=None):
         '''
         Polls for the specified JID to be complete
@@ -662,6 +997,28 @@ class TaskExecutor:
         else:
             return async_result
 
+    def _get_connection_key(self):
+        '''
+        Returns the key of the current connection in the connection cache.
+        '''
+        pc = self._play_context
+        return (self._host.name, pc.connection, pc.remote_addr, pc.port, pc.remote_user)
+
+    def _cache_connection(self, connection):
+        '''
+        Keeps the given connection open in the connection cache, closing the
+        one it replaces.
+        '''
+
+        key = self._get_connection_key()
+        old_connection = self._connection_cache.get(key)
+        if old_connection is not None and old_connection is not connection:
+            try:
+                old_connection.close()
+            except Exception as e:
+                display.debug(u"error closing connection: %s" % to_text(e))
+        self._connection_cache[key] = connection
+
     def _get_connection(self, variables, templar):
         '''
         Reads the connection property for the host, and returns the
@@ -749,12 +1106,24 @@ class TaskExecutor:
 
         return connection
 
+    def _get_action_class(self, name):
+        '''
+        Returns the class of the action plugin of the given name, or None if
+        there is none. The loader does not search its paths, so whether the
+        plugin exists is only known by importing it.
+        '''
+
+        try:
+            return self._shared_loader_obj.action_loader.get(name, class_only=True)
+        except ImportError:
+            return None
+
     def _get_action_handler(self, connection, templar):
         '''
         Returns the correct action plugin to handle the requestion task action
         '''
 
-        if self._task.action in self._shared_loader_obj.action_loader:
+        if self._get_action_class(self._task.action) is not None:
             if self._task.async != 0:
                 raise AnsibleError("async mode is not supported with the %s module" % self._task.action)
             handler_name = self._task.action
@@ -778,3 +1147,22 @@ class TaskExecutor:
             raise AnsibleError("the handler '%s' was not found" % handler_name)
 
         return handler
+
+
+class AsyncPollExecutor(TaskExecutor):
+    '''
+    Runs the polls of the async job tracker (see executor/async_tracker.py),
+    which always use the async_poll action, whatever the module the jobs
+    were started with.
+    '''
+
+    def _get_action_handler(self, connection, templar):
+        return self._shared_loader_obj.action_loader.get(
+            'async_poll',
+            task=self._task,
+            connection=connection,
+            play_context=self._play_context,
+            loader=self._loader,
+            templar=templar,
+            shared_loader_obj=self._shared_loader_obj,
+        )
@@ -22,19 +22,32 @@ __metaclass__ = type
 import multiprocessing
 import os
 import tempfile
+import zlib
+
+from multiprocessing import Lock
 
 from six import string_types
+from six.moves import queue as Queue
 
 from ansiblite import constants as C
 from ansiblite.errors import AnsibleError
+from ansiblite.executor import action_write_locks
 from ansiblite.executor.play_iterator import PlayIterator
+from ansiblite.executor.process.memory import freeze_heap, process_memory, thaw_heap
+from ansiblite.executor.process.remote import RemoteJobQueue, RemoteSession, RemoteWorker, dumps_setup, parse_agents
+from ansiblite.executor.process.taskvars import TaskVarsSender
+from ansiblite.executor.process.threads import WorkerThread
+from ansiblite.executor.process.wire import encode_job
+from ansiblite.executor.process.worker import WorkerProcess
 from ansiblite.executor.stats import AggregateStats
-from ansiblite.utils._text import to_text
+from ansiblite.utils._text import to_bytes, to_text
 from ansiblite.playbook.block import Block
 from ansiblite.playbook.play_context import PlayContext
 from ansiblite.plugins import callback_loader, strategy_loader, module_loader
 from ansiblite.plugins.callback import CallbackBase
+from ansiblite.plugins.strategy import SharedPluginLoaderObj
 from ansiblite.template import Templar
+from ansiblite.template.cache import compiled_templates
 from ansiblite.utils.helpers import pct_to_int
 from ansiblite.vars.hostvars import HostVars
 
@@ -48,9 +61,12 @@ class TaskQueueManager:
 
     '''
     This class handles the multiprocessing requirements of Ansible by
-    creating a pool of worker forks, a result handler fork, and a
-    manager object with shared datastructures/queues for coordinating
-    work between all processes.
+    creating a pool of long-lived worker forks (started once per play and
+    fed through per-worker job queues), and a results queue shared by all
+    of them for coordinating work between all processes. With the thread
+    execution engine, the workers are threads of the controller instead,
+    and with the remote engine they run on agents, over which the hosts
+    may be sharded.
 
     The queue manager is responsible for loading the play strategy plugin,
     which dispatches the Play's tasks to hosts.
@@ -96,18 +112,187 @@ class TaskQueueManager:
         self._failed_hosts      = dict()
         self._unreachable_hosts = dict()
 
+        # the checkpoint the playbook executor saves the run to, if any
+        self._checkpoint = None
+
         self._final_q = multiprocessing.Queue()
 
+        # the engine running the jobs: forked worker processes, or threads
+        # of the controller for plays which mostly wait on their connections
+        self._engine = C.DEFAULT_EXECUTION_ENGINE
+        if self._engine not in ('process', 'thread', 'remote'):
+            raise AnsibleError("Invalid execution engine specified: %s" % self._engine)
+
+        # the agents of the remote engine, the sessions opened on them for
+        # the current play, and the agent each host was sharded to
+        self._agents = []
+        self._sessions = []
+        self._host_shards = dict()
+        if self._engine == 'remote':
+            self._agents = parse_agents(C.DEFAULT_REMOTE_AGENTS)
+            if not self._agents:
+                raise AnsibleError("The remote execution engine requires at least one agent in remote_agents")
+            if C.DEFAULT_REMOTE_SHARDING not in ('hash', 'group', 'none'):
+                raise AnsibleError("Invalid remote sharding specified: %s" % C.DEFAULT_REMOTE_SHARDING)
+
         # A temporary file (opened pre-fork) used by connection
         # plugins for inter-process locking.
         self._connection_lockfile = tempfile.TemporaryFile()
 
-    def _initialize_processes(self, num):
+    def _initialize_processes(self, num, forks=None):
+        '''
+        Sets up a pool of num worker slots, of which the first forks (all of
+        them by default) are started with the play.
+        '''
+
         self._workers = []
+        self._worker_vars = []
+        if self._engine == 'remote':
+            # every agent gets at least one worker
+            num = max(num, len(self._agents))
+            forks = None
+        if forks is None:
+            forks = num
+        self._forks = forks
 
         for i in range(num):
-            rslt_q = multiprocessing.Queue()
-            self._workers.append([None, rslt_q])
+            self._workers.append([None, self._new_job_queue()])
+            self._worker_vars.append(None)
+
+    def _new_job_queue(self):
+        if self._engine == 'thread':
+            return Queue.Queue()
+        elif self._engine == 'remote':
+            return RemoteJobQueue()
+        return multiprocessing.Queue()
+
+    def _start_workers(self, iterator):
+        '''
+        Forks the pool of worker processes used for the play. This is done
+        once the iterator has been built, so that every task compiled for the
+        play is inherited by the workers and can be sent to them by uuid.
+        '''
+
+        self._worker_task_cache = iterator._task_uuid_cache
+        self._worker_task_uuids = frozenset(self._worker_task_cache)
+
+        # write locks created after the fork would not be shared with the
+        # workers, so create them now for every action we know about
+        for task in self._worker_task_cache.values():
+            if task.action not in action_write_locks.action_write_locks:
+                action_write_locks.action_write_locks[task.action] = Lock()
+
+        self._shared_loader_obj = SharedPluginLoaderObj()
+
+        # the agents fork their workers from a session holding the same
+        # objects, pickled once for all of them
+        if self._engine == 'remote':
+            module_paths = []
+            if self._options.module_path is not None:
+                module_paths = self._options.module_path.split(os.pathsep)
+            setup = dumps_setup(self._worker_task_cache, self._inventory, self._loader, self._variable_manager, module_paths)
+            versions = (self._variable_manager.version, self._inventory.version)
+            for (group, address) in self._agents:
+                self._sessions.append(RemoteSession(address, setup, versions))
+            del setup
+
+        # the other slots are started when first used
+        if self._engine == 'process':
+            freeze_heap()
+        try:
+            for idx in range(self._forks):
+                self._start_worker(idx, heap_ready=True)
+        finally:
+            if self._engine == 'process':
+                thaw_heap()
+
+    def _start_worker(self, idx, heap_ready=False):
+        '''
+        Starts (or restarts) the worker for the given slot. Unless heap_ready
+        is set, meaning the caller did it already, the controller's heap is
+        prepared for the fork first.
+        '''
+
+        if self._engine == 'thread':
+            worker_prc = WorkerThread(
+                self._final_q,
+                self._workers[idx][1],
+                self._loader,
+                self._shared_loader_obj,
+                keep_connections=C.DEFAULT_HOST_AFFINITY,
+            )
+        elif self._engine == 'remote':
+            worker_prc = RemoteWorker(
+                self._final_q,
+                self._workers[idx][1],
+                self._sessions[self.get_worker_shard(idx)],
+            )
+        else:
+            worker_prc = WorkerProcess(
+                self._final_q,
+                self._workers[idx][1],
+                self._worker_task_cache,
+                self._inventory,
+                self._loader,
+                self._variable_manager,
+                self._shared_loader_obj,
+            )
+        self._workers[idx][0] = worker_prc
+        if self._engine == 'process' and not heap_ready:
+            freeze_heap()
+            try:
+                worker_prc.start()
+            finally:
+                thaw_heap()
+        else:
+            worker_prc.start()
+        if self._engine == 'process':
+            # the new worker inherited the current vars, so deltas start from here
+            self._worker_vars[idx] = TaskVarsSender(self._variable_manager, self._inventory)
+        elif self._engine == 'remote':
+            # remote workers start from the vars of their session
+            session = self._sessions[self.get_worker_shard(idx)]
+            self._worker_vars[idx] = TaskVarsSender(self._variable_manager, self._inventory, versions=session.versions)
+        display.debug("started worker %d (out of %d)" % (idx+1, len(self._workers)))
+        return worker_prc
+
+    def _reset_worker(self, idx):
+        '''
+        Forgets the worker of the given slot after it died, along with any
+        job still queued for it. A new one is started when the slot is next
+        used.
+        '''
+
+        job_q = self._workers[idx][1]
+        self._workers[idx][0] = None
+        self._workers[idx][1] = self._new_job_queue()
+        if hasattr(job_q, 'close'):
+            job_q.close()
+
+    def _submit_job(self, idx, host, task, task_vars, play_context):
+        '''
+        Sends a job to the worker of the given slot, restarting the worker
+        first if it has died.
+        '''
+
+        (worker_prc, job_q) = self._workers[idx]
+        if worker_prc is None or not worker_prc.is_alive():
+            self._start_worker(idx)
+
+        if self._engine == 'thread':
+            job_q.put((host, task, task_vars, play_context))
+            return
+
+        # tasks the workers inherited when they were forked are sent by uuid,
+        # anything newer (ie. from includes) has to be sent in full
+        if task._uuid in self._worker_task_uuids:
+            task_ref = task._uuid
+        else:
+            task_ref = task
+
+        # the agents of the remote engine do not share our tmp dir
+        vars_delta = self._worker_vars[idx].make_delta(task_vars)
+        job_q.put(encode_job(host, task_ref, vars_delta, play_context, out_of_band=self._engine != 'remote'))
 
     def _initialize_notified_handlers(self, play):
         '''
@@ -194,13 +379,16 @@ class TaskQueueManager:
 
         self._callbacks_loaded = True
 
-    def run(self, play):
+    def run(self, play, serial_batches=None):
         '''
         Iterates over the roles/tasks in a play, using the given (or default)
         strategy for queueing tasks. The default is the linear strategy, which
         operates like classic Ansible by keeping all hosts in lock-step with
         a given task (meaning no hosts move on to the next task until all hosts
         are done with the current task).
+
+        If serial_batches is given, the inventory must be restricted to all
+        of their hosts, which the strategy runs as rolling batches.
         '''
 
         if not self._callbacks_loaded:
@@ -233,7 +421,17 @@ class TaskQueueManager:
 
         contenders = [self._options.forks, max_serial, num_hosts]
         contenders = [v for v in contenders if v is not None and v > 0]
-        self._initialize_processes(min(contenders))
+        num_forks = min(contenders)
+
+        # in adaptive mode, the pool is sized for forks_max instead, and
+        # the strategy starts with forks and scales within the bounds. Pinned
+        # hosts are spread over the whole pool, so host affinity disables it,
+        # and so does the remote engine, whose workers are not ours to measure
+        if C.DEFAULT_FORKS_ADAPTIVE and not C.DEFAULT_HOST_AFFINITY and C.DEFAULT_FORKS_MAX > 0 and self._engine != 'remote':
+            contenders = [v for v in [C.DEFAULT_FORKS_MAX, max_serial, num_hosts] if v > 0]
+            self._initialize_processes(min(contenders), min(num_forks, min(contenders)))
+        else:
+            self._initialize_processes(num_forks)
 
         play_context = PlayContext(new_play, self._options, self.passwords, self._connection_lockfile.fileno())
         for callback_plugin in self._callback_plugins:
@@ -270,15 +468,31 @@ class TaskQueueManager:
 
         self.clear_failed_hosts()
 
+        # when resuming, put the hosts back where the checkpoint left them
+        if self._checkpoint is not None:
+            self._checkpoint.restore_play(self, iterator)
+
+        # fork the worker pool now, before the strategy starts its results thread
+        self._start_workers(iterator)
+
         # during initialization, the PlayContext will clear the start_at_task
         # field to signal that a matching task was found, so check that here
         # and remember it so we don't try to skip tasks on future plays
         if getattr(self._options, 'start_at_task', None) is not None and play_context.start_at_task is None:
             self._start_at_done = True
 
+        # the iterator holds all the hosts of the batches, the strategy then
+        # narrows the inventory down to the ones it lets in
+        if serial_batches is not None:
+            strategy.set_serial_batches(serial_batches)
+
         # and run the play using the strategy and cleanup on way out
         play_return = strategy.run(iterator, play_context)
 
+        # the workers are at their largest now, before they are stopped
+        if C.DEFAULT_WORKER_MEMORY_REPORT:
+            self._report_worker_memory()
+
         # now re-save the hosts that failed from the iterator to our internal list
         for host_name in iterator.get_failed_hosts():
             self._failed_hosts[host_name] = True
@@ -289,20 +503,40 @@ class TaskQueueManager:
 
     def cleanup(self):
         display.debug("RUNNING CLEANUP")
+        display.debug("compiled template cache: %s" % compiled_templates.stats())
         self.terminate()
         self._final_q.close()
         self._cleanup_processes()
 
     def _cleanup_processes(self):
         if hasattr(self, '_workers'):
-            for (worker_prc, rslt_q) in self._workers:
-                rslt_q.close()
+            # ask the workers to exit once they have finished their current job
+            for (worker_prc, job_q) in self._workers:
                 if worker_prc and worker_prc.is_alive():
                     try:
-                        worker_prc.terminate()
-                    except AttributeError:
+                        job_q.put(None)
+                    except (IOError, EOFError, AssertionError, ValueError):
                         pass
 
+            for (worker_prc, job_q) in self._workers:
+                # a remote worker which failed to connect was never started
+                if worker_prc and worker_prc.is_alive():
+                    worker_prc.join(C.DEFAULT_WORKER_SHUTDOWN_TIMEOUT)
+                    if worker_prc.is_alive():
+                        try:
+                            worker_prc.terminate()
+                        except AttributeError:
+                            pass
+                if hasattr(job_q, 'close'):
+                    job_q.close()
+
+            self._workers = []
+
+        # the agents drop the sessions of the play along with them
+        for session in self._sessions:
+            session.close()
+        self._sessions = []
+
     def clear_failed_hosts(self):
         self._failed_hosts = dict()
 
@@ -318,6 +552,72 @@ class TaskQueueManager:
     def get_workers(self):
         return self._workers[:]
 
+    def shards_hosts(self):
+        '''
+        Returns True if each host may only run on the workers of one agent.
+        '''
+        return self._engine == 'remote' and C.DEFAULT_REMOTE_SHARDING != 'none'
+
+    def get_worker_shard(self, idx):
+        '''
+        Returns the index of the agent the worker of the given slot runs on,
+        or None if the workers are local.
+        '''
+
+        if self._engine != 'remote':
+            return None
+        return idx % len(self._agents)
+
+    def get_host_shard(self, host):
+        '''
+        Returns the index of the agent the given host runs on, or None if it
+        may run on any worker. With group sharding, a host goes to the first
+        agent set up for one of its groups, and like with hash sharding the
+        other hosts are spread over all the agents by their name.
+        '''
+
+        if not self.shards_hosts():
+            return None
+
+        shard = self._host_shards.get(host.name)
+        if shard is None:
+            if C.DEFAULT_REMOTE_SHARDING == 'group':
+                groups = frozenset(group.name for group in host.get_groups())
+                for (idx, (group, address)) in enumerate(self._agents):
+                    if group in groups:
+                        shard = idx
+                        break
+            if shard is None:
+                shard = (zlib.crc32(to_bytes(host.name, errors='surrogate_or_strict')) & 0xffffffff) % len(self._agents)
+            self._host_shards[host.name] = shard
+        return shard
+
+    def get_worker_memory(self):
+        '''
+        Returns the memory of the running worker processes, as a list of
+        dicts holding the index of the worker and its pid along with the
+        fields returned by process_memory(), ie. how much of its resident
+        memory is still shared with the controller and how much is private.
+        Workers whose memory cannot be read are left out.
+        '''
+
+        report = []
+        for (idx, (worker_prc, job_q)) in enumerate(self._workers):
+            pid = getattr(worker_prc, 'pid', None)
+            if pid is None or not worker_prc.is_alive():
+                continue
+            memory = process_memory(pid)
+            if memory is not None:
+                memory.update(worker=idx+1, pid=pid)
+                report.append(memory)
+        return report
+
+    def _report_worker_memory(self):
+        report = self.get_worker_memory()
+        for memory in report:
+            display.vv(u"worker %(worker)d (pid %(pid)d): rss %(rss)d kB, shared %(shared)d kB, private %(private)d kB, pss %(pss)d kB" % memory)
+        self.send_callback('v2_playbook_on_worker_memory', report)
+
     def terminate(self):
         self._terminated = True
 
@@ -61,6 +61,16 @@ class TaskResult:
     def is_unreachable(self):
         return self._check_key('unreachable')
 
+    def get_metrics(self):
+        '''
+        Returns the resources the worker used to run the task: its wall
+        and cpu time (in seconds), how much its peak RSS grew (max_rss_delta,
+        in kB) and, with the process engine, the bytes sent back to the
+        controller for it (queue_bytes). None for results which were not
+        run by a worker.
+        '''
+        return self._result.get('_ansible_metrics')
+
     def _check_key(self, key):
         '''get a specific key from the result or it's items'''
 
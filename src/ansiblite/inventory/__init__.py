@@ -82,6 +82,10 @@ class Inventory(object):
         # the inventory object holds a list of groups
         self.groups = {}
 
+        # hosts and groups added during the run (by add_host and group_by),
+        # replayed on the copies of the inventory held by the workers
+        self._changes = []
+
         # a list of host(names) to contain current inquiries to
         self._restriction = None
         self._subset = None
@@ -631,6 +635,115 @@ class Inventory(object):
         else:
             raise AnsibleError("group already in inventory: %s" % group.name)
 
+    @property
+    def version(self):
+        '''
+        The number of changes made to the inventory during the run.
+        '''
+        return len(self._changes)
+
+    def get_changes(self, since):
+        '''
+        Returns the current version along with the changes made after the
+        given version, to be passed to apply_changes().
+        '''
+        return (len(self._changes), self._changes[since:])
+
+    def apply_changes(self, changes):
+        '''
+        Replays the changes returned by get_changes() on another inventory
+        (ie. the copy held by a worker process).
+        '''
+        for change in changes:
+            if change[0] == 'host':
+                self._add_dynamic_host(*change[1:])
+            else:
+                self._add_dynamic_group(*change[1:])
+
+    def add_dynamic_host(self, host_name, host_vars, groups):
+        '''
+        Adds a host (or updates it if it already exists) with the given
+        variables to the given groups, as done by the add_host action.
+        '''
+        self._changes.append(('host', host_name, host_vars, groups))
+        self._add_dynamic_host(host_name, host_vars, groups)
+
+    def _add_dynamic_host(self, host_name, host_vars, groups):
+        # Check if host in inventory, add if not
+        new_host = self.get_host(host_name)
+        if not new_host:
+            new_host = Host(name=host_name)
+            self._hosts_cache[host_name] = new_host
+            self.get_host_vars(new_host)
+
+            allgroup = self.get_group('all')
+            allgroup.add_host(new_host)
+
+        # Set/update the vars for this host
+        new_host.vars = combine_vars(new_host.vars, self.get_host_vars(new_host))
+        new_host.vars = combine_vars(new_host.vars, host_vars)
+
+        for group_name in groups:
+            if not self.get_group(group_name):
+                new_group = Group(group_name)
+                self.add_group(new_group)
+                self.get_group_vars(new_group)
+                new_group.vars = self.get_group_variables(group_name)
+            else:
+                new_group = self.get_group(group_name)
+
+            new_group.add_host(new_host)
+
+            # add this host to the group cache
+            if self.groups is not None:
+                if group_name in self.groups:
+                    if new_host not in self.get_group(group_name).hosts:
+                        self.get_group(group_name).hosts.append(new_host.name)
+
+        # clear pattern caching completely since it's unpredictable what
+        # patterns may have referenced the group
+        self.clear_pattern_cache()
+
+        # clear cache of group dict, which is used in magic host variables
+        self.clear_group_dict_cache()
+
+    def add_dynamic_group(self, host_name, group_name):
+        '''
+        Adds a group (if it does not exist) and assigns the given host to it,
+        as done by the group_by action. Returns whether anything changed.
+        '''
+        changed = self._add_dynamic_group(host_name, group_name)
+        if changed:
+            self._changes.append(('group', host_name, group_name))
+        return changed
+
+    def _add_dynamic_group(self, host_name, group_name):
+        changed = False
+
+        real_host = self.get_host(host_name)
+
+        new_group = self.get_group(group_name)
+        if not new_group:
+            # create the new group and add it to inventory
+            new_group = Group(name=group_name)
+            self.add_group(new_group)
+            new_group.vars = self.get_group_vars(new_group)
+
+            # and add the group to the proper hierarchy
+            allgroup = self.get_group('all')
+            allgroup.add_child_group(new_group)
+            changed = True
+
+        if group_name not in real_host.get_groups():
+            new_group.add_host(real_host)
+            changed = True
+
+        if changed:
+            # clear cache of group dict, which is used in magic host variables
+            self.clear_group_dict_cache()
+
+        return changed
+
     def list_hosts(self, pattern="all"):
 
         """ return a list of hostnames for a pattern """
@@ -20,11 +20,11 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import yaml
-from ansible.compat.six import PY3
+from six import PY3
 
-from ansible.parsing.yaml.objects import AnsibleUnicode, AnsibleSequence, AnsibleMapping
-from ansible.parsing.yaml.objects import AnsibleVaultEncryptedUnicode
-from ansible.vars.hostvars import HostVars
+from ansiblite.parsing.yaml.objects import AnsibleUnicode, AnsibleSequence, AnsibleMapping
+from ansiblite.parsing.yaml.objects import AnsibleVaultEncryptedUnicode
+from ansiblite.vars.hostvars import HostVars
 
 
 class AnsibleDumper(yaml.SafeDumper):
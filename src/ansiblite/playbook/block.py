@@ -235,9 +235,9 @@ class Block(Base, Become, Conditional, Taggable):
         '''
 
         # import is here to avoid import loops
-        from ansible.playbook.task import Task
-        from ansible.playbook.task_include import TaskInclude
-        from ansible.playbook.handler_task_include import HandlerTaskInclude
+        from ansiblite.playbook.task import Task
+        from ansiblite.playbook.task_include import TaskInclude
+        from ansiblite.playbook.handler_task_include import HandlerTaskInclude
 
         # we don't want the full set of attributes (the task lists), as that
         # would lead to a serialize/deserialize loop
@@ -379,7 +379,7 @@ class Block(Base, Become, Conditional, Taggable):
         call their parents all_parents_static() method. Only Block objects in
         the chain check the statically_loaded value of the parent.
         '''
-        from ansible.playbook.task_include import TaskInclude
+        from ansiblite.playbook.task_include import TaskInclude
         if self._parent:
             if isinstance(self._parent, TaskInclude) and not self._parent.statically_loaded:
                 return False
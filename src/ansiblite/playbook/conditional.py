@@ -22,19 +22,85 @@ __metaclass__ = type
 import ast
 import re
 
+from jinja2 import nodes
 from jinja2.compiler import generate
 from jinja2.exceptions import UndefinedError
 
 from six import text_type
+from ansiblite import constants as C
 from ansiblite.errors import AnsibleError, AnsibleUndefinedVariable
 from ansiblite.playbook.attribute import FieldAttribute
 from ansiblite.template import Templar
+from ansiblite.template.cache import compile_key
 from ansiblite.utils._text import to_native
 
 DEFINED_REGEX = re.compile(r'(hostvars\[.+\]|[\w_]+)\s+(not\s+is|is|is\s+not)\s+(defined|undefined)')
 LOOKUP_REGEX = re.compile(r'lookup\s*\(')
 VALID_VAR_REGEX = re.compile("^[_A-Za-z][_a-zA-Z0-9]*$")
 
+# The conditionals are checked and compiled once per process: the code
+# compiled from the test of the "{% if %}" block presenting a conditional,
+# assigned to result, is cached under the conditional, the disable_lookups
+# flag and the options of the environment, and is run against the variables
+# every time the conditional is evaluated. The cache holds as many
+# conditionals as the template cache holds templates (template_cache_size).
+_compiled_conditionals = dict()
+
+
+def _compile_conditional(templar, conditional, disable_lookups):
+    '''
+    Returns the code compiled from the given (templated) conditional, once it
+    has been checked for disallowed constructs.
+    '''
+
+    # the "presented" string is a jinja2 if/else block used to evaluate the
+    # conditional
+    presented = "{%% if %s %%} True {%% else %%} False {%% endif %%}" % conditional
+
+    key = compile_key(templar.environment, presented) + (disable_lookups,)
+    code = _compiled_conditionals.get(key)
+    if code is not None:
+        return code
+
+    # first, we do some low-level jinja2 parsing involving the AST format of
+    # the statement to ensure we don't do anything unsafe (using the
+    # disable_lookups flag)
+    e = templar.environment.overlay()
+    e.filters.update(templar._get_filters())
+    e.tests.update(templar._get_tests())
+
+    res = e._parse(presented, None, None)
+    test = res.body[0].test
+    res = generate(res, e, None, None)
+    parsed = ast.parse(res, mode='exec')
+
+    class CleansingNodeVisitor(ast.NodeVisitor):
+        def generic_visit(self, node, inside_call=False):
+            if isinstance(node, ast.Call):
+                inside_call = True
+            elif isinstance(node, ast.Str):
+                # calling things with a dunder is generally bad at this point...
+                if inside_call and disable_lookups and node.s.startswith("__"):
+                    raise AnsibleError("Invalid access found in the presented conditional: '%s'" % conditional)
+            # iterate over all child nodes
+            for child_node in ast.iter_child_nodes(node):
+                self.generic_visit(child_node, inside_call=inside_call)
+
+    cnv = CleansingNodeVisitor()
+    cnv.visit(parsed)
+
+    # then the test alone is compiled, as jinja2 compiles expressions
+    body = nodes.Template([nodes.Assign(nodes.Name('result', 'store'), test, lineno=1)], lineno=1)
+    body.set_environment(e)
+    code = e.compile(body)
+
+    if C.DEFAULT_TEMPLATE_CACHE_SIZE > 0:
+        if len(_compiled_conditionals) >= C.DEFAULT_TEMPLATE_CACHE_SIZE:
+            _compiled_conditionals.clear()
+        _compiled_conditionals[key] = code
+    return code
+
+
 class Conditional:
 
     '''
@@ -143,42 +209,16 @@ class Conditional:
             # and we don't want future templating calls to do unsafe things
             disable_lookups |= hasattr(conditional, '__UNSAFE__')
 
-            # now we generated the "presented" string, which is a jinja2 if/else block
-            # used to evaluate the conditional. First, we do some low-level jinja2 parsing
-            # involving the AST format of the statement to ensure we don't do anything
-            # unsafe (using the disable_lookup flag above)
-            e = templar.environment.overlay()
-            e.filters.update(templar._get_filters())
-            e.tests.update(templar._get_tests())
-
-            presented = "{%% if %s %%} True {%% else %%} False {%% endif %%}" % conditional
-            res = e._parse(presented, None, None)
-            res = generate(res, e, None, None)
-            parsed = ast.parse(res, mode='exec')
-
-            class CleansingNodeVisitor(ast.NodeVisitor):
-                def generic_visit(self, node, inside_call=False):
-                    if isinstance(node, ast.Call):
-                        inside_call = True
-                    elif isinstance(node, ast.Str):
-                        # calling things with a dunder is generally bad at this point...
-                        if inside_call and disable_lookups and node.s.startswith("__"):
-                            raise AnsibleError("Invalid access found in the presented conditional: '%s'" % conditional)
-                    # iterate over all child nodes
-                    for child_node in ast.iter_child_nodes(node):
-                        self.generic_visit(child_node, inside_call=inside_call)
-
-            cnv = CleansingNodeVisitor()
-            cnv.visit(parsed)
-
-            # and finally we templated the presented string and look at the resulting string
-            val = templar.template(presented, disable_lookups=disable_lookups).strip()
-            if val == "True":
-                return True
-            elif val == "False":
-                return False
-            else:
-                raise AnsibleError("unable to evaluate conditional: %s" % original)
+            # the conditional is evaluated as the test of a jinja2 if/else block
+            # would be, by code compiled (and checked) only once
+            code = _compile_conditional(templar, conditional, disable_lookups)
+            try:
+                val = templar._evaluate_expression(code, disable_lookups=disable_lookups)
+                return bool(val)
+            except (AnsibleUndefinedVariable, UndefinedError):
+                if not templar._fail_on_undefined_errors:
+                    raise AnsibleError("unable to evaluate conditional: %s" % original)
+                raise
         except (AnsibleUndefinedVariable, UndefinedError) as e:
             # the templating failed, meaning most likely a variable was undefined. If we happened to be
             # looking for an undefined variable, return True, otherwise fail
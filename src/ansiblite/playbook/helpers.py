@@ -317,7 +317,7 @@ def load_list_of_roles(ds, play, current_role_path=None, variable_manager=None,
     '''
 
     # we import here to prevent a circular dependency with imports
-    from ansible.playbook.role.include import RoleInclude
+    from ansiblite.playbook.role.include import RoleInclude
 
     assert isinstance(ds, list)
 
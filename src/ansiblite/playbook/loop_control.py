@@ -31,6 +31,8 @@ class LoopControl(Base):
     _loop_var = FieldAttribute(isa='str')
     _label    = FieldAttribute(isa='str')
     _pause    = FieldAttribute(isa='int')
+    # how many items of the loop may run at the same time
+    _parallel = FieldAttribute(isa='int')
 
     def __init__(self):
         super(LoopControl, self).__init__()
@@ -49,7 +49,7 @@ class PlaybookInclude(Base, Conditional, Taggable):
         '''
 
         # import here to avoid a dependency loop
-        from ansible.playbook import Playbook
+        from ansiblite.playbook import Playbook
 
         # first, we use the original parent method to correctly load the object
         # via the load_data/preprocess_data system we normally use for other
@@ -23,6 +23,7 @@ import os
 
 from six import iteritems, string_types
 
+from ansiblite.constants import mk_boolean as boolean
 from ansiblite.errors import AnsibleError, AnsibleParserError
 from ansiblite.parsing.mod_args import ModuleArgsParser
 from ansiblite.parsing.yaml.objects import AnsibleBaseYAMLObject, AnsibleMapping, AnsibleUnicode
@@ -76,6 +77,7 @@ class Task(Base, Conditional, Taggable, Become):
     _loop                 = FieldAttribute(isa='string', private=True, inherit=False)
     _loop_args            = FieldAttribute(isa='list', private=True, inherit=False)
     _loop_control         = FieldAttribute(isa='class', class_type=LoopControl, inherit=False)
+    _memoize              = FieldAttribute(isa='list')
     _name                 = FieldAttribute(isa='string', default='')
     _notify               = FieldAttribute(isa='list')
     _poll                 = FieldAttribute(isa='int')
@@ -277,6 +279,17 @@ class Task(Base, Conditional, Taggable, Become):
         # at this point it should be a simple string
         return templar.template(value, convert_bare=True)
 
+    def _post_validate_memoize(self, attr, value, templar):
+        '''
+        memoize is either a boolean, or the list of the facts and variables
+        the result depends on. It ends up as an empty list when turned off,
+        and [True] when turned on without naming any.
+        '''
+        value = templar.template(value)
+        if not isinstance(value, list):
+            return [True] if boolean(value) else []
+        return [key for key in value if isinstance(key, string_types)]
+
     def _post_validate_changed_when(self, attr, value, templar):
         '''
         changed_when is evaluated after the execution of the task is complete,
@@ -349,8 +362,8 @@ class Task(Base, Conditional, Taggable, Become):
     def deserialize(self, data):
 
         # import is here to avoid import loops
-        from ansible.playbook.task_include import TaskInclude
-        from ansible.playbook.handler_task_include import HandlerTaskInclude
+        from ansiblite.playbook.task_include import TaskInclude
+        from ansiblite.playbook.handler_task_include import HandlerTaskInclude
 
         parent_data = data.get('parent', None)
         if parent_data:
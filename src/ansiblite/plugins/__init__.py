@@ -91,6 +91,7 @@ class PluginLoader:
     def get(self, name, *args, **kwargs):
         ''' instantiates a plugin of the given name using arguments '''
 
+        class_only = kwargs.pop('class_only', False)
         if name in self.aliases:
             name = self.aliases[name]
 
@@ -109,6 +110,10 @@ class PluginLoader:
                 return None
             if not issubclass(obj, plugin_class):
                 return None
+
+        self._display_plugin_load(self.class_name, name, class_only=class_only)
+        if not class_only:
+            obj = obj(*args, **kwargs)
         return obj
 
     def _load_module_source(self, name, class_names=[]):
@@ -144,7 +149,6 @@ class PluginLoader:
     def has_plugin(self, name):
         ''' Checks if a plugin named name exists '''
 
-        print(name)
         return self.find_plugin(name) is not None
 
     __contains__ = has_plugin
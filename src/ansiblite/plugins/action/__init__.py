@@ -56,6 +56,15 @@ class ActionBase(with_metaclass(ABCMeta, object)):
     action in use.
     '''
 
+    # actions which never use their connection (ie. debug or set_fact) can
+    # set this to be run in a thread of the controller instead of a worker
+    RUNS_ON_CONTROLLER = False
+
+    # actions which can run several loop items in a single invocation set
+    # this to the most items they take at once (-1 for no limit), and
+    # override run_batch()
+    BATCH_ITEMS = 0
+
     def __init__(self, task, connection, play_context, loader, templar, shared_loader_obj):
         self._task              = task
         self._connection        = connection
@@ -95,6 +104,27 @@ class ActionBase(with_metaclass(ABCMeta, object)):
             )
         return results
 
+    def run_batch(self, batch, tmp=None, task_vars=None):
+        '''
+        Runs the action for several items of a loop, when BATCH_ITEMS is set.
+        The batch is a list of (item, args) tuples, args being the task args
+        templated for that item, and a list with one result per item is
+        returned, in the same order.
+
+        This implementation runs the items one after the other, actions
+        setting BATCH_ITEMS override it to run them all at once.
+        '''
+
+        results = []
+        args = self._task.args
+        try:
+            for (item, item_args) in batch:
+                self._task.args = item_args
+                results.append(self.run(tmp=tmp, task_vars=task_vars))
+        finally:
+            self._task.args = args
+        return results
+
     def _remote_file_exists(self, path):
         cmd = self._connection._shell.exists(path)
         result = self._low_level_execute_command(cmd=cmd, sudoable=True)
@@ -504,9 +534,15 @@ class ActionBase(with_metaclass(ABCMeta, object)):
         if sudoable and expand_path == '~' and self._play_context.become and self._play_context.become_user:
             expand_path = '~%s' % self._play_context.become_user
 
-        cmd = self._connection._shell.expand_user(expand_path)
-        data = self._low_level_execute_command(cmd, sudoable=False)
-        initial_fragment = data['stdout'].strip().splitlines()[-1]
+        cache_key = ('expand_user', expand_path, self._play_context.remote_user)
+        if cache_key in self._connection._remote_cache:
+            initial_fragment = self._connection._remote_cache[cache_key]
+        else:
+            cmd = self._connection._shell.expand_user(expand_path)
+            data = self._low_level_execute_command(cmd, sudoable=False)
+            initial_fragment = data['stdout'].strip().splitlines()[-1]
+            if initial_fragment:
+                self._connection._remote_cache[cache_key] = initial_fragment
 
         if not initial_fragment:
             # Something went wrong trying to expand the path remotely.  Return
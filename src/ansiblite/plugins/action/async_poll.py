@@ -0,0 +1,84 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+
+from six.moves import shlex_quote
+
+from ansiblite.plugins.action import ActionBase
+from ansiblite.utils._text import to_text
+
+
+# precedes the status file of each job in the output of the command
+_MARKER = '__ANSIBLE_ASYNC_POLL__'
+
+# where async_wrapper writes the status of the jobs, for the user they run as
+_ASYNC_DIR = '~/.ansible_async'
+
+
+class ActionModule(ActionBase):
+    '''
+    Reads the status of the async jobs given in jids with a single command,
+    for the async job tracker of the controller. Returns the status of each
+    job in jobs, by job id, as async_status returns it.
+    '''
+
+    def run(self, tmp=None, task_vars=None):
+        if task_vars is None:
+            task_vars = dict()
+
+        result = super(ActionModule, self).run(tmp, task_vars)
+
+        jids = self._task.args.get('jids') or []
+        cmd = 'for jid in %s; do f=%s/"$jid"; if [ -f "$f" ]; then echo; echo %s found "$jid"; cat "$f"; else echo; echo %s missing "$jid"; fi; done' % (
+            ' '.join(shlex_quote(to_text(jid)) for jid in jids), _ASYNC_DIR, _MARKER, _MARKER)
+
+        res = self._low_level_execute_command(cmd, sudoable=True)
+        if res['rc'] != 0:
+            result['failed'] = True
+            result['msg'] = 'Could not read the status of the async jobs: %s' % res['stderr']
+            return result
+
+        # split the output into the status file of each job
+        files = dict()
+        current = None
+        for line in res['stdout'].splitlines():
+            if line.startswith(_MARKER + ' '):
+                (found, jid) = line[len(_MARKER) + 1:].split(' ', 1)
+                current = files[jid] = [] if found == 'found' else None
+            elif current is not None:
+                current.append(line)
+
+        jobs = dict()
+        for jid in jids:
+            jid = to_text(jid)
+            if jid not in files:
+                continue
+            jobs[jid] = self._job_status(jid, files[jid])
+
+        result['jobs'] = jobs
+        return result
+
+    def _job_status(self, jid, lines):
+        if lines is None:
+            return dict(failed=True, finished=1, msg='could not find job', ansible_job_id=jid, _ansible_parsed=True)
+
+        data = '\n'.join(lines).strip()
+        if not data:
+            # the file is being written
+            return dict(started=1, finished=0, ansible_job_id=jid, _ansible_parsed=True)
+
+        try:
+            status = json.loads(data)
+        except ValueError:
+            # as is a half written file, which is not fatal as long as the
+            # job still has time
+            return dict(finished=0, ansible_job_id=jid, stdout=data, _ansible_parsed=False)
+
+        if 'started' not in status:
+            status['finished'] = 1
+            status['ansible_job_id'] = jid
+        elif 'finished' not in status:
+            status['finished'] = 0
+        status['_ansible_parsed'] = True
+        return status
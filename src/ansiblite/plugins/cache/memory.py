@@ -46,7 +46,8 @@ class CacheModule(BaseCacheModule):
         return self._cache.copy()
 
     def __getstate__(self):
-        return self.copy()
+        # never empty, or pickle would not call __setstate__
+        return dict(cache=self.copy())
 
     def __setstate__(self, data):
-        self._cache = data
+        self._cache = data['cache']
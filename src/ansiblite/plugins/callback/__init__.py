@@ -361,3 +361,6 @@ class CallbackBase:
 
     def v2_runner_retry(self, result):
         pass
+
+    def v2_playbook_on_worker_memory(self, report):
+        pass #no v1 correspondance
@@ -81,6 +81,10 @@ class ConnectionBase(with_metaclass(ABCMeta, object)):
         self.prompt = None
         self._connected = False
 
+        # results of remote lookups which do not change for the life of the
+        # connection (ie. home directories), shared by every task using it
+        self._remote_cache = dict()
+
         # load the shell plugin for this action/connection
         if play_context.shell:
             shell_type = play_context.shell
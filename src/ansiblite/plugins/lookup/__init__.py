@@ -94,7 +94,7 @@ class LookupBase(with_metaclass(ABCMeta, object)):
         must be converted into python's unicode type as the strings will be run
         through jinja2 which has this requirement.  You can use::
 
-            from ansible.module_utils._text import to_text
+            from ansiblite.utils._text import to_text
             result_string = to_text(result_string)
         """
         pass
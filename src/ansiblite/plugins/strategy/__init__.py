@@ -23,6 +23,7 @@ import threading
 import time
 
 from collections import deque
+from copy import deepcopy
 from multiprocessing import Lock
 from jinja2.exceptions import UndefinedError
 
@@ -32,17 +33,20 @@ from six import iteritems, string_types
 from ansiblite import constants as C
 from ansiblite.errors import AnsibleError, AnsibleParserError, AnsibleUndefinedVariable
 from ansiblite.executor import action_write_locks
-from ansiblite.executor.process.worker import WorkerProcess
+from ansiblite.executor.async_tracker import AsyncTracker
+from ansiblite.executor.process.autoscale import ForkAutoscaler
+from ansiblite.executor.process.threads import WorkerThread
+from ansiblite.executor.process.wire import decode_result
+from ansiblite.executor.result_store import memo_key
 from ansiblite.executor.task_result import TaskResult
 from ansiblite.inventory.host import Host
-from ansiblite.inventory.group import Group
 from ansiblite.playbook.helpers import load_list_of_blocks
 from ansiblite.playbook.included_file import IncludedFile
 from ansiblite.playbook.task_include import TaskInclude
 from ansiblite.playbook.role_include import IncludeRole
 from ansiblite.plugins import action_loader, connection_loader, filter_loader, lookup_loader, module_loader, test_loader
 from ansiblite.template import Templar
-from ansiblite.vars import combine_vars, strip_internal_keys
+from ansiblite.vars import strip_internal_keys
 from ansiblite.utils._text import to_text
 
 
@@ -69,20 +73,80 @@ class SharedPluginLoaderObj:
 
 
 _sentinel = object()
+def _receive_result(strategy, data):
+    '''
+    Decodes a frame read off the final queue, counting its bytes towards
+    the task it belongs to, which are added to the metrics of its final
+    result. Only called from the results thread.
+    '''
+
+    result = decode_result(data)
+    if isinstance(data, bytes):
+        key = (result._host, result._task)
+        queue_bytes = strategy._queue_bytes.pop(key, 0) + len(data)
+        if not is_final_result(result):
+            strategy._queue_bytes[key] = queue_bytes
+        elif '_ansible_metrics' in result._result:
+            result._result['_ansible_metrics']['queue_bytes'] = queue_bytes
+    return result
+
 def results_thread_main(strategy):
     while True:
         try:
-            result = strategy._final_q.get()
-            if type(result) == object:
-                break
-            else:
-                strategy._results_lock.acquire()
-                strategy._results.append(result)
+            # block until something arrives, then drain whatever else is
+            # already waiting so the lock is only taken once per batch
+            results = [_receive_result(strategy, strategy._final_q.get())]
+            while type(results[-1]) != object:
+                try:
+                    results.append(_receive_result(strategy, strategy._final_q.get_nowait()))
+                except Queue.Empty:
+                    break
+
+            strategy._results_lock.acquire()
+            try:
+                for result in results:
+                    if type(result) == object:
+                        break
+                    strategy._results.append(result)
+                    if is_final_result(result):
+                        # the worker which ran this task is now free for more work
+                        strategy._release_worker((result._host, result._task))
+                strategy._update_backlog_stats()
+                # wake up anything waiting on results or on a free worker
+                strategy._results_lock.notify_all()
+            finally:
                 strategy._results_lock.release()
+
+            if type(results[-1]) == object:
+                break
         except (IOError, EOFError):
             break
-        except Queue.Empty:
-            pass
+
+class ControllerResultQueue:
+    '''
+    Stands in for the results queue of the controller threads, handing
+    their results straight to the strategy instead of sending them through
+    the results thread.
+    '''
+
+    def __init__(self, strategy):
+        self._strategy = strategy
+
+    def put(self, result, block=True, timeout=None):
+        self._strategy._results_lock.acquire()
+        try:
+            self._strategy._results.append(result)
+            self._strategy._update_backlog_stats()
+            self._strategy._results_lock.notify_all()
+        finally:
+            self._strategy._results_lock.release()
+
+def is_final_result(result):
+    '''
+    Returns True if the given result is the last one a worker will send
+    for its current task (ie. not a per-item or retry result).
+    '''
+    return '_ansible_retry' not in result._result and '_ansible_item_result' not in result._result
 
 class StrategyBase:
 
@@ -108,24 +172,145 @@ class StrategyBase:
 
         # internal counters
         self._pending_results   = 0
-        self._cur_worker        = 0
 
         # this dictionary is used to keep track of hosts that have
         # outstanding tasks still in queue
         self._blocked_hosts     = dict()
 
+        # maps the (host name, task uuid) of each running task to the
+        # index of the worker running it, while the ready queue holds the
+        # indexes of the workers free to take a task. Both are only used
+        # with self._results_lock held, as the results thread updates them
+        self._busy_workers      = dict()
+        self._ready_workers     = deque(range(tqm._forks))
+
+        # with the remote engine, hosts may be sharded over the agents, and
+        # each agent then has a ready queue of its own, by agent index
+        self._shard_ready       = None
+        if tqm.shards_hosts():
+            self._shard_ready   = dict()
+            for idx in range(len(self._workers)):
+                self._shard_ready.setdefault(tqm.get_worker_shard(idx), deque()).append(idx)
+            self._ready_workers = deque()
+
+        # in adaptive mode, the autoscaler decides how many of the workers
+        # may be busy at once, the others being parked until it raises the
+        # limit. The pinning of hosts decides for itself with host affinity
+        self._parked_workers    = deque(range(tqm._forks, len(self._workers)))
+        if C.DEFAULT_FORKS_ADAPTIVE and not C.DEFAULT_HOST_AFFINITY and tqm._engine != 'remote':
+            self._autoscaler    = ForkAutoscaler(C.DEFAULT_FORKS_MIN, len(self._workers), tqm._forks)
+        else:
+            self._autoscaler    = None
+        # when each running task was dispatched, by (host name, task uuid)
+        self._dispatch_times    = dict()
+
+        # with rolling serial batches (see set_serial_batches()), the hosts
+        # still waiting to be let in along with the index of their batch, the
+        # hosts let in so far, the hosts of the batches which are not done
+        # yet, by batch index, the batch index of every host let in, the
+        # finished batches whose handlers are still to be run, and the
+        # batches over their max_fail_percentage
+        self._serial_batches    = None
+        self._waiting_hosts     = deque()
+        self._admitted_hosts    = []
+        self._open_batches      = dict()
+        self._host_batches      = dict()
+        self._rolling_flush     = []
+        self._broken_batches    = set()
+        self._admission_stopped = False
+
+        # with host affinity, every host is pinned to the worker it was
+        # first dispatched to, which keeps its connection open between
+        # tasks, and jobs queue up on that worker instead of waiting for
+        # a ready one
+        self._host_affinity     = C.DEFAULT_HOST_AFFINITY
+        self._host_workers      = dict()
+
+        # worker dispatch metrics, see get_dispatch_stats()
+        self._dispatch_stats    = dict(
+            dispatched    = 0,
+            waits         = 0,
+            wait_time     = 0.0,
+            max_wait_time = 0.0,
+            min_ready     = tqm._forks,
+            max_backlog   = 0,
+            reaped        = 0,
+            min_forks     = tqm._forks,
+            max_forks     = tqm._forks,
+            forks_adjustments = 0,
+        )
+
         self._results = deque()
         self._results_lock = threading.Condition(threading.Lock())
 
+        # bytes received so far for the running tasks which sent per item
+        # or retry results, by (host name, task uuid)
+        self._queue_bytes = dict()
+
+        # threads running the actions which do not need a worker, started
+        # on first use, and whether each action seen so far is one of them
+        self._controller_threads = []
+        self._controller_q       = Queue.Queue()
+        self._controller_actions = dict()
+
+        # delegated tasks coalesced across hosts: the hosts waiting on the
+        # result of another host for the same task, by the (host name, task
+        # uuid) of the task actually run
+        self._coalesced          = dict()
+
+        # the task vars and play context of the async tasks running, by
+        # (host name, task uuid), in case their job is handed over to the
+        # async job tracker, started on first use
+        self._async_jobs         = dict()
+        self._async_tracker      = None
+
         # create the result processing thread for reading results in the background
         self._results_thread = threading.Thread(target=results_thread_main, args=(self,))
         self._results_thread.daemon = True
         self._results_thread.start()
 
     def cleanup(self):
+        for thread in self._controller_threads:
+            self._controller_q.put(None)
+        for thread in self._controller_threads:
+            thread.join()
+        self._controller_threads = []
+
+        if self._async_tracker is not None:
+            self._async_tracker.stop()
+            self._async_tracker = None
+
         self._final_q.put(_sentinel)
         self._results_thread.join()
 
+        dispatch_stats = self.get_dispatch_stats()
+        display.debug("worker dispatch stats: %s" % dispatch_stats)
+        self._tqm._stats.update_dispatch_stats(dispatch_stats)
+        if self._autoscaler is not None:
+            self._tqm._stats.record_forks_adjustments(self._autoscaler.adjustments)
+
+    def get_dispatch_stats(self):
+        '''
+        Returns the worker dispatch metrics of this strategy: the number of
+        tasks dispatched, how many of them had to wait for a free worker and
+        for how long in total and at most (in seconds), the lowest number of
+        ready workers seen at dispatch time, the largest number of results
+        waiting to be processed, how many workers were found dead while
+        busy, and the lowest and highest number of forks in use along with
+        how many times the autoscaler changed it.
+        '''
+
+        self._results_lock.acquire()
+        try:
+            return self._dispatch_stats.copy()
+        finally:
+            self._results_lock.release()
+
+    def _update_backlog_stats(self):
+        # must be called with self._results_lock held
+        if len(self._results) > self._dispatch_stats['max_backlog']:
+            self._dispatch_stats['max_backlog'] = len(self._results)
+
     def run(self, iterator, play_context, result=0):
         # execute one more pass through the iterator without peeking, to
         # make sure that all of the hosts are advanced to their final task.
@@ -160,6 +345,152 @@ class StrategyBase:
         else:
             return self._tqm.RUN_OK
 
+    def set_serial_batches(self, batches):
+        '''
+        Runs the given serial batches of hosts as rolling batches: rather
+        than waiting for a batch to be done before the next one starts, the
+        hosts of the next batches are let in as soon as fewer hosts than the
+        batch size are still running. The max_fail_percentage of the play
+        and its handlers are still applied to each batch on its own.
+
+        Must be called once the play iterator has been built for all the
+        hosts of the batches, the strategies then calling
+        _update_serial_batches() between their rounds of tasks.
+        '''
+
+        self._serial_batches = batches
+        for (idx, batch) in enumerate(batches):
+            for host in batch:
+                self._waiting_hosts.append((idx, host))
+        self._admit_hosts(0)
+
+    def _admit_hosts(self, in_flight):
+        '''
+        Lets in the next waiting hosts until there are as many running as
+        the size of their batch.
+        '''
+
+        admitted = []
+        while self._waiting_hosts and not self._admission_stopped:
+            (idx, host) = self._waiting_hosts[0]
+            if in_flight >= len(self._serial_batches[idx]):
+                break
+            self._waiting_hosts.popleft()
+            self._open_batches.setdefault(idx, []).append(host)
+            self._host_batches[host.name] = idx
+            admitted.append(host)
+            in_flight += 1
+
+        if admitted:
+            display.debug("admitting %d more host(s) of the serial batches" % len(admitted))
+            self._admitted_hosts.extend(admitted)
+            self._inventory.restrict_to_hosts(self._admitted_hosts)
+            # every restriction is cached on its own, and they only grow
+            self._inventory.clear_pattern_cache()
+
+    def _serial_hosts_waiting(self):
+        ''' Returns True if hosts of the serial batches are still to be let in. '''
+        return bool(self._waiting_hosts) and not self._admission_stopped
+
+    def _batch_host_names(self, host):
+        '''
+        Returns the names of the hosts of the rolling serial batch the given
+        host is in, or None if the hosts are not run in rolling batches.
+        '''
+
+        idx = self._host_batches.get(host.name)
+        if idx is None:
+            return None
+        return frozenset(h.name for h in self._open_batches.get(idx, [host]))
+
+    def _host_done(self, host, iterator):
+        if host.name in self._tqm._unreachable_hosts:
+            return True
+        if self._blocked_hosts.get(host.name):
+            return False
+        (s, _) = iterator.get_next_task_for_host(host, peek=True)
+        return s.run_state == iterator.ITERATING_COMPLETE
+
+    def _checkpoint_due(self):
+        '''
+        Returns True if a checkpoint is due, in which case strategies which
+        keep tasks running all the time must let them finish, so that it can
+        be saved.
+        '''
+
+        checkpoint = self._tqm._checkpoint
+        return checkpoint is not None and checkpoint.due()
+
+    def _save_checkpoint(self, iterator):
+        '''
+        Saves the state of the play if a checkpoint is due and no task is
+        running.
+        '''
+
+        if self._pending_results == 0 and self._checkpoint_due():
+            self._tqm._checkpoint.save(self._tqm, iterator)
+
+    def _update_serial_batches(self, iterator, play_context):
+        '''
+        Checks the running serial batches: a batch over the max fail
+        percentage is failed and stops any more hosts from being let in,
+        the handlers of a batch are run once all its hosts are done (and no
+        other task is running), and the next hosts are let in. Returns the
+        flags to add to the result of the play.
+        '''
+
+        result = self._tqm.RUN_OK
+        if self._serial_batches is None:
+            return result
+
+        if self._waiting_hosts:
+            next_batch = self._waiting_hosts[0][0]
+        else:
+            next_batch = len(self._serial_batches)
+
+        in_flight = 0
+        for idx in sorted(self._open_batches):
+            hosts = self._open_batches[idx]
+            running = [h for h in hosts if not self._host_done(h, iterator)]
+            in_flight += len(running)
+
+            batch_size = len(self._serial_batches[idx])
+            failed = [h for h in hosts if h.name in self._tqm._unreachable_hosts or iterator.is_failed(h)]
+            max_fail_percentage = iterator._play.max_fail_percentage
+            if idx not in self._broken_batches and max_fail_percentage is not None and len(failed) / batch_size > max_fail_percentage / 100.0:
+                display.debug("serial batch %d is over the max fail percentage" % (idx+1))
+                self._broken_batches.add(idx)
+                # as with a serial batch, the rest of it is failed and
+                # the play stops there
+                for host in hosts:
+                    if not iterator.is_failed(host):
+                        self._tqm._failed_hosts[host.name] = True
+                        iterator.mark_host_failed(host)
+                self._admission_stopped = True
+                self._tqm.send_callback('v2_playbook_on_no_hosts_remaining')
+                result |= self._tqm.RUN_FAILED_BREAK_PLAY
+
+            if not running and idx < next_batch:
+                display.debug("serial batch %d is done" % (idx+1))
+                del self._open_batches[idx]
+                if len(failed) == batch_size:
+                    # the play does not go on once a whole batch has failed
+                    self._admission_stopped = True
+                    result |= self._tqm.RUN_FAILED_BREAK_PLAY
+                self._rolling_flush.append(hosts)
+
+        # handlers wait for whatever is running, as they collect all the
+        # pending results
+        if self._rolling_flush and self._pending_results == 0:
+            for hosts in self._rolling_flush:
+                handler_result = self.run_handlers(iterator, play_context, hosts=frozenset(h.name for h in hosts))
+                if isinstance(handler_result, bool) and not handler_result:
+                    result |= self._tqm.RUN_ERROR
+            self._rolling_flush = []
+
+        self._admit_hosts(in_flight)
+        return result
+
     def get_hosts_remaining(self, play):
         return [host for host in self._inventory.get_hosts(play.hosts)
                 if host.name not in self._tqm._failed_hosts and host.name not in self._tqm._unreachable_hosts]
@@ -190,36 +521,30 @@ class StrategyBase:
         # The next common higher level is __init__.py::run() and that has
         # tasks inside of play_iterator so we'd have to extract them to do it
         # there.
+        #
+        # Locks for the actions known when the worker pool was forked are
+        # created in TaskQueueManager._start_workers(). Any lock created here
+        # is not shared with the running workers, which fall back to the
+        # generic lock for those actions.
 
         if task.action not in action_write_locks.action_write_locks:
             display.debug('Creating lock for %s' % task.action)
             action_write_locks.action_write_locks[task.action] = Lock()
 
-        # and then queue the new task
-        try:
+        # actions which do not need a connection are not worth a worker
+        if self._runs_on_controller(task):
+            self._queue_controller_task(host, task, task_vars, play_context)
+            display.debug("exiting _queue_task() for %s/%s" % (host.name, task.action))
+            return
 
-            # create a dummy object with plugin loaders set as an easier
-            # way to share them with the forked processes
-            shared_loader_obj = SharedPluginLoaderObj()
-
-            queued = False
-            starting_worker = self._cur_worker
-            while True:
-                (worker_prc, rslt_q) = self._workers[self._cur_worker]
-                if worker_prc is None or not worker_prc.is_alive():
-                    worker_prc = WorkerProcess(self._final_q, task_vars, host, task, play_context, self._loader, self._variable_manager, shared_loader_obj)
-                    self._workers[self._cur_worker][0] = worker_prc
-                    worker_prc.start()
-                    display.debug("worker is %d (out of %d available)" % (self._cur_worker+1, len(self._workers)))
-                    queued = True
-                self._cur_worker += 1
-                if self._cur_worker >= len(self._workers):
-                    self._cur_worker = 0
-                if queued:
-                    break
-                elif self._cur_worker == starting_worker:
-                    time.sleep(0.0001)
+        if task.async != 0 and C.DEFAULT_ASYNC_POLL_THREADS > 0:
+            self._async_jobs[(host.name, task._uuid)] = (task_vars, play_context)
 
+        # and then queue the new task
+        try:
+            worker_idx = self._get_ready_worker(host, task)
+            self._tqm._submit_job(worker_idx, host, task, task_vars, play_context)
+            display.debug("worker is %d (out of %d available)" % (worker_idx+1, len(self._workers)))
             self._pending_results += 1
         except (EOFError, IOError, AssertionError) as e:
             # most likely an abort
@@ -227,6 +552,327 @@ class StrategyBase:
             return
         display.debug("exiting _queue_task() for %s/%s" % (host.name, task.action))
 
+    def _coalesce_key(self, task, action, task_vars):
+        '''
+        Returns the key under which the given task may be run once for all
+        the hosts for which it comes out the same, or None if it must run
+        for this host on its own.
+
+        Only delegated tasks running a module without an action plugin are
+        coalesced, as action plugins may make use of the vars of the host
+        (ie. the template action). The outcome of those is decided by the
+        delegated host (whose vars alone set up the connection), the module
+        arguments and the task's connection settings, which make up the key
+        once templated with the vars of the host. Tasks whose results are
+        checked against the vars of the host (until, changed_when and
+        failed_when) are left out as well.
+        '''
+
+        if not C.DEFAULT_COALESCE_DELEGATED or task.delegate_to is None or action is not None:
+            return None
+        if task.loop or task.until or task.changed_when or task.failed_when or task.async != 0 or \
+           task.action in ('include', 'include_role', 'meta'):
+            return None
+
+        templar = Templar(loader=self._loader, variables=task_vars)
+        try:
+            # the hosts skipping the task do so on their own
+            if not task.evaluate_conditional(templar, task_vars):
+                return None
+            return memo_key(dict(
+                action          = templar.template(task.action),
+                delegate_to     = templar.template(task.delegate_to),
+                delegate_facts  = templar.template(task.delegate_facts),
+                args            = templar.template(task.args),
+                environment     = templar.template(task.environment),
+                connection      = templar.template(task.connection),
+                port            = templar.template(task.port),
+                remote_user     = templar.template(task.remote_user),
+                become          = templar.template(task.become),
+                become_user     = templar.template(task.become_user),
+                become_method   = templar.template(task.become_method),
+                become_flags    = templar.template(task.become_flags),
+                check_mode      = templar.template(task.check_mode),
+                no_log          = templar.template(task.no_log),
+            ))
+        except (AnsibleError, UndefinedError):
+            return None
+
+    def _queue_coalesced(self, leader, host, task):
+        '''
+        Makes the given host wait on the result of the task run for the
+        leader host, instead of running it itself. Returns False if that
+        result was already processed, in which case the task has to be
+        queued for the host.
+        '''
+
+        followers = self._coalesced.get((leader.name, task._uuid))
+        if followers is None:
+            return False
+
+        display.debug("coalescing %s for %s with %s" % (task, host.name, leader.name))
+        followers.append(host)
+        self._blocked_hosts[host.name] = True
+        self._pending_results += 1
+        return True
+
+    def _fan_out_result(self, task_result):
+        '''
+        Queues a copy of the given result for each host which waited on it,
+        to be processed as theirs.
+        '''
+
+        followers = self._coalesced.pop((task_result._host.name, task_result._task._uuid), None)
+        if not followers:
+            return
+
+        results = []
+        for host in followers:
+            result = deepcopy(task_result._result)
+            # the resources were only used once
+            result.pop('_ansible_metrics', None)
+            results.append(TaskResult(host.name, task_result._task._uuid, result))
+
+        self._results_lock.acquire()
+        try:
+            self._results.extend(results)
+            self._results_lock.notify_all()
+        finally:
+            self._results_lock.release()
+
+    def _track_async_job(self, task_result, task_vars, play_context):
+        '''
+        Hands the job started by the task of the given result over to the
+        async job tracker, the task staying pending until it is done.
+        '''
+
+        if self._async_tracker is None:
+            self._async_tracker = AsyncTracker(self._loader, self._tqm._shared_loader_obj, ControllerResultQueue(self))
+        self._async_tracker.track(task_result, task_vars, play_context)
+
+    def _runs_on_controller(self, task):
+        '''
+        Returns True if the action plugin for the given task declares that
+        it never uses its connection, so it can be run in a thread of the
+        controller instead of being sent to a worker.
+        '''
+
+        if C.DEFAULT_CONTROLLER_THREADS <= 0 or task.async != 0:
+            return False
+
+        if task.action not in self._controller_actions:
+            try:
+                action = action_loader.get(task.action, class_only=True)
+            except ImportError:
+                action = None
+            self._controller_actions[task.action] = getattr(action, 'RUNS_ON_CONTROLLER', False)
+        return self._controller_actions[task.action]
+
+    def _queue_controller_task(self, host, task, task_vars, play_context):
+        '''
+        Queues the task up to be run by the controller threads, whose
+        results are added to self._results directly.
+        '''
+
+        if not self._controller_threads:
+            rslt_q = ControllerResultQueue(self)
+            for i in range(C.DEFAULT_CONTROLLER_THREADS):
+                thread = WorkerThread(rslt_q, self._controller_q, self._loader, self._tqm._shared_loader_obj)
+                thread.start()
+                self._controller_threads.append(thread)
+
+        self._controller_q.put((host, task, task_vars, play_context))
+        self._pending_results += 1
+
+    def _get_ready_worker(self, host, task):
+        '''
+        Takes the next worker off the ready queue and marks it as busy with
+        the given host and task, waiting for the results thread to free one
+        if they are all busy.
+        '''
+
+        self._results_lock.acquire()
+        try:
+            if self._host_affinity:
+                worker_idx = self._host_workers.get(host.name)
+                if worker_idx is None:
+                    slots = self._host_slots(host)
+                    worker_idx = self._host_workers[host.name] = slots[len(self._host_workers) % len(slots)]
+                self._busy_workers[(host.name, task._uuid)] = worker_idx
+                self._dispatch_stats['dispatched'] += 1
+                return worker_idx
+
+            ready_workers = self._ready_queue(host)
+            if not ready_workers:
+                started = last_check = time.time()
+                if self._autoscaler is not None:
+                    self._autoscaler.record_wait()
+                while not ready_workers:
+                    if self._autoscaler is not None:
+                        self._autoscale()
+                        if ready_workers:
+                            break
+                    self._results_lock.wait(C.DEFAULT_INTERNAL_WAIT_TIMEOUT)
+                    if not ready_workers and time.time() - last_check >= C.DEFAULT_INTERNAL_WAIT_TIMEOUT:
+                        self._reap_dead_workers()
+                        last_check = time.time()
+                waited = time.time() - started
+                self._dispatch_stats['waits'] += 1
+                self._dispatch_stats['wait_time'] += waited
+                self._dispatch_stats['max_wait_time'] = max(self._dispatch_stats['max_wait_time'], waited)
+
+            worker_idx = ready_workers.popleft()
+            self._busy_workers[(host.name, task._uuid)] = worker_idx
+            if self._autoscaler is not None:
+                self._dispatch_times[(host.name, task._uuid)] = time.time()
+            self._dispatch_stats['dispatched'] += 1
+            self._dispatch_stats['min_ready'] = min(self._dispatch_stats['min_ready'], self._ready_worker_count())
+            return worker_idx
+        finally:
+            self._results_lock.release()
+
+    def _release_worker(self, key):
+        '''
+        Marks the worker running the task of the given (host name, task uuid)
+        as free. Must be called with self._results_lock held.
+        '''
+
+        worker_idx = self._busy_workers.pop(key, None)
+        if worker_idx is None or self._host_affinity:
+            return
+
+        if self._autoscaler is None:
+            self._worker_ready_queue(worker_idx).append(worker_idx)
+            return
+
+        dispatched = self._dispatch_times.pop(key, None)
+        if dispatched is not None:
+            self._autoscaler.record_latency(key[1], time.time() - dispatched)
+
+        # workers above a lowered limit are parked as they become free
+        if self._active_workers() > self._autoscaler.limit:
+            self._parked_workers.append(worker_idx)
+        else:
+            self._ready_workers.append(worker_idx)
+        self._autoscale()
+
+    def _ready_queue(self, host):
+        '''
+        Returns the ready queue the given host takes its workers from.
+        '''
+
+        if self._shard_ready is None:
+            return self._ready_workers
+        return self._shard_ready[self._tqm.get_host_shard(host)]
+
+    def _worker_ready_queue(self, worker_idx):
+        '''
+        Returns the ready queue the worker of the given slot goes back to.
+        '''
+
+        if self._shard_ready is None:
+            return self._ready_workers
+        return self._shard_ready[self._tqm.get_worker_shard(worker_idx)]
+
+    def _ready_worker_count(self):
+        if self._shard_ready is None:
+            return len(self._ready_workers)
+        return sum(len(ready_workers) for ready_workers in self._shard_ready.values())
+
+    def _host_slots(self, host):
+        '''
+        Returns the indexes of the workers the given host may be pinned to
+        with host affinity.
+        '''
+
+        shard = self._tqm.get_host_shard(host)
+        if shard is None:
+            return range(len(self._workers))
+        return [idx for idx in range(len(self._workers)) if self._tqm.get_worker_shard(idx) == shard]
+
+    def _active_workers(self):
+        return len(self._workers) - len(self._parked_workers)
+
+    def _autoscale(self):
+        '''
+        Lets the autoscaler review the number of workers which may be busy
+        at once, unparking or parking ready workers to match it. Must be
+        called with self._results_lock held.
+        '''
+
+        if not self._autoscaler.due():
+            return
+
+        pids = [w[0].pid for w in self._workers if w[0] is not None and getattr(w[0], 'pid', None)]
+        limit = self._autoscaler.adjust(pids)
+        if limit is None:
+            return
+
+        while self._parked_workers and self._active_workers() < limit:
+            self._ready_workers.append(self._parked_workers.popleft())
+        while self._ready_workers and self._active_workers() > limit:
+            self._parked_workers.append(self._ready_workers.pop())
+
+        self._dispatch_stats['forks_adjustments'] += 1
+        self._dispatch_stats['min_forks'] = min(self._dispatch_stats['min_forks'], limit)
+        self._dispatch_stats['max_forks'] = max(self._dispatch_stats['max_forks'], limit)
+        self._results_lock.notify_all()
+
+    def _record_worker_shortage(self):
+        '''
+        Records that a task could not be queued yet for want of a ready
+        worker, for strategies which hold tasks back rather than wait in
+        _get_ready_worker().
+        '''
+
+        if self._autoscaler is None:
+            return
+
+        self._results_lock.acquire()
+        try:
+            self._autoscaler.record_wait()
+            self._autoscale()
+        finally:
+            self._results_lock.release()
+
+    def _reap_dead_workers(self):
+        '''
+        Frees the busy workers which have died (they are restarted when next
+        used), failing the tasks they were given as their results will never
+        come. Must be called with self._results_lock held.
+        '''
+
+        dead = set()
+        for ((host_name, task_uuid), worker_idx) in list(self._busy_workers.items()):
+            worker_prc = self._workers[worker_idx][0]
+            if worker_idx in dead or (worker_prc is not None and not worker_prc.is_alive()):
+                display.debug("worker %d died while running a task for %s" % (worker_idx+1, host_name))
+                dead.add(worker_idx)
+                self._release_worker((host_name, task_uuid))
+                self._results.append(TaskResult(host_name, task_uuid, dict(failed=True, msg="The worker running this task exited unexpectedly")))
+                self._dispatch_stats['reaped'] += 1
+
+        # drop whatever was still queued for them
+        for worker_idx in dead:
+            self._tqm._reset_worker(worker_idx)
+        if dead:
+            self._results_lock.notify_all()
+
+    def _wait_for_results(self):
+        '''
+        Blocks until the results thread has queued up new results, or the
+        wait times out.
+        '''
+
+        self._results_lock.acquire()
+        try:
+            if not self._results:
+                self._results_lock.wait(C.DEFAULT_INTERNAL_WAIT_TIMEOUT)
+                if not self._results:
+                    self._reap_dead_workers()
+        finally:
+            self._results_lock.release()
+
     def get_task_hosts(self, iterator, task_host, task):
         if task.run_once:
             host_list = [host for host in self._inventory.get_hosts(iterator._play.hosts) if host.name not in self._tqm._unreachable_hosts]
@@ -308,14 +954,26 @@ class StrategyBase:
         templar = Templar(loader=self._loader)
 
         cur_pass = 0
+        batch = deque()
         while True:
-            try:
+            if not batch:
+                # take as many of the waiting results as this call may process
+                # under a single acquisition of the lock
+                if one_pass:
+                    limit = 1
+                elif max_passes is not None:
+                    limit = max_passes - cur_pass
+                else:
+                    limit = None
                 self._results_lock.acquire()
-                task_result = self._results.pop()
-            except IndexError:
-                break
-            finally:
-                self._results_lock.release()
+                try:
+                    while self._results and (limit is None or len(batch) < limit):
+                        batch.append(self._results.popleft())
+                finally:
+                    self._results_lock.release()
+                if not batch:
+                    break
+            task_result = batch.popleft()
 
             # get the original host and task.  We then assign them to the TaskResult for use in callbacks/etc.
             original_host = get_original_host(task_result._host)
@@ -324,6 +982,18 @@ class StrategyBase:
             task_result._host = original_host
             task_result._task = original_task
 
+            # the jobs left running by async tasks are polled by the async
+            # job tracker, which hands back their final result
+            if self._async_jobs and is_final_result(task_result):
+                async_job = self._async_jobs.pop((original_host.name, original_task._uuid), None)
+                if async_job is not None and '_ansible_async_tracked' in task_result._result:
+                    self._track_async_job(task_result, *async_job)
+                    continue
+
+            # the hosts which waited on this result get it as well
+            if self._coalesced and is_final_result(task_result):
+                self._fan_out_result(task_result)
+
             # get the correct loop var for use later
             if original_task.loop_control:
                 loop_var = original_task.loop_control.loop_var or 'item'
@@ -536,6 +1206,10 @@ class StrategyBase:
                 # finally, send the ok for this task
                 self._tqm.send_callback('v2_runner_on_ok', task_result)
 
+            metrics = task_result.get_metrics()
+            if metrics is not None:
+                self._tqm._stats.update_task_metrics(original_host.name, original_task, metrics)
+
             self._pending_results -= 1
             if original_host.name in self._blocked_hosts:
                 del self._blocked_hosts[original_host.name]
@@ -560,8 +1234,8 @@ class StrategyBase:
 
     def _wait_on_pending_results(self, iterator):
         '''
-        Wait for the shared counter to drop to zero, using a short sleep
-        between checks to ensure we don't spin lock
+        Wait for the shared counter to drop to zero, sleeping on the results
+        condition between checks so we don't spin lock
         '''
 
         ret_results = []
@@ -575,7 +1249,7 @@ class StrategyBase:
             results = self._process_pending_results(iterator)
             ret_results.extend(results)
             if self._pending_results > 0:
-                time.sleep(C.DEFAULT_INTERNAL_POLL_INTERVAL)
+                self._wait_for_results()
 
         display.debug("no more pending results, returning what we have")
 
@@ -587,45 +1261,7 @@ class StrategyBase:
         '''
 
         host_name = host_info.get('host_name')
-
-        # Check if host in inventory, add if not
-        new_host = self._inventory.get_host(host_name)
-        if not new_host:
-            new_host = Host(name=host_name)
-            self._inventory._hosts_cache[host_name] = new_host
-            self._inventory.get_host_vars(new_host)
-
-            allgroup = self._inventory.get_group('all')
-            allgroup.add_host(new_host)
-
-        # Set/update the vars for this host
-        new_host.vars = combine_vars(new_host.vars, self._inventory.get_host_vars(new_host))
-        new_host.vars = combine_vars(new_host.vars,  host_info.get('host_vars', dict()))
-
-        new_groups = host_info.get('groups', [])
-        for group_name in new_groups:
-            if not self._inventory.get_group(group_name):
-                new_group = Group(group_name)
-                self._inventory.add_group(new_group)
-                self._inventory.get_group_vars(new_group)
-                new_group.vars = self._inventory.get_group_variables(group_name)
-            else:
-                new_group = self._inventory.get_group(group_name)
-
-            new_group.add_host(new_host)
-
-            # add this host to the group cache
-            if self._inventory.groups is not None:
-                if group_name in self._inventory.groups:
-                    if new_host not in self._inventory.get_group(group_name).hosts:
-                        self._inventory.get_group(group_name).hosts.append(new_host.name)
-
-        # clear pattern caching completely since it's unpredictable what
-        # patterns may have referenced the group
-        self._inventory.clear_pattern_cache()
-
-        # clear cache of group dict, which is used in magic host variables
-        self._inventory.clear_group_dict_cache()
+        self._inventory.add_dynamic_host(host_name, host_info.get('host_vars', dict()), host_info.get('groups', []))
 
         # also clear the hostvar cache entry for the given play, so that
         # the new hosts are available if hostvars are referenced
@@ -637,35 +1273,10 @@ class StrategyBase:
         specified host to that group.
         '''
 
-        changed = False
-
         # the host here is from the executor side, which means it was a
-        # serialized/cloned copy and we'll need to look up the proper
-        # host object from the master inventory
-        real_host = self._inventory.get_host(host.name)
-
-        group_name = result_item.get('add_group')
-        new_group = self._inventory.get_group(group_name)
-        if not new_group:
-            # create the new group and add it to inventory
-            new_group = Group(name=group_name)
-            self._inventory.add_group(new_group)
-            new_group.vars = self._inventory.get_group_vars(new_group)
-
-            # and add the group to the proper hierarchy
-            allgroup = self._inventory.get_group('all')
-            allgroup.add_child_group(new_group)
-            changed = True
-
-        if group_name not in host.get_groups():
-            new_group.add_host(real_host)
-            changed = True
-
-        if changed:
-            # clear cache of group dict, which is used in magic host variables
-            self._inventory.clear_group_dict_cache()
-
-        return changed
+        # serialized/cloned copy, so the inventory looks up the proper host
+        # object by name
+        return self._inventory.add_dynamic_group(host.name, result_item.get('add_group'))
 
     def _load_included_file(self, included_file, iterator, is_handler=False):
         '''
@@ -730,9 +1341,11 @@ class StrategyBase:
         display.debug("done processing included file")
         return block_list
 
-    def run_handlers(self, iterator, play_context):
+    def run_handlers(self, iterator, play_context, hosts=None):
         '''
-        Runs handlers on those hosts which have been notified.
+        Runs handlers on those hosts which have been notified, or only on
+        the notified hosts whose names are in hosts if given, leaving the
+        notifications of the others in place.
         '''
 
         result = self._tqm.RUN_OK
@@ -743,7 +1356,12 @@ class StrategyBase:
             #        we consider the ability of meta tasks to flush handlers
             for handler in handler_block.block:
                 if handler._uuid in self._notified_handlers and len(self._notified_handlers[handler._uuid]):
-                    result = self._do_handler_run(handler, handler.get_name(), iterator=iterator, play_context=play_context)
+                    notified_hosts = None
+                    if hosts is not None:
+                        notified_hosts = [h for h in self._notified_handlers[handler._uuid] if h.name in hosts]
+                        if not notified_hosts:
+                            continue
+                    result = self._do_handler_run(handler, handler.get_name(), iterator=iterator, play_context=play_context, notified_hosts=notified_hosts)
                     if not result:
                         break
         return result
@@ -768,7 +1386,7 @@ class StrategyBase:
             action = action_loader.get(handler.action, class_only=True)
             if handler.run_once or getattr(action, 'BYPASS_HOST_LOOP', False):
                 run_once = True
-        except KeyError:
+        except (KeyError, ImportError):
             # we don't care here, because the action may simply not have a
             # corresponding action plugin
             pass
@@ -824,8 +1442,9 @@ class StrategyBase:
                     display.warning(str(e))
                     continue
 
-        # wipe the notification list
-        self._notified_handlers[handler._uuid] = []
+        # wipe the notification list, of the hosts the handler ran for
+        ran_hosts = frozenset(h.name for h in notified_hosts)
+        self._notified_handlers[handler._uuid] = [h for h in self._notified_handlers.get(handler._uuid, []) if h.name not in ran_hosts]
         display.debug("done running handlers, result is: %s" % result)
         return result
 
@@ -873,7 +1492,9 @@ class StrategyBase:
             # FIXME: issue a callback for the noop here?
             msg="noop"
         elif meta_action == 'flush_handlers':
-            self.run_handlers(iterator, play_context)
+            # with rolling serial batches, only the handlers notified by the
+            # batch of the host are run, as they would be for a serial batch
+            self.run_handlers(iterator, play_context, hosts=self._batch_host_names(target_host))
             msg = "ran handlers"
         elif meta_action == 'refresh_inventory':
             self._inventory.refresh_inventory()
@@ -881,7 +1502,7 @@ class StrategyBase:
         elif meta_action == 'clear_facts':
             if _evaluate_conditional(target_host):
                 for host in self._inventory.get_hosts(iterator._play.hosts):
-                    self._variable_manager.clear_facts(host)
+                    self._variable_manager.clear_facts(host.name)
                 msg = "facts cleared"
             else:
                 skipped = True
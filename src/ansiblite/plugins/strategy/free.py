@@ -0,0 +1,352 @@
+# (c) 2012-2014, Michael DeHaan <michael.dehaan@gmail.com>
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from collections import deque
+
+from six import iteritems
+
+from ansiblite.errors import AnsibleError
+from ansiblite.playbook.included_file import IncludedFile
+from ansiblite.plugins import action_loader
+from ansiblite.plugins.strategy import StrategyBase
+from ansiblite.template import Templar
+from ansiblite.utils._text import to_text
+
+from ansiblite.utils.display import Display
+display = Display()
+
+
+class StrategyModule(StrategyBase):
+    '''
+    The free strategy lets every host run through the play at its own pace:
+    a host is given its next task as soon as the result of its previous one
+    has been processed, without waiting for the other hosts.
+
+    Hosts waiting for a task are served first in, first out, and no more
+    tasks are queued than there are idle workers. A host goes to the back of
+    the line once its result is in, so a few slow hosts never hold more than
+    one worker each, and the others keep cycling through the rest.
+
+    The look-ahead is bounded to a single task per host, taken only once the
+    previous result of that host has been processed, so the blocks brought in
+    by an include are in place before the host moves on. Handlers are flushed
+    per host: a host reaching a flush_handlers task is given the handlers it
+    notified, one at a time and in order, as its next tasks, while the other
+    hosts go on. The tasks of an included handler file are run by the host
+    once its other handlers are done.
+    '''
+
+    def __init__(self, tqm):
+        super(StrategyModule, self).__init__(tqm)
+
+        # action plugin classes, by action name
+        self._action_cache = dict()
+
+        # the hosts flushing their handlers, with the index of the next
+        # handler to look at
+        self._flushing_hosts = dict()
+
+    def _get_action(self, task):
+        if task.action not in self._action_cache:
+            try:
+                action = action_loader.get(task.action, class_only=True)
+            except (KeyError, ImportError):
+                # we don't care here, because the action may simply not have a
+                # corresponding action plugin
+                action = None
+            self._action_cache[task.action] = action
+        return self._action_cache[task.action]
+
+    def _is_flush_handlers(self, task):
+        return task.action == 'meta' and task.args.get('_raw_params') == 'flush_handlers'
+
+    def _idle_workers(self):
+        '''
+        Returns how many more tasks can be queued without any of them having
+        to wait for a worker.
+        '''
+
+        if self._host_affinity:
+            return len(self._workers) - len(self._busy_workers)
+        return self._ready_worker_count()
+
+    def _queue_host_task(self, host, task, iterator, play_context):
+        '''
+        Queues the next task of the host, which must already have been taken
+        off the iterator. Returns True if a worker was used for it, the host
+        then being blocked until its result is processed.
+        '''
+
+        host_name = host.get_name()
+
+        # check to see if this task should be skipped, due to it being a member of a
+        # role which has already run (and whether that role allows duplicate execution)
+        if task._role and task._role.has_run(host):
+            # If there is no metadata, the default behavior is to not allow duplicates,
+            # if there is metadata, check to see if the allow_duplicates flag was set to true
+            if task._role._metadata is None or task._role._metadata and not task._role._metadata.allow_duplicates:
+                display.debug("'%s' skipped because role has already run" % task)
+                return False
+
+        if task.action == 'meta':
+            self._execute_meta(task, play_context, iterator, target_host=host)
+            return False
+
+        # handle step if needed, skip meta actions as they are used internally
+        if self._step and not self._take_step(task, host_name):
+            return False
+
+        action = self._get_action(task)
+
+        display.debug("getting variables")
+        task_vars = self._variable_manager.get_vars(loader=self._loader, play=iterator._play, host=host, task=task)
+        self.add_tqm_variables(task_vars, play=iterator._play)
+        templar = Templar(loader=self._loader, variables=task_vars)
+        display.debug("done getting variables")
+
+        run_once = templar.template(task.run_once) or action and getattr(action, 'BYPASS_HOST_LOOP', False)
+        if run_once:
+            if action and getattr(action, 'BYPASS_HOST_LOOP', False):
+                raise AnsibleError("The '%s' module bypasses the host loop, which is currently not supported in the free strategy " \
+                                   "and would instead execute for every host in the inventory list." % task.action, obj=task._ds)
+            else:
+                display.warning("Using run_once with the free strategy is not currently supported. This task will still be " \
+                                "executed for every host in the inventory list.")
+
+        if task.any_errors_fatal:
+            display.warning("Using any_errors_fatal with the free strategy is not supported, as tasks are executed independently on each host")
+
+        saved_name = task.name
+        try:
+            task.name = to_text(templar.template(task.name, fail_on_undefined=False), nonstring='empty')
+        except:
+            # just ignore any errors during task name templating,
+            # we don't care if it just shows the raw name
+            display.debug("templating failed for some reason")
+        self._tqm.send_callback('v2_playbook_on_task_start', task, is_conditional=False)
+        task.name = saved_name
+
+        self._blocked_hosts[host_name] = True
+        self._queue_task(host, task, task_vars, play_context)
+        del task_vars
+
+        return not self._runs_on_controller(task)
+
+    def _add_included_files(self, included_files, iterator, play_context):
+        '''
+        Loads the included files, adding their blocks to the hosts which
+        included them. Unlike the linear strategy, the other hosts do not
+        need to be padded, as they do not move in lock-step.
+        '''
+
+        all_blocks = dict()
+        for included_file in included_files:
+            display.debug("collecting new blocks for %s" % included_file)
+            try:
+                new_blocks = self._load_included_file(included_file, iterator=iterator)
+            except AnsibleError as e:
+                for host in included_file._hosts:
+                    self._tqm._failed_hosts[host.name] = True
+                    iterator.mark_host_failed(host)
+                display.error(to_text(e), wrap_text=False)
+                continue
+
+            task_vars = self._variable_manager.get_vars(loader=self._loader, play=iterator._play, task=included_file._task)
+            for new_block in new_blocks:
+                final_block = new_block.filter_tagged_tasks(play_context, task_vars)
+                for host in included_file._hosts:
+                    all_blocks.setdefault(host, []).append(final_block)
+            display.debug("done collecting new blocks for %s" % included_file)
+
+        display.debug("adding all collected blocks from %d included file(s) to iterator" % len(included_files))
+        for (host, blocks) in iteritems(all_blocks):
+            iterator.add_tasks(host, blocks)
+        display.debug("done adding collected blocks to iterator")
+
+    def _next_notified_handler(self, host, iterator):
+        '''
+        Returns the next handler the flushing host was notified for, or None
+        once there are no more.
+        '''
+
+        handlers = [handler for handler_block in iterator._play.handlers for handler in handler_block.block]
+        idx = self._flushing_hosts[host.name]
+        while idx < len(handlers):
+            handler = handlers[idx]
+            idx += 1
+            if host.name in [h.name for h in self._notified_handlers.get(handler._uuid, [])]:
+                self._flushing_hosts[host.name] = idx
+                return handler
+        del self._flushing_hosts[host.name]
+        return None
+
+    def _queue_host_handler(self, host, handler, iterator, play_context):
+        '''
+        Queues a handler notified by the host, for this host only. Returns
+        True if a worker was used for it, as _queue_host_task() does.
+        '''
+
+        # the notification is used up, whether the handler runs or not
+        self._notified_handlers[handler._uuid] = [h for h in self._notified_handlers[handler._uuid] if h.name != host.name]
+        if handler.has_triggered(host) or (iterator.is_failed(host) and not play_context.force_handlers):
+            return False
+
+        self._tqm.send_callback('v2_playbook_on_handler_task_start', handler)
+
+        task_vars = self._variable_manager.get_vars(loader=self._loader, play=iterator._play, host=host, task=handler)
+        self.add_tqm_variables(task_vars, play=iterator._play)
+        self._blocked_hosts[host.get_name()] = True
+        self._queue_task(host, handler, task_vars, play_context)
+        del task_vars
+
+        return not self._runs_on_controller(handler)
+
+    def run(self, iterator, play_context):
+        '''
+        The "free" strategy is a bit more complex, in that it allows tasks to
+        be sent to hosts as quickly as they can be processed. This means that
+        some hosts may finish very quickly if run tasks result in little or no
+        work being done versus other systems.
+
+        Hosts are given their tasks in the order they became ready, which is
+        fair to all of them, rather than scanning the hosts list from the top
+        every time, which would end up favoring hosts near its beginning.
+        '''
+
+        result = self._tqm.RUN_OK
+
+        # the hosts which may be given a task, in the order they became
+        # ready, and the names of all the hosts seen so far
+        ready_hosts = deque()
+        known_hosts = set()
+
+        while not self._tqm._terminated:
+
+            try:
+                # with rolling serial batches, hosts are let in as the
+                # others are done, and each batch is checked on its own
+                result |= self._update_serial_batches(iterator, play_context)
+
+                # once a checkpoint is due, no task is queued until the
+                # running ones are done and it is saved
+                self._save_checkpoint(iterator)
+                checkpoint_due = self._checkpoint_due()
+
+                hosts_left = [host for host in self._inventory.get_hosts(iterator._play.hosts) if host.name not in self._tqm._unreachable_hosts]
+                if len(hosts_left) == 0:
+                    self._tqm.send_callback('v2_playbook_on_no_hosts_remaining')
+                    result = False
+                    break
+
+                # pick up the hosts added to the play since the last pass
+                for host in hosts_left:
+                    if host.name not in known_hosts:
+                        known_hosts.add(host.name)
+                        ready_hosts.append(host)
+
+                # give the ready hosts their next task (or handler), for as
+                # long as there are idle workers and no checkpoint is pending
+                budget = self._idle_workers()
+                requeue = []
+                while ready_hosts and budget > 0 and not self._rolling_flush and not checkpoint_due and not self._tqm._terminated:
+                    host = ready_hosts.popleft()
+                    host_name = host.get_name()
+                    if host_name in self._tqm._unreachable_hosts:
+                        continue
+
+                    if host_name in self._flushing_hosts:
+                        handler = self._next_notified_handler(host, iterator)
+                        if handler is not None:
+                            if self._queue_host_handler(host, handler, iterator, play_context):
+                                budget -= 1
+                            elif not self._blocked_hosts.get(host_name):
+                                requeue.append(host)
+                            continue
+
+                    (state, task) = iterator.get_next_task_for_host(host, peek=True)
+                    display.debug("free host state: %s" % state)
+                    display.debug("free host task: %s" % task)
+                    if task is None:
+                        display.debug("%s has no more tasks" % host_name)
+                        continue
+
+                    iterator.set_state_for_host(host, state, task)
+                    if self._is_flush_handlers(task):
+                        display.debug("%s is flushing its handlers" % host_name)
+                        self._flushing_hosts[host_name] = 0
+                        requeue.append(host)
+                        continue
+
+                    if self._queue_host_task(host, task, iterator, play_context):
+                        budget -= 1
+                    elif not self._blocked_hosts.get(host_name):
+                        # nothing is running for this host, it goes to the
+                        # back of the line for its next task
+                        requeue.append(host)
+                ready_hosts.extend(requeue)
+                if ready_hosts and budget <= 0:
+                    self._record_worker_shortage()
+
+                results = []
+                if self._pending_results > 0:
+                    results = self._process_pending_results(iterator)
+                    # hosts which went on without using a worker (ie. past a
+                    # meta task) can be given their next task right away
+                    if not results and not (requeue and budget > 0):
+                        self._wait_for_results()
+                        results = self._process_pending_results(iterator)
+
+                try:
+                    included_files = IncludedFile.process_include_results(
+                        results,
+                        self._tqm,
+                        iterator=iterator,
+                        inventory=self._inventory,
+                        loader=self._loader,
+                        variable_manager=self._variable_manager
+                    )
+                except AnsibleError:
+                    return self._tqm.RUN_ERROR
+
+                if len(included_files) > 0:
+                    self._add_included_files(included_files, iterator, play_context)
+
+                # the hosts whose result is in become ready again, now that
+                # the blocks of their includes have been added
+                for res in results:
+                    if not self._blocked_hosts.get(res._host.name):
+                        ready_hosts.append(res._host)
+
+                if not ready_hosts and self._pending_results == 0 and \
+                   not self._rolling_flush and not self._serial_hosts_waiting():
+                    break
+
+            except (IOError, EOFError) as e:
+                display.debug("got IOError/EOFError in task loop: %s" % e)
+                # most likely an abort, return failed
+                return self._tqm.RUN_UNKNOWN_ERROR
+
+        # collect all the final results
+        results = self._wait_on_pending_results(iterator)
+
+        # run the base class run() method, which executes the cleanup function
+        # and runs any outstanding handlers which have been triggered
+        return super(StrategyModule, self).run(iterator, play_context, result)
@@ -0,0 +1,420 @@
+# (c) 2012-2014, Michael DeHaan <michael.dehaan@gmail.com>
+#
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+# Make coding more python3-ish
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from collections import defaultdict
+
+from ansiblite.errors import AnsibleError
+from ansiblite.executor.play_iterator import PlayIterator
+from ansiblite.playbook.block import Block
+from ansiblite.playbook.included_file import IncludedFile
+from ansiblite.playbook.task import Task
+from ansiblite.plugins import action_loader
+from ansiblite.plugins.strategy import StrategyBase
+from ansiblite.template import Templar
+from ansiblite.utils._text import to_text
+
+from ansiblite.utils.display import Display
+display = Display()
+
+
+class StrategyModule(StrategyBase):
+    '''
+    The linear strategy keeps all hosts in lock-step: the next task is queued
+    for every host, and no host moves on until all of them are done with it.
+
+    The work is arranged so that only what truly depends on the host is done
+    per host: the next task of every host is computed in a single pass over
+    the iterator, hosts are grouped by task, and everything about a task
+    (its action plugin, run_once, the start callback and the tqm variables)
+    is worked out once before its hosts are queued in bulk. Results are then
+    processed in batches.
+    '''
+
+    def __init__(self, tqm):
+        super(StrategyModule, self).__init__(tqm)
+
+        # action plugin classes, by action name
+        self._action_cache = dict()
+
+    def _get_noop_task(self, iterator):
+        noop_task = Task()
+        noop_task.action = 'meta'
+        noop_task.args['_raw_params'] = 'noop'
+        noop_task.set_loader(iterator._play._loader)
+        return noop_task
+
+    def _get_action(self, task):
+        if task.action not in self._action_cache:
+            try:
+                action = action_loader.get(task.action, class_only=True)
+            except (KeyError, ImportError):
+                # we don't care here, because the action may simply not have a
+                # corresponding action plugin
+                action = None
+            self._action_cache[task.action] = action
+        return self._action_cache[task.action]
+
+    def _get_next_task_lockstep(self, hosts, iterator):
+        '''
+        Returns a list of (task, hosts) tuples, in the order the tasks should
+        be run, holding the next task for the hosts which are in the lowest
+        block and state still running. The other hosts are left where they
+        are, which keeps the iterator in lock step across all hosts.
+
+        With rolling serial batches, every batch is kept in lock step on its
+        own, so the hosts just let in do not hold back the ones further on,
+        and the meta tasks come first: a flush of the handlers of one batch
+        then never collects the results of the tasks of another.
+        '''
+
+        display.debug("building list of next tasks for hosts")
+        batches = defaultdict(list)
+        for host in hosts:
+            (s, t) = iterator.get_next_task_for_host(host, peek=True)
+            if t is not None:
+                batches[self._host_batches.get(host.name)].append((host, s, t))
+        display.debug("done building task lists")
+
+        rvals = []
+        for idx in sorted(batches, key=lambda idx: -1 if idx is None else idx):
+            rvals.extend(self._get_next_task_in_step(batches[idx], iterator))
+
+        if len(batches) > 1:
+            rvals.sort(key=lambda task_hosts: task_hosts[0].action != 'meta')
+        return rvals
+
+    def _get_next_task_in_step(self, host_tasks, iterator):
+        '''
+        Advances the hosts of the given (host, peeked state, peeked task)
+        tuples which are in the lowest block and state, returning their
+        (task, hosts) tuples.
+        '''
+
+        try:
+            lowest_cur_block = min(s.cur_block for (h, s, t) in host_tasks if s.run_state != PlayIterator.ITERATING_COMPLETE)
+        except ValueError:
+            # all hosts are done
+            display.debug("all hosts are done")
+            return []
+
+        # run the hosts in setup first, then the ones running tasks, and
+        # the ones in rescue or always last
+        states = defaultdict(list)
+        for (h, s, t) in host_tasks:
+            if s.cur_block == lowest_cur_block:
+                states[s.run_state].append((h, s, t))
+
+        for cur_state in (PlayIterator.ITERATING_SETUP, PlayIterator.ITERATING_TASKS, PlayIterator.ITERATING_RESCUE, PlayIterator.ITERATING_ALWAYS):
+            if cur_state in states:
+                break
+        else:
+            display.debug("no hosts left to advance")
+            return []
+
+        # the peeked states become the current ones for the hosts we run,
+        # and the hosts are grouped by task, in the order they were given
+        display.debug("starting to advance hosts")
+        rvals = []
+        task_hosts = dict()
+        for (host, s, t) in states[cur_state]:
+            iterator.set_state_for_host(host, s, t)
+            if t._uuid not in task_hosts:
+                task_hosts[t._uuid] = []
+                rvals.append((t, task_hosts[t._uuid]))
+            task_hosts[t._uuid].append(host)
+        display.debug("done advancing hosts to next task")
+
+        return rvals
+
+    def _send_task_start(self, task, templar):
+        display.debug("sending task start callback, templating the name temporarily")
+        saved_name = task.name
+        try:
+            task.name = to_text(templar.template(task.name, fail_on_undefined=False), nonstring='empty')
+        except:
+            # just ignore any errors during task name templating,
+            # we don't care if it just shows the raw name
+            display.debug("templating failed for some reason")
+        self._tqm.send_callback('v2_playbook_on_task_start', task, is_conditional=False)
+        task.name = saved_name
+
+    def _queue_task_for_hosts(self, task, hosts, iterator, play_context):
+        '''
+        Queues the task for all the given hosts, returning the results
+        processed meanwhile, whether the task is any_errors_fatal and whether
+        the user chose to skip it (in step mode).
+        '''
+
+        results = []
+        any_errors_fatal = False
+
+        if task.action == 'meta':
+            # for the linear strategy, we run meta tasks just once and for
+            # all hosts currently being iterated over
+            results.extend(self._execute_meta(task, play_context, iterator, hosts[0]))
+            return (results, any_errors_fatal, False)
+
+        # handle step if needed, skip meta actions as they are used internally
+        if self._step and not self._take_step(task):
+            return (results, any_errors_fatal, True)
+
+        action = self._get_action(task)
+
+        # the tqm variables are the same for every host
+        tqm_vars = dict()
+        self.add_tqm_variables(tqm_vars, play=iterator._play)
+
+        # the host each coalesced run of the task is made for, by key
+        coalesce_leaders = dict()
+
+        run_once = None
+        for host in hosts:
+            if self._tqm._terminated:
+                break
+
+            # check to see if this task should be skipped, due to it being a member of a
+            # role which has already run (and whether that role allows duplicate execution)
+            if task._role and task._role.has_run(host):
+                # If there is no metadata, the default behavior is to not allow duplicates,
+                # if there is metadata, check to see if the allow_duplicates flag was set to true
+                if task._role._metadata is None or task._role._metadata and not task._role._metadata.allow_duplicates:
+                    display.debug("'%s' skipped because role has already run" % task)
+                    continue
+
+            display.debug("getting variables")
+            task_vars = self._variable_manager.get_vars(loader=self._loader, play=iterator._play, host=host, task=task)
+            task_vars.update(tqm_vars)
+            display.debug("done getting variables")
+
+            if run_once is None:
+                # the task level fields are templated with the vars of the
+                # first host, and the start callback is sent once
+                templar = Templar(loader=self._loader, variables=task_vars)
+                run_once = templar.template(task.run_once) or action and getattr(action, 'BYPASS_HOST_LOOP', False)
+                if (task.any_errors_fatal or run_once) and not task.ignore_errors:
+                    any_errors_fatal = True
+                self._send_task_start(task, templar)
+
+            # hosts for which a delegated task comes out the same share a
+            # single run of it
+            coalesce_key = None
+            if not run_once:
+                coalesce_key = self._coalesce_key(task, action, task_vars)
+            leader = coalesce_leaders.get(coalesce_key)
+            if leader is not None and self._queue_coalesced(leader, host, task):
+                del task_vars
+                continue
+
+            self._blocked_hosts[host.get_name()] = True
+            self._queue_task(host, task, task_vars, play_context)
+            del task_vars
+            if coalesce_key is not None:
+                coalesce_leaders[coalesce_key] = host
+                self._coalesced[(host.name, task._uuid)] = []
+
+            # if we're bypassing the host loop, break out now
+            if run_once:
+                break
+
+            # handle whatever results came in while queueing, in one batch
+            if self._results:
+                results += self._process_pending_results(iterator)
+
+        return (results, any_errors_fatal, False)
+
+    def _add_included_files(self, included_files, hosts_left, iterator, play_context):
+        '''
+        Loads the included files, adding their blocks to the hosts which
+        included them and an equal-length list of noop tasks to the others,
+        to make sure that they continue running in lock-step.
+        '''
+
+        noop_task = self._get_noop_task(iterator)
+
+        if self._serial_batches is not None:
+            # only the rolling batches which ran the includes are in step
+            # with the hosts which included them
+            batches = set(self._host_batches.get(h.name) for f in included_files for h in f._hosts)
+            hosts_left = [h for h in hosts_left if self._host_batches.get(h.name) in batches]
+
+        display.debug("generating all_blocks data")
+        all_blocks = dict((host, []) for host in hosts_left)
+        display.debug("done generating all_blocks data")
+        for included_file in included_files:
+            display.debug("processing included file: %s" % included_file._filename)
+            try:
+                new_blocks = self._load_included_file(included_file, iterator=iterator)
+
+                task_vars = self._variable_manager.get_vars(
+                    loader=self._loader,
+                    play=iterator._play,
+                    task=included_file._task,
+                )
+                included_hosts = frozenset(included_file._hosts)
+
+                display.debug("iterating over new_blocks loaded from include file")
+                for new_block in new_blocks:
+                    final_block = new_block.filter_tagged_tasks(play_context, task_vars)
+
+                    noop_block = Block(parent_block=included_file._task._parent)
+                    noop_block.block  = [noop_task for t in new_block.block]
+                    noop_block.always = [noop_task for t in new_block.always]
+                    noop_block.rescue = [noop_task for t in new_block.rescue]
+
+                    for host in hosts_left:
+                        if host in included_hosts:
+                            all_blocks[host].append(final_block)
+                        else:
+                            all_blocks[host].append(noop_block)
+                display.debug("done iterating over new_blocks loaded from include file")
+
+            except AnsibleError as e:
+                for host in included_file._hosts:
+                    self._tqm._failed_hosts[host.name] = True
+                    iterator.mark_host_failed(host)
+                display.error(to_text(e), wrap_text=False)
+                continue
+
+        # finally go through all of the hosts and append the
+        # accumulated blocks to their list of tasks
+        display.debug("extending task lists for all hosts with included blocks")
+        for host in hosts_left:
+            iterator.add_tasks(host, all_blocks[host])
+        display.debug("done extending task lists")
+
+    def run(self, iterator, play_context):
+        '''
+        The linear strategy is simple - get the next task and queue
+        it for all hosts, then wait for the queue to drain before
+        moving on to the next task
+        '''
+
+        # iterate over each task, while there is one left to run
+        result = self._tqm.RUN_OK
+        work_to_do = True
+        while work_to_do and not self._tqm._terminated:
+
+            try:
+                # with rolling serial batches, hosts are let in as the
+                # others are done, and each batch is checked on its own
+                result |= self._update_serial_batches(iterator, play_context)
+
+                # all the tasks queued so far are done at this point
+                self._save_checkpoint(iterator)
+
+                display.debug("getting the remaining hosts for this loop")
+                hosts_left = [host for host in self._inventory.get_hosts(iterator._play.hosts) if host.name not in self._tqm._unreachable_hosts]
+                display.debug("done getting the remaining hosts for this loop")
+
+                work_to_do = self._serial_hosts_waiting()
+                skip_rest = False
+                any_errors_fatal = False
+
+                results = []
+                for (task, task_hosts) in self._get_next_task_lockstep(hosts_left, iterator):
+                    if self._tqm._terminated:
+                        break
+
+                    work_to_do = True
+                    (task_results, task_errors_fatal, skip_rest) = self._queue_task_for_hosts(task, task_hosts, iterator, play_context)
+                    results.extend(task_results)
+                    any_errors_fatal = any_errors_fatal or task_errors_fatal
+                    if skip_rest:
+                        break
+
+                # go to next host/task group
+                if skip_rest:
+                    continue
+
+                display.debug("done queuing things up, now waiting for results queue to drain")
+                if self._pending_results > 0:
+                    results += self._wait_on_pending_results(iterator)
+
+                try:
+                    included_files = IncludedFile.process_include_results(
+                        results,
+                        self._tqm,
+                        iterator=iterator,
+                        inventory=self._inventory,
+                        loader=self._loader,
+                        variable_manager=self._variable_manager
+                    )
+                except AnsibleError:
+                    # this is a fatal error, so we abort here regardless of block state
+                    return self._tqm.RUN_ERROR
+
+                if len(included_files) > 0:
+                    display.debug("we have included files to process")
+                    self._add_included_files(included_files, hosts_left, iterator, play_context)
+                    display.debug("done processing included files")
+
+                display.debug("results queue empty")
+
+                display.debug("checking for any_errors_fatal")
+                failed_hosts = []
+                unreachable_hosts = []
+                for res in results:
+                    if res.is_failed() and iterator.is_failed(res._host):
+                        failed_hosts.append(res._host.name)
+                    elif res.is_unreachable():
+                        unreachable_hosts.append(res._host.name)
+
+                # if any_errors_fatal and we had an error, mark all hosts as failed
+                if any_errors_fatal and (len(failed_hosts) > 0 or len(unreachable_hosts) > 0):
+                    for host in hosts_left:
+                        (s, _) = iterator.get_next_task_for_host(host, peek=True)
+                        if s.run_state != iterator.ITERATING_RESCUE or \
+                           s.run_state == iterator.ITERATING_RESCUE and s.fail_state & iterator.FAILED_RESCUE != 0:
+                            self._tqm._failed_hosts[host.name] = True
+                            result |= self._tqm.RUN_FAILED_BREAK_PLAY
+                display.debug("done checking for any_errors_fatal")
+
+                display.debug("checking for max_fail_percentage")
+                if iterator._play.max_fail_percentage is not None and len(results) > 0 and self._serial_batches is None:
+                    percentage = iterator._play.max_fail_percentage / 100.0
+
+                    if (len(self._tqm._failed_hosts) / len(results)) > percentage:
+                        for host in hosts_left:
+                            # don't double-mark hosts, or the iterator will potentially
+                            # fail them out of the rescue/always states
+                            if host.name not in failed_hosts:
+                                self._tqm._failed_hosts[host.name] = True
+                                iterator.mark_host_failed(host)
+                        self._tqm.send_callback('v2_playbook_on_no_hosts_remaining')
+                        result |= self._tqm.RUN_FAILED_BREAK_PLAY
+                display.debug("done checking for max_fail_percentage")
+
+                display.debug("checking to see if all hosts have failed and the running result is not ok")
+                if result != self._tqm.RUN_OK and len(self._tqm._failed_hosts) >= len(hosts_left):
+                    display.debug("^ not ok, so returning result now")
+                    self._tqm.send_callback('v2_playbook_on_no_hosts_remaining')
+                    return result
+                display.debug("done checking to see if all hosts have failed")
+
+            except (IOError, EOFError) as e:
+                display.debug("got IOError/EOFError in task loop: %s" % e)
+                # most likely an abort, return failed
+                return self._tqm.RUN_UNKNOWN_ERROR
+
+        # run the base class run() method, which executes the cleanup function
+        # and runs any outstanding handlers which have been triggered
+
+        return super(StrategyModule, self).run(iterator, play_context, result)
@@ -4,6 +4,7 @@ from ansiblite.inventory import Inventory
 from ansiblite.vars import VariableManager
 from ansiblite.parsing.dataloader import DataLoader
 from ansiblite.executor.playbook_executor import PlaybookExecutor
+from ansiblite.executor.process.remote import parse_address, serve
 
 from ansiblite.utils.display import Display
 display = Display()
@@ -61,3 +62,13 @@ def run_playbooks(playbooks, options=None):
     results = pbex.run()
 
     print(results)
+
+
+def run_agent(address):
+    ''' run the workers of the controllers using the remote execution engine,
+    until interrupted
+    '''
+    try:
+        serve(parse_address(address))
+    except KeyboardInterrupt:
+        pass
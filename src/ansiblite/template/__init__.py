@@ -37,6 +37,8 @@ from jinja2.runtime import Context, StrictUndefined
 from ansiblite import constants as C
 from ansiblite.errors import AnsibleError, AnsibleFilterError, AnsibleUndefinedVariable
 from ansiblite.plugins import filter_loader, lookup_loader, test_loader
+from ansiblite.template import fastpath
+from ansiblite.template.cache import compiled_templates, template_bytecode_cache
 from ansiblite.template.safe_eval import safe_eval
 from ansiblite.template.template import AnsibleJ2Template
 from ansiblite.template.vars import AnsibleJ2Vars
@@ -208,6 +210,7 @@ class Templar:
             extensions=self._get_extensions(),
             finalize=self._finalize,
             loader=FileSystemLoader(self._basedir),
+            bytecode_cache=template_bytecode_cache(),
         )
 
         self.SINGLE_VAR = re.compile(r"^%s\s*(\w*)\s*%s$" % (self.environment.variable_start_string, self.environment.variable_end_string))
@@ -388,7 +391,7 @@ class Templar:
                                 if eval_results[1] is None:
                                     result = eval_results[0]
                                     if unsafe:
-                                        from ansible.vars.unsafe_proxy import wrap_var
+                                        from ansiblite.vars.unsafe_proxy import wrap_var
                                         result = wrap_var(result)
                                 else:
                                     # FIXME: if the safe_eval raised an error, should we do something with it?
@@ -491,7 +494,7 @@ class Templar:
         if instance is not None:
             wantlist = kwargs.pop('wantlist', False)
 
-            from ansible.utils.listify import listify_lookup_plugin_terms
+            from ansiblite.utils.listify import listify_lookup_plugin_terms
             loop_terms = listify_lookup_plugin_terms(terms=args, templar=self, loader=self._loader, fail_on_undefined=True, convert_bare=False)
             # safely catch run failures per #5059
             try:
@@ -504,7 +507,7 @@ class Templar:
                 ran = None
 
             if ran:
-                from ansible.vars.unsafe_proxy import UnsafeProxy, wrap_var
+                from ansiblite.vars.unsafe_proxy import UnsafeProxy, wrap_var
                 if wantlist:
                     ran = wrap_var(ran)
                 else:
@@ -528,6 +531,14 @@ class Templar:
         if fail_on_undefined is None:
             fail_on_undefined = self._fail_on_undefined_errors
 
+        if fastpath.enabled and overrides is None:
+            # a single trivial expression is evaluated without jinja2
+            fast = fastpath.compile_fast_expression(data, self.environment)
+            if fast is not None:
+                res = self._fast_template(fast, disable_lookups)
+                if res is not None:
+                    return res
+
         try:
             # allows template header overrides to change jinja2 options.
             if overrides is None:
@@ -555,7 +566,10 @@ class Templar:
                 data = _escape_backslashes(data, myenv)
 
             try:
-                t = myenv.from_string(data)
+                # the code compiled from the same string is shared by all
+                # the Templar instances of the process
+                code = compiled_templates.compile(myenv, data)
+                t = myenv.template_class.from_code(myenv, code, myenv.make_globals(None), None)
             except TemplateSyntaxError as e:
                 raise AnsibleError("template error while templating string: %s. String: %s" % (to_native(e), to_native(data)))
             except Exception as e:
@@ -579,7 +593,7 @@ class Templar:
             try:
                 res = j2_concat(rf)
                 if new_context.unsafe:
-                    from ansible.vars.unsafe_proxy import wrap_var
+                    from ansiblite.vars.unsafe_proxy import wrap_var
                     res = wrap_var(res)
             except TypeError as te:
                 if 'StrictUndefined' in to_native(te):
@@ -616,3 +630,66 @@ class Templar:
 
     # for backwards compatibility in case anyone is using old private method directly
     _do_template = do_template
+
+    def _evaluate_expression(self, code, disable_lookups=False):
+        '''
+        Runs the given code, compiled from a template assigning an expression
+        to result, with the same filters, globals and context as do_template
+        renders templates with, and returns the value of the expression.
+        '''
+
+        # the overlays do_template renders in share these with the environment
+        myenv = self.environment
+        myenv.filters.update(self._get_filters())
+        myenv.tests.update(self._get_tests())
+
+        t = myenv.template_class.from_code(myenv, code, myenv.make_globals(None), None)
+
+        if disable_lookups:
+            t.globals['lookup'] = self._fail_lookup
+        else:
+            t.globals['lookup'] = self._lookup
+
+        t.globals['finalize'] = self._finalize
+
+        jvars = AnsibleJ2Vars(self, t.globals)
+
+        new_context = t.new_context(jvars, shared=True)
+        try:
+            for event in t.root_render_func(new_context):
+                pass
+        except TypeError as te:
+            if 'StrictUndefined' in to_native(te):
+                errmsg  = "Unable to look up a name or access an attribute in an expression.\n"
+                errmsg += "Make sure your variable name does not contain invalid characters like '-': %s" % to_native(te)
+                raise AnsibleUndefinedVariable(errmsg)
+            else:
+                raise AnsibleError("Unexpected templating type error occurred: %s" % to_native(te))
+        return new_context.vars['result']
+
+    def _fast_template(self, fast, disable_lookups):
+        '''
+        Renders the given FastExpression with the same filters, globals and
+        context as a template would be, returning None if it needs the full
+        rendering.
+        '''
+
+        # the overlays do_template renders in share these with the environment
+        myenv = self.environment
+        myenv.filters.update(self._get_filters())
+
+        globals = myenv.make_globals(None)
+        if disable_lookups:
+            globals['lookup'] = self._fail_lookup
+        else:
+            globals['lookup'] = self._lookup
+        globals['finalize'] = self._finalize
+
+        jvars = AnsibleJ2Vars(self, globals)
+        context = myenv.context_class(myenv, jvars, None, {})
+
+        res = fast.render(myenv, context)
+        if res is not None and context.unsafe:
+            from ansiblite.vars.unsafe_proxy import wrap_var
+            res = wrap_var(res)
+        return res
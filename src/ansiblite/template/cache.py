@@ -0,0 +1,251 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import fnmatch
+import os
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+from jinja2.bccache import FileSystemBytecodeCache
+
+from ansiblite import constants as C
+from ansiblite.errors import AnsibleError
+from ansiblite.utils._text import to_native
+from ansiblite.utils.path import makedirs_safe
+
+from ansiblite.utils.display import Display
+display = Display()
+
+__all__ = ['CompiledTemplateCache', 'TemplateBytecodeCache', 'compiled_templates', 'template_bytecode_cache']
+
+# Compiled templates.
+#
+# Rendering a template string used to lex, parse and compile it to Python code
+# every time, in a new overlay of a new Templar's environment, though the same
+# strings are templated over and over for every host and task. The code jinja2
+# compiles only depends on the source and on the options of the environment
+# which change how it is generated (the delimiters, whitespace handling,
+# extensions and so on), so it is kept in a process-wide LRU cache under those,
+# and shared by all the Templar instances: a hit only has to run the code to
+# make a template object for the environment at hand.
+#
+# The filters and tests of the environment are not part of the key: the code
+# looks them up when it is run, and those of all the Templar instances of a
+# process come from the same plugin loaders, which only ever gain some.
+#
+# The code compiled from the larger templates (the contents of template files
+# mostly) is also kept on disk, in template_bytecode_cache, so that the other
+# processes and the next runs do not have to compile them again. So are the
+# templates jinja2 loads itself ({% include %} and the like). Every file holds
+# the checksum of its source, checked when it is read, and is written to a
+# temporary file renamed into place, so concurrent workers and runs can share
+# the directory. Once the files take more than template_bytecode_cache_size
+# megabytes, the least recently used ones are removed.
+
+# the smallest template source whose code is kept on disk
+_MIN_PERSISTED_SOURCE = 256
+
+
+def compile_key(environment, source):
+    '''
+    Returns the key of the code compiled from the given source in the given
+    environment.
+    '''
+
+    return (
+        source,
+        environment.block_start_string,
+        environment.block_end_string,
+        environment.variable_start_string,
+        environment.variable_end_string,
+        environment.comment_start_string,
+        environment.comment_end_string,
+        environment.line_statement_prefix,
+        environment.line_comment_prefix,
+        environment.trim_blocks,
+        environment.lstrip_blocks,
+        environment.newline_sequence,
+        environment.keep_trailing_newline,
+        tuple(sorted(environment.extensions)),
+        environment.optimized,
+        environment.autoescape,
+        environment.finalize is not None,
+        environment.is_async,
+    )
+
+
+class CompiledTemplateCache:
+    '''
+    A bounded LRU cache of the code compiled from template strings, counting
+    its hits and misses.
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.hits     = 0
+        self.misses   = 0
+
+        self._codes = OrderedDict()
+        self._lock  = threading.Lock()
+
+    def compile(self, environment, source):
+        '''
+        Returns the code compiled from the given source in the given
+        environment, compiling it only if it is not cached.
+        '''
+
+        if self.capacity <= 0:
+            return environment.compile(source)
+
+        key = compile_key(environment, source)
+        with self._lock:
+            code = self._codes.pop(key, None)
+            if code is not None:
+                self._codes[key] = code
+                self.hits += 1
+                return code
+            self.misses += 1
+
+        # compiled outside of the lock, a template compiled twice at the
+        # same time is simply cached twice
+        code = None
+        bytecode_cache = None
+        if len(source) >= _MIN_PERSISTED_SOURCE:
+            bytecode_cache = template_bytecode_cache()
+        if bytecode_cache is not None:
+            try:
+                # the name alone picks the file, so it holds the source too
+                bucket = bytecode_cache.get_bucket(environment, repr(key), None, source)
+                code = bucket.code
+            except UnicodeError:
+                bytecode_cache = None
+        if code is None:
+            code = environment.compile(source)
+            if bytecode_cache is not None:
+                bucket.code = code
+                bytecode_cache.set_bucket(bucket)
+
+        with self._lock:
+            self._codes[key] = code
+            while len(self._codes) > self.capacity:
+                self._codes.popitem(last=False)
+        return code
+
+    def stats(self):
+        '''
+        Returns the hits, misses and current size of the cache.
+        '''
+
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, size=len(self._codes), capacity=self.capacity)
+
+    def clear(self):
+        with self._lock:
+            self._codes.clear()
+            self.hits = self.misses = 0
+
+
+class TemplateBytecodeCache(FileSystemBytecodeCache):
+    '''
+    A jinja2 bytecode cache in the given directory, which workers and runs
+    can share, evicting the least recently used files once they take more
+    than max_size bytes.
+    '''
+
+    def __init__(self, directory, max_size):
+        super(TemplateBytecodeCache, self).__init__(directory, pattern='__ansible_jinja2_%s.cache')
+        self.max_size = max_size
+
+    def load_bytecode(self, bucket):
+        filename = self._get_cache_filename(bucket)
+        try:
+            with open(filename, 'rb') as f:
+                bucket.load_bytecode(f)
+        except (IOError, OSError):
+            return
+        except Exception as e:
+            # a corrupted file, which is replaced once compiled again
+            display.debug("ignoring the template bytecode cache file %s: %s" % (filename, to_native(e)))
+            bucket.reset()
+            return
+
+        if bucket.code is not None:
+            # the files used last are the last ones evicted
+            try:
+                os.utime(filename, None)
+            except OSError:
+                pass
+
+    def dump_bytecode(self, bucket):
+        try:
+            makedirs_safe(self.directory, 0o700)
+            (fd, tmp_path) = tempfile.mkstemp(prefix='.tmp', dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    bucket.write_bytecode(f)
+                os.rename(tmp_path, self._get_cache_filename(bucket))
+            except:
+                os.unlink(tmp_path)
+                raise
+        except (AnsibleError, IOError, OSError, TypeError, ValueError) as e:
+            display.debug("could not write to the template bytecode cache: %s" % to_native(e))
+            return
+
+        self._evict()
+
+    def _evict(self):
+        '''
+        Removes the least recently used files once they all take more than
+        max_size bytes, down to nine tenths of it so it is not done on every
+        write.
+        '''
+
+        try:
+            names = fnmatch.filter(os.listdir(self.directory), self.pattern % '*')
+        except OSError:
+            return
+
+        entries = []
+        total = 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if total <= self.max_size:
+            return
+
+        entries.sort()
+        for (mtime, size, path) in entries:
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                # removed by another process in the meantime
+                pass
+            total -= size
+
+
+_bytecode_cache = None
+
+
+def template_bytecode_cache():
+    '''
+    Returns the on-disk bytecode cache of the process, or None if it is
+    disabled.
+    '''
+
+    global _bytecode_cache
+    if _bytecode_cache is None and C.DEFAULT_TEMPLATE_BYTECODE_CACHE and C.DEFAULT_TEMPLATE_BYTECODE_CACHE_SIZE > 0:
+        _bytecode_cache = TemplateBytecodeCache(C.DEFAULT_TEMPLATE_BYTECODE_CACHE, C.DEFAULT_TEMPLATE_BYTECODE_CACHE_SIZE * 1024 * 1024)
+    return _bytecode_cache
+
+
+compiled_templates = CompiledTemplateCache(C.DEFAULT_TEMPLATE_CACHE_SIZE)
@@ -0,0 +1,298 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import re
+import time
+
+from six import string_types, text_type
+from jinja2.runtime import Undefined
+from jinja2.utils import missing
+
+from ansiblite import constants as C
+
+__all__ = ['FastExpression', 'compile_fast_expression', 'collect_template_strings', 'benchmark']
+
+# Fast path for trivial expressions.
+#
+# Most templated strings are a single expression: a variable, possibly with an
+# attribute or subscript chain (foo.bar, foo['bar'][0]), piped through a cheap
+# filter or two such as default. Rendering them with jinja2 means setting up a
+# template object and its context and running its render function, which
+# costs far more than the lookups themselves.
+#
+# Such strings are parsed once into a FastExpression, which is evaluated with
+# the very calls the code jinja2 compiles for them would make: names resolved
+# through the context (so AnsibleJ2Vars templates their values as usual), and
+# environment.getattr(), environment.getitem() and environment.filters used
+# for the rest, and its output converted the same way. Anything else, and any
+# evaluation which raises or yields an undefined value, falls back to the full
+# rendering, which gives the same result or error as it always did.
+
+# whether Templar uses the fast path, turned off by benchmark() to compare
+enabled = C.DEFAULT_TEMPLATE_FAST_PATH
+
+# the filters which are cheap and have no side effects
+FAST_FILTERS = frozenset(('default', 'd', 'lower', 'upper', 'trim', 'string', 'int', 'float', 'bool', 'length', 'count', 'first', 'last'))
+
+# names which are not variables in a jinja2 expression
+_RESERVED = frozenset(('and', 'or', 'not', 'in', 'is', 'if', 'else', 'true', 'false', 'none', 'True', 'False', 'None'))
+
+_CONSTANTS = {'true': True, 'false': False, 'none': None, 'True': True, 'False': False, 'None': None}
+
+_TOKEN = re.compile(r'''\s*(?:(?P<name>[A-Za-z_][A-Za-z0-9_]*)|(?P<number>-?[0-9]+(?:\.[0-9]+)?)|(?P<string>'[^'\\]*'|"[^"\\]*")|(?P<op>[.|\[\](),]))''')
+
+_MAX_CACHED = 10000
+_cache = dict()
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class FastExpression:
+    '''
+    A parsed expression: a path (a name and a chain of attributes and
+    subscripts) and the filters it is piped through, each with constant or
+    path arguments.
+    '''
+
+    def __init__(self, path, filters):
+        self.path    = path
+        self.filters = filters
+
+    def _resolve(self, environment, context, path):
+        (name, steps) = path
+        value = context.resolve_or_missing(name)
+        if value is missing:
+            value = environment.undefined(name=name)
+        for (kind, arg) in steps:
+            if kind == 'attr':
+                value = environment.getattr(value, arg)
+            else:
+                value = environment.getitem(value, arg)
+        return value
+
+    def evaluate(self, environment, context):
+        '''
+        Returns the value of the expression, raising _Unsupported if it
+        needs the full rendering.
+        '''
+
+        value = self._resolve(environment, context, self.path)
+        for (name, args) in self.filters:
+            func = environment.filters.get(name)
+            if func is None or getattr(func, 'contextfilter', False) or getattr(func, 'evalcontextfilter', False):
+                raise _Unsupported()
+            values = []
+            for (kind, arg) in args:
+                if kind == 'const':
+                    values.append(arg)
+                else:
+                    values.append(self._resolve(environment, context, arg))
+            if getattr(func, 'environmentfilter', False):
+                value = func(environment, value, *values)
+            else:
+                value = func(value, *values)
+
+        if isinstance(value, Undefined):
+            raise _Unsupported()
+        return value
+
+    def render(self, environment, context):
+        '''
+        Returns the expression rendered as jinja2 would, or None if it needs
+        the full rendering.
+        '''
+
+        try:
+            value = self.evaluate(environment, context)
+            if environment.finalize is not None:
+                value = environment.finalize(value)
+            return text_type(value)
+        except Exception:
+            return None
+
+
+def _parse(expr):
+    tokens = []
+    pos = 0
+    expr = expr.rstrip()
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if m is None:
+            raise _Unsupported()
+        pos = m.end()
+        for kind in ('name', 'number', 'string', 'op'):
+            value = m.group(kind)
+            if value is not None:
+                tokens.append((kind, value))
+                break
+    tokens.append(('end', None))
+
+    # a tiny recursive descent parser over the tokens
+    state = dict(pos=0)
+
+    def peek():
+        return tokens[state['pos']]
+
+    def take(kind, value=None):
+        token = tokens[state['pos']]
+        if token[0] != kind or (value is not None and token[1] != value):
+            raise _Unsupported()
+        state['pos'] += 1
+        return token[1]
+
+    def constant(token):
+        (kind, value) = token
+        if kind == 'string':
+            return value[1:-1]
+        elif kind == 'number':
+            return float(value) if '.' in value else int(value)
+        elif kind == 'name' and value in _CONSTANTS:
+            return _CONSTANTS[value]
+        raise _Unsupported()
+
+    def path():
+        name = take('name')
+        if name in _RESERVED:
+            raise _Unsupported()
+        steps = []
+        while peek() in (('op', '.'), ('op', '[')):
+            if take('op') == '.':
+                steps.append(('attr', take('name')))
+            else:
+                token = peek()
+                if token[0] not in ('string', 'number') or '.' in token[1]:
+                    raise _Unsupported()
+                state['pos'] += 1
+                steps.append(('item', constant(token)))
+                take('op', ']')
+        return (name, steps)
+
+    def argument():
+        token = peek()
+        if token[0] in ('string', 'number') or (token[0] == 'name' and token[1] in _CONSTANTS):
+            state['pos'] += 1
+            return ('const', constant(token))
+        return ('path', path())
+
+    head = path()
+    filters = []
+    while peek() == ('op', '|'):
+        take('op')
+        name = take('name')
+        if name not in FAST_FILTERS:
+            raise _Unsupported()
+        args = []
+        if peek() == ('op', '('):
+            take('op')
+            if peek() != ('op', ')'):
+                args.append(argument())
+                while peek() == ('op', ','):
+                    take('op')
+                    args.append(argument())
+            take('op', ')')
+        filters.append((name, args))
+    take('end')
+
+    return FastExpression(head, filters)
+
+
+def compile_fast_expression(data, environment):
+    '''
+    Returns the FastExpression the given template string consists of, or
+    None if it is anything more than a single trivial expression.
+    '''
+
+    key = (data, environment.variable_start_string, environment.variable_end_string)
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+
+    fast = None
+    start = environment.variable_start_string
+    end = environment.variable_end_string
+    if data.startswith(start) and data.endswith(end) and '\\' not in data:
+        expr = data[len(start):-len(end)]
+        # a single expression, without whitespace control
+        if start not in expr and end not in expr and expr[:1] not in ('-', '+') and expr[-1:] not in ('-', '+'):
+            try:
+                fast = _parse(expr)
+            except (_Unsupported, ValueError):
+                fast = None
+
+    if len(_cache) >= _MAX_CACHED:
+        _cache.clear()
+    _cache[key] = fast
+    return fast
+
+
+def collect_template_strings(loader, paths):
+    '''
+    Returns the templated strings found in the given YAML files (playbooks,
+    roles' tasks, vars files and so on), to benchmark with.
+    '''
+
+    strings = []
+
+    def _walk(data):
+        if isinstance(data, dict):
+            for (k, v) in data.items():
+                _walk(k)
+                _walk(v)
+        elif isinstance(data, list):
+            for v in data:
+                _walk(v)
+        elif isinstance(data, string_types) and '{{' in data:
+            strings.append(data)
+
+    for path in paths:
+        _walk(loader.load_from_file(path))
+    return strings
+
+
+def benchmark(templar, strings, rounds=100):
+    '''
+    Compares rendering the given strings with the variables of the given
+    Templar through jinja2 against the fast path. Only the strings which
+    render without error are timed. Returns a dict with the number of those
+    (strings) and of the ones the fast path handles (fast), along with the
+    time in microseconds per string for all of them with (fast_usec) and
+    without (full_usec) the fast path.
+    '''
+
+    global enabled
+
+    renderable = []
+    for data in strings:
+        try:
+            templar.do_template(data)
+        except Exception:
+            continue
+        renderable.append(data)
+
+    handled = len([data for data in renderable if compile_fast_expression(data, templar.environment) is not None])
+
+    def _time():
+        start = time.time()
+        for i in range(rounds):
+            for data in renderable:
+                templar.do_template(data)
+        return (time.time() - start) * 1000000 / max(1, rounds * len(renderable))
+
+    saved = enabled
+    try:
+        enabled = False
+        full_usec = _time()
+        enabled = True
+        fast_usec = _time()
+    finally:
+        enabled = saved
+
+    return dict(
+        strings=len(renderable),
+        fast=handled,
+        full_usec=full_usec,
+        fast_usec=fast_usec,
+    )
@@ -81,7 +81,7 @@ class AnsibleJ2Vars:
 
         # HostVars is special, return it as-is, as is the special variable
         # 'vars', which contains the vars structure
-        from ansible.vars.hostvars import HostVars
+        from ansiblite.vars.hostvars import HostVars
         if isinstance(variable, dict) and varname == "vars" or isinstance(variable, HostVars) or hasattr(variable, '__UNSAFE__'):
             return variable
         else:
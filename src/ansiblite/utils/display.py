@@ -310,7 +310,7 @@ class Display:
 
         if encrypt:
             # Circular import because encrypt needs a display class
-            from ansible.utils.encrypt import do_encrypt
+            from ansiblite.utils.encrypt import do_encrypt
             result = do_encrypt(result, encrypt, salt_size, salt)
 
         # handle utf-8 chars
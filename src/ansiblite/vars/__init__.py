@@ -103,6 +103,14 @@ class VariableManager:
         self._omit_token = '__omit_place_holder__%s' % sha1(os.urandom(64)).hexdigest()
         self._options_vars = defaultdict(dict)
 
+        # per host version of the facts and variables set during the run,
+        # used to send workers only what changed since they last synced
+        self._host_versions = dict()
+        self._version = 0
+
+        # the play host lists last handed out, see _same_list()
+        self._magic_lists = dict()
+
         # bad cache plugin is not fatal error
         try:
             self._fact_cache = FactCache()
@@ -135,6 +143,9 @@ class VariableManager:
         self._omit_token = data.get('omit_token', '__omit_place_holder__%s' % sha1(os.urandom(64)).hexdigest())
         self._inventory = data.get('inventory', None)
         self._options_vars = data.get('options_vars', dict())
+        self._host_versions = dict()
+        self._version = 0
+        self._magic_lists = dict()
 
     def _get_cache_entry(self, play=None, host=None, task=None):
         play_id = "NONE"
@@ -390,6 +401,19 @@ class VariableManager:
         if hostvars_cache_entry in HOSTVARS_CACHE:
             del HOSTVARS_CACHE[hostvars_cache_entry]
 
+    def _same_list(self, name, value):
+        '''
+        Returns the list last returned for the given name if it is equal to
+        the given one, so the task vars of all the hosts of a play share it
+        and the workers are only sent it once (see TaskVarsSender).
+        '''
+
+        last = self._magic_lists.get(name)
+        if last == value:
+            return last
+        self._magic_lists[name] = value
+        return value
+
     def _get_magic_variables(self, loader, play, host, task, include_hostvars, include_delegate_to):
         '''
         Returns a dictionary of so-called "magic" variables in Ansible,
@@ -420,9 +444,9 @@ class VariableManager:
             variables['inventory_file'] = self._inventory.src()
             if play:
                 # add the list of hosts in the play, as adjusted for limit/filters
-                variables['ansible_play_hosts_all'] = [x.name for x in self._inventory.get_hosts(pattern=play.hosts or 'all', ignore_restrictions=True)]
-                variables['ansible_play_hosts'] = [x for x in variables['ansible_play_hosts_all'] if x not in play._removed_hosts]
-                variables['ansible_play_batch'] = [x.name for x in self._inventory.get_hosts() if x.name not in play._removed_hosts]
+                variables['ansible_play_hosts_all'] = self._same_list('ansible_play_hosts_all', [x.name for x in self._inventory.get_hosts(pattern=play.hosts or 'all', ignore_restrictions=True)])
+                variables['ansible_play_hosts'] = self._same_list('ansible_play_hosts', [x for x in variables['ansible_play_hosts_all'] if x not in play._removed_hosts])
+                variables['ansible_play_batch'] = self._same_list('ansible_play_batch', [x.name for x in self._inventory.get_hosts() if x.name not in play._removed_hosts])
 
                 #DEPRECATED: play_hosts should be deprecated in favor of ansible_play_batch,
                 #  however this would take work in the templating engine, so for now we'll add both
@@ -648,12 +672,74 @@ class VariableManager:
                     keepers.append(entry)
             self._group_vars_files[f] = keepers
 
+    @property
+    def version(self):
+        '''
+        The current version of the facts and variables set on hosts,
+        increased every time one of them changes.
+        '''
+        return self._version
+
+    def _host_changed(self, host_name):
+        self._version += 1
+        self._host_versions[host_name] = self._version
+
+    def get_host_changes(self, since):
+        '''
+        Returns the current version along with a dictionary of the facts,
+        nonpersistent facts and variables of every host changed after the
+        given version, keyed by host name. Missing entries are set to None.
+        '''
+
+        changes = dict()
+        for (host_name, version) in iteritems(self._host_versions):
+            if version > since:
+                changes[host_name] = (
+                    self._fact_cache.get(host_name),
+                    self._nonpersistent_fact_cache.get(host_name),
+                    self._vars_cache.get(host_name),
+                )
+        return (self._version, changes)
+
+    def apply_host_changes(self, changes):
+        '''
+        Applies the changes returned by get_host_changes() on another
+        variable manager (ie. the copy held by a worker process).
+        '''
+
+        for (host_name, host_data) in iteritems(changes):
+            for (cache, data) in zip((self._fact_cache, self._nonpersistent_fact_cache, self._vars_cache), host_data):
+                if data is None:
+                    if host_name in cache:
+                        del cache[host_name]
+                else:
+                    cache[host_name] = data
+
+    def get_host_data(self):
+        '''
+        Returns the facts, nonpersistent facts and variables set on every
+        host, in the format of get_host_changes(), as saved in checkpoints.
+        '''
+
+        (version, changes) = self.get_host_changes(0)
+        return changes
+
+    def restore_host_data(self, data):
+        '''
+        Sets back the facts and variables returned by get_host_data().
+        '''
+
+        self.apply_host_changes(data)
+        for host_name in data:
+            self._host_changed(host_name)
+
     def clear_facts(self, hostname):
         '''
         Clears the facts for a host
         '''
         if hostname in self._fact_cache:
             del self._fact_cache[hostname]
+        self._host_changed(hostname)
 
     def set_host_facts(self, host, facts):
         '''
@@ -669,6 +755,7 @@ class VariableManager:
                 self._fact_cache.update(host.name, facts)
             except KeyError:
                 self._fact_cache[host.name] = facts
+        self._host_changed(host.name)
 
     def set_nonpersistent_facts(self, host, facts):
         '''
@@ -684,6 +771,7 @@ class VariableManager:
                 self._nonpersistent_fact_cache[host.name].update(facts)
             except KeyError:
                 self._nonpersistent_fact_cache[host.name] = facts
+        self._host_changed(host.name)
 
     def set_host_variable(self, host, varname, value):
         '''
@@ -696,3 +784,4 @@ class VariableManager:
             self._vars_cache[host_name] = combine_vars(self._vars_cache[host_name], {varname: value})
         else:
             self._vars_cache[host_name][varname] = value
+        self._host_changed(host_name)
@@ -52,12 +52,25 @@ class HostVars(collections.Mapping):
         variable_manager._hostvars = self
         self._cached_result = dict()
 
+    def __getstate__(self):
+        # the inventory is deliberately left out, as it can be very large and
+        # workers already hold a copy of it; set_inventory() must be called
+        # on the receiving side before the hostvars are used
+        return dict(
+            loader=self._loader,
+            variable_manager=self._variable_manager,
+        )
+
+    def __setstate__(self, data):
+        self.__init__(inventory=None, variable_manager=data.get('variable_manager'), loader=data.get('loader'))
+
     def set_variable_manager(self, variable_manager):
         self._variable_manager = variable_manager
         variable_manager._hostvars = self
 
     def set_inventory(self, inventory):
         self._inventory = inventory
+        self._variable_manager.set_inventory(inventory)
 
     def _find_host(self, host_name):
         if host_name in C.LOCALHOST and self._inventory.localhost:
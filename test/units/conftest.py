@@ -0,0 +1,15 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import sys
+
+# the tests run against the tree, with the libraries it bundles
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+# pytest may have imported six already, which is not the bundled one
+for name in [n for n in sys.modules if n == 'six' or n.startswith('six.')]:
+    if not getattr(sys.modules[name], '__file__', SRC).startswith(SRC):
+        del sys.modules[name]
@@ -0,0 +1,31 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+from units.mock.plugins import ASYNC_POLL_MARKER
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - name: job
+      fake: msg=start
+      async: 10
+      poll: 1
+'''
+
+
+def test_jobs_polled_by_the_controller():
+    run = run_play(PLAYBOOK, hosts=('h1', 'h2'), settings=dict(DEFAULT_ASYNC_POLL_THREADS=2))
+
+    assert run.rc == 0
+    assert run.callback.hosts('ok', 'job') == ['h1', 'h2']
+    for (status, host, task, result) in run.callback.by_status('ok', 'job'):
+        assert result['msg'] == 'done'
+
+    # the async_poll action ran on the threads of the controller
+    polls = [r for r in run.execs() if ASYNC_POLL_MARKER in r['cmd']]
+    assert sorted(set(r['host'] for r in polls)) == ['h1', 'h2']
+    assert set(r['pid'] for r in polls) == set([os.getpid()])
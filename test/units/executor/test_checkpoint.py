@@ -0,0 +1,56 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from ansiblite.executor.checkpoint import Checkpoint
+
+from units.mock.play import PlayRun
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: msg=one
+    - fake: msg=two fail={{ %s }}
+'''
+
+
+@pytest.fixture
+def tmpdir():
+    path = tempfile.mkdtemp(prefix='ansiblite-test-')
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _run(tmpdir, fail):
+    path = os.path.join(tmpdir, 'checkpoint')
+    settings = dict(DEFAULT_CHECKPOINT_PATH=path, DEFAULT_CHECKPOINT_INTERVAL=0)
+    run = PlayRun(PLAYBOOK % fail, settings=settings).run(tmpdir=tmpdir)
+    return (run, path)
+
+
+def test_checkpoint_removed_once_the_run_is_over(tmpdir):
+    (run, path) = _run(tmpdir, 'False')
+
+    assert run.rc == 0
+    assert not os.path.exists(path)
+
+
+def test_checkpoint_kept_when_hosts_failed(tmpdir):
+    (run, path) = _run(tmpdir, "inventory_hostname == 'h2'")
+
+    assert run.rc != 0
+    assert os.path.exists(path)
+    assert Checkpoint(path, [os.path.join(tmpdir, 'playbook.yml')]).load()
+
+
+def test_checkpoint_kept_when_the_play_is_broken_off(tmpdir):
+    (run, path) = _run(tmpdir, 'True')
+
+    assert run.rc != 0
+    assert os.path.exists(path)
@@ -0,0 +1,49 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: msg=one
+    - fake: msg=two
+    - fake: msg=three
+'''
+
+HOSTS = ['h%d' % i for i in range(5)]
+
+
+def _events(run, event, host):
+    return [r for r in run.log if r['event'] == event and r['host'] == host]
+
+
+def test_hosts_keep_their_worker_and_connection():
+    run = run_play(PLAYBOOK, hosts=HOSTS, forks=2, settings=dict(DEFAULT_HOST_AFFINITY=True))
+
+    assert run.rc == 0
+    for host in HOSTS:
+        assert len(run.execs(host)) == 3
+        assert len(set(r['pid'] for r in run.execs(host))) == 1
+        assert len(_events(run, 'connect', host)) == 1
+        # closed by the worker when it exits
+        assert len(_events(run, 'close', host)) == 1
+
+
+def test_connections_closed_after_each_task_by_default():
+    run = run_play(PLAYBOOK, hosts=HOSTS, forks=2)
+
+    assert run.rc == 0
+    for host in HOSTS:
+        assert len(_events(run, 'connect', host)) == 3
+        assert len(_events(run, 'close', host)) == 3
+
+
+def test_thread_engine_keeps_connections():
+    run = run_play(PLAYBOOK, hosts=HOSTS, forks=2, settings=dict(DEFAULT_HOST_AFFINITY=True, DEFAULT_EXECUTION_ENGINE='thread'))
+
+    assert run.rc == 0
+    for host in HOSTS:
+        assert len(set(r['thread'] for r in run.execs(host))) == 1
+        assert len(_events(run, 'connect', host)) == 1
@@ -0,0 +1,63 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+
+from units.mock.play import run_play
+
+
+def _batches(run):
+    return [[args['msg'] for args in json.loads(r['cmd'])['batch']] for r in run.execs()]
+
+
+def _play(task):
+    return '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - name: loop
+      %s
+''' % task.replace('\n', '\n      ')
+
+
+def test_items_run_in_batches():
+    run = run_play(_play('batch: msg={{ item }}\nwith_items: [a, b, c, d, e, f, g]'), hosts=('h1',))
+
+    assert run.rc == 0
+    assert _batches(run) == [['a', 'b', 'c'], ['d', 'e', 'f'], ['g']]
+    # every item gets its own result, in the order of the items
+    assert sorted(r[3]['msg'] for r in run.callback.by_status('item_ok', 'loop')) == list('abcdefg')
+    (final,) = run.callback.by_status('ok', 'loop')
+    assert [(r['item'], r['msg']) for r in final[3]['results']] == [(item, item) for item in 'abcdefg']
+
+
+def test_skipped_items_split_batches():
+    run = run_play(_play('batch: msg={{ item }}\nwith_items: [a, b, c, d, e]\nwhen: item != "b"'), hosts=('h1',))
+
+    assert run.rc == 0
+    assert _batches(run) == [['a'], ['c', 'd', 'e']]
+    assert [r[3]['item'] for r in run.callback.by_status('item_skipped', 'loop')] == ['b']
+
+
+def test_failed_items_fail_on_their_own():
+    run = run_play(_play('batch: msg={{ item }} fail={{ item == "b" }}\nwith_items: [a, b, c]'), hosts=('h1',))
+
+    assert run.rc != 0
+    assert len(run.execs()) == 1
+    assert [r[3]['item'] for r in run.callback.by_status('item_failed', 'loop')] == ['b']
+    assert sorted(r[3]['item'] for r in run.callback.by_status('item_ok', 'loop')) == ['a', 'c']
+
+
+def test_items_run_one_by_one_when_checked_per_attempt():
+    run = run_play(_play('batch: msg={{ item }}\nwith_items: [a, b, c]\nregister: out\nuntil: out is defined\nretries: 1\ndelay: 0'),
+                   hosts=('h1',))
+
+    assert run.rc == 0
+    assert len(run.execs()) == 3
+
+
+def test_actions_without_batches_run_one_by_one():
+    run = run_play(_play('fake: msg={{ item }}\nwith_items: [a, b, c]'), hosts=('h1',))
+
+    assert run.rc == 0
+    assert len(run.execs()) == 3
@@ -0,0 +1,70 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+
+import pytest
+
+from units.mock.play import run_play
+
+
+@pytest.fixture
+def cache_path():
+    path = tempfile.mkdtemp(prefix='ansiblite-test-')
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _run_twice(task, cache_path):
+    playbook = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - name: memo
+      %s
+''' % task.replace('\n', '\n      ')
+    settings = dict(DEFAULT_RESULT_CACHE_PATH=cache_path)
+    return [run_play(playbook, hosts=('h1', 'h2'), settings=settings) for i in range(2)]
+
+
+def test_memoized_results_reused(cache_path):
+    (first, second) = _run_twice('fake: msg=hi\nmemoize: yes', cache_path)
+
+    assert len(first.execs()) == 2
+    assert second.execs() == []
+    assert [r[3].get('memoized') for r in second.callback.by_status('ok', 'memo')] == [True, True]
+
+
+@pytest.mark.parametrize('memoize', ['no', '[]', '[no]', '"{{ False }}"'])
+def test_memoize_turned_off(cache_path, memoize):
+    (first, second) = _run_twice('fake: msg=hi\nmemoize: %s' % memoize, cache_path)
+
+    assert len(first.execs()) == 2
+    assert len(second.execs()) == 2
+    assert os.listdir(cache_path) == []
+
+
+def test_memoized_by_the_named_state(cache_path):
+    playbook = '''
+- hosts: all
+  gather_facts: no
+  vars:
+    state: %s
+  tasks:
+    - fake: msg=hi
+      memoize: [state]
+'''
+    settings = dict(DEFAULT_RESULT_CACHE_PATH=cache_path)
+    runs = [run_play(playbook % state, hosts=('h1',), settings=settings) for state in ('one', 'two', 'one')]
+
+    assert [len(run.execs()) for run in runs] == [1, 1, 0]
+
+
+def test_no_log_results_never_stored(cache_path):
+    (first, second) = _run_twice('fake: msg=secret\nmemoize: yes\nno_log: yes', cache_path)
+
+    assert len(first.execs()) == 2
+    assert len(second.execs()) == 2
+    assert os.listdir(cache_path) == []
@@ -0,0 +1,54 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import gc
+import weakref
+
+from ansiblite import constants as C
+from ansiblite.executor.process.memory import collect_worker_garbage
+
+
+class Node:
+    pass
+
+
+def test_worker_cycles_in_the_oldest_generation_are_collected(monkeypatch):
+    monkeypatch.setattr(C, 'DEFAULT_WORKER_FULL_GC_JOBS', 3)
+
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        gc.collect()
+        node = Node()
+        node.self = node
+        ref = weakref.ref(node)
+
+        # the cycle lives through the collection after the first job, which
+        # moves it to the oldest generation, and is garbage after that
+        collect_worker_garbage(1)
+        del node
+        collect_worker_garbage(2)
+        assert ref() is not None
+
+        collect_worker_garbage(3)
+        assert ref() is None
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def test_no_full_collection_when_turned_off(monkeypatch):
+    monkeypatch.setattr(C, 'DEFAULT_WORKER_FULL_GC_JOBS', 0)
+    generations = []
+    monkeypatch.setattr(gc, 'collect', lambda generation=2: generations.append(generation))
+
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for jobs in range(1, 5):
+            collect_worker_garbage(jobs)
+    finally:
+        if was_enabled:
+            gc.enable()
+
+    assert generations == [1, 1, 1, 1]
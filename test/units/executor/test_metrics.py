@@ -0,0 +1,57 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - name: slow
+      fake: msg=slow sleep=0.2
+    - name: loop
+      fake: msg={{ item }}
+      with_items: [a, b, c]
+'''
+
+
+def _task_metrics(stats, name):
+    return [m for m in stats.task_metrics.values() if m['name'] == name][0]
+
+
+def test_results_carry_the_resources_used():
+    run = run_play(PLAYBOOK, hosts=('h1', 'h2'))
+
+    assert run.rc == 0
+    for (status, host, task, result) in run.callback.by_status('ok', 'slow'):
+        metrics = result['_ansible_metrics']
+        assert metrics['wall_time'] >= 0.2
+        assert metrics['cpu_time'] >= 0
+        assert metrics['queue_bytes'] > 0
+
+
+def test_stats_sum_the_metrics_per_task_and_host():
+    run = run_play(PLAYBOOK, hosts=('h1', 'h2'))
+    stats = run.callback.stats
+
+    slow = _task_metrics(stats, 'slow')
+    assert slow['count'] == 2
+    assert slow['wall_time'] >= 0.4
+
+    # the bytes of the per item results count towards the final one
+    loop = _task_metrics(stats, 'loop')
+    assert loop['count'] == 2
+    assert loop['queue_bytes'] > slow['queue_bytes']
+
+    for host in ('h1', 'h2'):
+        assert stats.host_metrics[host]['count'] == 2
+        assert stats.host_metrics[host]['wall_time'] >= 0.2
+
+
+def test_thread_engine_measures_jobs():
+    run = run_play(PLAYBOOK, hosts=('h1', 'h2'), settings=dict(DEFAULT_EXECUTION_ENGINE='thread'))
+
+    assert run.rc == 0
+    slow = _task_metrics(run.callback.stats, 'slow')
+    assert slow['count'] == 2
+    assert slow['wall_time'] >= 0.4
@@ -0,0 +1,37 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from units.mock.play import run_play
+
+
+def _play(task):
+    return '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - name: loop
+      %s
+''' % task.replace('\n', '\n      ')
+
+
+def test_items_run_at_once():
+    run = run_play(_play('fake: msg={{ item }} sleep=0.3\nwith_items: [a, b, c, d]\nloop_control:\n  parallel: 4'), hosts=('h1',))
+
+    assert run.rc == 0
+    execs = run.execs()
+    assert len(set(r['thread'] for r in execs)) == 4
+    assert max(r['time'] for r in execs) - min(r['time'] for r in execs) < 0.3
+    (final,) = run.callback.by_status('ok', 'loop')
+    assert [r['msg'] for r in final[3]['results']] == ['a', 'b', 'c', 'd']
+
+
+def test_items_which_ran_reported_when_one_raises():
+    run = run_play(_play('fake: msg={{ item }} sleep={{ 0.3 if item == "a" else 0 }} error={{ "broken" if item == "a" else "" }}\n'
+                         'with_items: [a, b, c]\nloop_control:\n  parallel: 3'), hosts=('h1',))
+
+    assert run.rc != 0
+    assert len(run.execs()) == 3
+    # the error stops the loop, but the other items did run
+    assert sorted(r[3]['item'] for r in run.callback.by_status('item_ok', 'loop')) == ['b', 'c']
+    (failed,) = run.callback.by_status('failed', 'loop')
+    assert 'broken' in failed[3]['msg']
@@ -0,0 +1,71 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import multiprocessing
+import socket
+import time
+
+import pytest
+
+from ansiblite import constants as C
+from ansiblite.executor.process import remote, wire
+
+from units.mock import plugins
+from units.mock.play import run_play
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    '''
+    Runs an agent on the loopback, forked with the settings patched so far,
+    and returns its address as a remote_agents entry.
+    '''
+
+    plugins.install()
+    monkeypatch.setattr(C, 'DEFAULT_REMOTE_AUTHKEY', 'secret')
+
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    agents = []
+
+    def _start():
+        process = multiprocessing.Process(target=remote.serve, args=(('127.0.0.1', port),))
+        process.start()
+        agents.append(process)
+        time.sleep(0.3)
+        return '127.0.0.1:%d' % port
+
+    yield _start
+
+    for process in agents:
+        process.terminate()
+        process.join()
+
+
+def test_large_jobs_and_results_are_sent_inline(agent, monkeypatch):
+    # both ends of the remote engine would fail on a body sent out of band
+    monkeypatch.setattr(C, 'RESULT_OUT_OF_BAND_THRESHOLD', 100)
+    unpack_body = wire._unpack_body
+
+    def _inline_only(flags, body):
+        assert not flags & wire.FLAG_OUT_OF_BAND
+        return unpack_body(flags, body)
+    monkeypatch.setattr(wire, '_unpack_body', _inline_only)
+
+    address = agent()
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  vars:
+    big: "{{ 'x' * 5000 }}"
+  tasks:
+    - fake: msg={{ big }}
+''', hosts=('h1', 'h2'), settings=dict(DEFAULT_EXECUTION_ENGINE='remote', DEFAULT_REMOTE_AGENTS=[address]))
+
+    assert run.rc == 0
+    assert sorted(r[1] for r in run.callback.by_status('ok')) == ['h1', 'h2']
+    for (status, host, task, result) in run.callback.by_status('ok'):
+        assert result['msg'] == 'x' * 5000
@@ -0,0 +1,130 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pickle
+
+from ansiblite.executor.process import taskvars
+from ansiblite.executor.process.taskvars import TaskVarsSender, TaskVarsReceiver
+from ansiblite.inventory import Inventory
+from ansiblite.parsing.dataloader import DataLoader
+from ansiblite.vars import VariableManager
+
+from units.mock.play import run_play
+
+
+def _setup():
+    loader = DataLoader()
+    variable_manager = VariableManager()
+    inventory = Inventory(loader=loader, variable_manager=variable_manager, host_list='h1,h2,')
+    variable_manager.set_inventory(inventory)
+    return (loader, variable_manager, inventory)
+
+
+def _pair():
+    '''
+    A sender and a receiver whose variable manager and inventory are
+    copies of the sender's ones, as a forked worker holds.
+    '''
+
+    (loader, variable_manager, inventory) = _setup()
+    sender = TaskVarsSender(variable_manager, inventory)
+    (w_variable_manager, w_inventory) = pickle.loads(pickle.dumps((variable_manager, inventory)))
+    receiver = TaskVarsReceiver(w_inventory, w_variable_manager, loader)
+    return (sender, receiver, inventory, w_inventory)
+
+
+def _task_vars(**kwargs):
+    task_vars = dict(kwargs)
+    task_vars['vars'] = dict(task_vars)
+    return task_vars
+
+
+def test_only_changes_are_sent():
+    (sender, receiver, inventory, w_inventory) = _pair()
+    groups = dict(all=['h1', 'h2'])
+
+    delta = sender.make_delta(_task_vars(groups=groups, inventory_hostname='h1'))
+    assert receiver.apply_delta(delta) == _task_vars(groups=groups, inventory_hostname='h1')
+
+    delta = sender.make_delta(_task_vars(groups=groups, inventory_hostname='h2'))
+    (inventory_changes, host_changes, changed, removed) = delta
+    # groups is the same object and vars is rebuilt by the worker
+    assert sorted(changed) == ['inventory_hostname']
+    assert receiver.apply_delta(delta) == _task_vars(groups=groups, inventory_hostname='h2')
+
+    delta = sender.make_delta(dict(groups=dict(all=['h1']), inventory_hostname='h2'))
+    assert delta[3] == ['vars']
+    assert receiver.apply_delta(delta) == dict(groups=dict(all=['h1']), inventory_hostname='h2')
+
+
+def test_same_values_are_not_pickled(monkeypatch):
+    (sender, receiver, inventory, w_inventory) = _pair()
+    groups = dict(('g%d' % i, ['h1', 'h2']) for i in range(100))
+    sender.make_delta(_task_vars(groups=groups, inventory_hostname='h1'))
+
+    pickled = []
+    dumps = taskvars._dumps
+
+    def _dumps(value):
+        pickled.append(value)
+        return dumps(value)
+    monkeypatch.setattr(taskvars, '_dumps', _dumps)
+
+    sender.make_delta(_task_vars(groups=groups, inventory_hostname='h2'))
+    assert pickled == ['h2']
+
+
+def test_changes_in_the_worker_do_not_leak():
+    (sender, receiver, inventory, w_inventory) = _pair()
+    delegated = dict(d1=dict(ansible_host='d1'))
+    task_vars = _task_vars(groups=dict(all=['h1']), ansible_delegated_vars=delegated, environment=[])
+
+    first = receiver.apply_delta(sender.make_delta(task_vars))
+    first['groups']['other'] = []
+    first['environment'].append(dict(A='1'))
+    first['ansible_delegated_vars']['d1']['ansible_port'] = 22
+    first['vars']['extra'] = 1
+
+    second = receiver.apply_delta(sender.make_delta(task_vars))
+    assert second == task_vars
+    assert delegated == dict(d1=dict(ansible_host='d1'))
+
+
+def test_inventory_changes_are_sent():
+    (sender, receiver, inventory, w_inventory) = _pair()
+
+    inventory.add_dynamic_host('new1', dict(foo='bar'), ['added'])
+    inventory.add_dynamic_group('h1', 'grouped')
+    receiver.apply_delta(sender.make_delta(dict()))
+
+    new1 = w_inventory.get_host('new1')
+    assert new1 is not None
+    assert new1.vars['foo'] == 'bar'
+    assert [h.name for h in w_inventory.get_group('added').get_hosts()] == ['new1']
+    assert [h.name for h in w_inventory.get_group('grouped').get_hosts()] == ['h1']
+    assert receiver._hostvars['new1']['foo'] == 'bar'
+
+    # and only once
+    assert sender.make_delta(dict())[0] == []
+
+
+def test_new_hosts_in_worker_hostvars():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake:
+        add_host:
+          host_name: new1
+          groups: [added]
+          host_vars: {foo: bar}
+      run_once: yes
+    - fake:
+        add_group: "grp_{{ inventory_hostname }}"
+    - fake:
+        msg: "{{ hostvars['new1']['foo'] }} {{ hostvars['new1']['group_names'] | join(',') }} {{ hostvars[inventory_hostname]['group_names'] | join(',') }}"
+''', forks=1)
+
+    assert run.rc == 0
+    msgs = sorted(r[3]['msg'] for r in run.callback.by_status('ok') if r[3].get('msg'))
+    assert msgs == ['bar added grp_h1', 'bar added grp_h2', 'bar added grp_h3']
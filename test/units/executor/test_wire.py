@@ -0,0 +1,99 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import tempfile
+import uuid
+
+import pytest
+
+from ansiblite import constants as C
+from ansiblite.errors import AnsibleError
+from ansiblite.executor.process import wire
+from ansiblite.executor.task_result import TaskResult
+
+
+@pytest.fixture
+def thresholds(monkeypatch):
+    tmpdir = tempfile.mkdtemp()
+    monkeypatch.setattr(C, 'DEFAULT_LOCAL_TMP', tmpdir)
+
+    def _set(compression, out_of_band):
+        monkeypatch.setattr(C, 'RESULT_COMPRESSION_THRESHOLD', compression)
+        monkeypatch.setattr(C, 'RESULT_OUT_OF_BAND_THRESHOLD', out_of_band)
+        return tmpdir
+    return _set
+
+
+def _result(data):
+    return TaskResult(u'h1', uuid.uuid4(), data)
+
+
+def test_result_round_trip():
+    task_result = _result(dict(changed=True, msg=u'caf\xe9', invocation=dict(module_args=dict(a=1))))
+    decoded = wire.decode_result(wire.encode_result(task_result))
+
+    assert decoded._host == u'h1'
+    assert decoded._task == task_result._task
+    assert decoded._result == task_result._result
+
+
+def test_invocation_dropped_unless_kept():
+    task_result = _result(dict(changed=True, invocation=dict(module_args=dict(a=1))))
+    decoded = wire.decode_result(wire.encode_result(task_result, keep_invocation=False))
+
+    assert decoded._result == dict(changed=True)
+    assert 'invocation' in task_result._result
+
+
+def test_large_bodies_compressed_and_out_of_band(thresholds):
+    tmpdir = thresholds(100, 200)
+    data = dict(stdout='x' * 100000, lines=list(range(2000)))
+    encoded = wire.encode_result(_result(data))
+
+    assert len(encoded) < 1000
+    assert len(os.listdir(tmpdir)) == 1
+    assert wire.decode_result(encoded)._result == data
+    # the file is gone once read
+    assert os.listdir(tmpdir) == []
+
+
+def test_job_round_trip(thresholds):
+    thresholds(10, 0)
+    job = (u'h1', uuid.uuid4(), ((), dict(a=list(range(100))), ()), None)
+    assert wire.decode_job(wire.encode_job(*job)) == job
+
+
+def test_other_versions_refused():
+    encoded = wire.encode_result(_result(dict(changed=False)))
+    with pytest.raises(AnsibleError):
+        wire.decode_result(b'\x02' + encoded[1:])
+
+
+def test_non_worker_results_left_alone():
+    task_result = TaskResult(u'h1', object(), dict())
+    assert wire.encode_result(task_result) is task_result
+    assert wire.decode_result(task_result) is task_result
+
+
+def test_benchmark_sends_the_same_data():
+    invocation = dict(module_args=dict(data='y' * 5000))
+    without = wire.benchmark(dict(changed=True), rounds=2)
+    with_invocation = wire.benchmark(dict(changed=True, invocation=invocation), rounds=2)
+
+    # the invocation is sent by both the pickle and the wire paths
+    assert with_invocation['pickle_bytes'] - without['pickle_bytes'] > 5000
+    assert with_invocation['wire_bytes'] - without['wire_bytes'] > 5000
+
+
+def test_large_bodies_inline_unless_out_of_band(thresholds):
+    tmpdir = thresholds(100, 200)
+    data = dict(stdout='x' * 100000, lines=list(range(2000)))
+
+    encoded = wire.encode_result(_result(data), out_of_band=False)
+    assert os.listdir(tmpdir) == []
+    assert wire.decode_result(encoded)._result == data
+
+    job = (u'h1', uuid.uuid4(), data, None)
+    assert wire.decode_job(wire.encode_job(*job, out_of_band=False)) == job
+    assert os.listdir(tmpdir) == []
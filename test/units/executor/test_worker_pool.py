@@ -0,0 +1,49 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: msg=one
+    - fake: msg={{ inventory_hostname }} changed=yes
+    - fake: msg=three
+'''
+
+
+def test_tasks_run_on_the_same_workers():
+    run = run_play(PLAYBOOK, forks=2)
+
+    assert run.rc == 0
+    assert len(run.execs()) == 9
+    pids = set(r['pid'] for r in run.execs())
+    # every task of the play ran on the two workers forked for it
+    assert len(pids) == 2
+    assert os.getpid() not in pids
+
+
+def test_results_reach_the_callback():
+    run = run_play(PLAYBOOK, forks=2)
+
+    ok = run.callback.by_status('ok', 'fake')
+    assert len(ok) == 9
+    msgs = sorted(r[3]['msg'] for r in ok if r[3].get('changed'))
+    assert msgs == ['h1', 'h2', 'h3']
+
+
+def test_failed_hosts_stop_running_tasks():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: fail={{ inventory_hostname == 'h2' }}
+    - fake: msg=after
+''')
+
+    assert run.rc != 0
+    assert run.callback.hosts('failed') == ['h2']
+    assert sorted(r['host'] for r in run.execs() if 'after' in r['cmd']) == ['h1', 'h3']
@@ -0,0 +1,49 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import time
+
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: msg={{ inventory_hostname }} sleep=0.5
+    - fake: msg=two changed=yes
+'''
+
+
+def test_jobs_run_on_controller_threads():
+    start = time.time()
+    run = run_play(PLAYBOOK, hosts=['h%d' % i for i in range(6)], forks=6, settings=dict(DEFAULT_EXECUTION_ENGINE='thread'))
+    elapsed = time.time() - start
+
+    assert run.rc == 0
+    assert len(run.execs()) == 12
+    assert set(r['pid'] for r in run.execs()) == set([os.getpid()])
+    threads = set(r['thread'] for r in run.execs())
+    assert 'MainThread' not in threads
+    assert len(threads) > 1
+    # the sleeps overlap
+    assert elapsed < 2.5
+
+    ok = run.callback.by_status('ok')
+    assert sorted(r[3]['msg'] for r in ok if not r[3]['changed']) == ['h%d' % i for i in range(6)]
+    assert len([r for r in ok if r[3]['changed']]) == 6
+
+
+def test_jobs_do_not_share_task_vars():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: msg={{ item }}-{{ inventory_hostname }}
+      with_items: [a, b]
+    - fake: msg={{ item | default('none') }}
+''', forks=3, settings=dict(DEFAULT_EXECUTION_ENGINE='thread'))
+
+    assert run.rc == 0
+    assert len(run.callback.by_status('item_ok')) == 6
+    assert [r[3]['msg'] for r in run.callback.by_status('ok') if r[2] == 'fake' and 'results' not in r[3]] == ['none'] * 3
@@ -0,0 +1,124 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+
+from ansiblite import constants as C
+from ansiblite.executor.playbook_executor import PlaybookExecutor
+from ansiblite.inventory import Inventory
+from ansiblite.parsing.dataloader import DataLoader
+from ansiblite.vars import VariableManager
+
+from units.mock import plugins
+
+
+class Options:
+    '''
+    The command line options of ansible-playbook the executor reads.
+    '''
+
+    def __init__(self, **kwargs):
+        self.connection = 'fake'
+        self.forks = 5
+        self.become = False
+        self.become_method = 'sudo'
+        self.become_user = 'root'
+        self.check = False
+        self.diff = False
+        self.module_path = None
+        self.listhosts = False
+        self.listtasks = False
+        self.listtags = False
+        self.syntax = False
+        self.resume = False
+        self.remote_user = None
+        self.private_key_file = None
+        self.verbosity = 0
+        self.force_handlers = False
+        self.step = False
+        self.start_at_task = None
+        self.timeout = 10
+        self.tags = []
+        self.skip_tags = []
+        self.__dict__.update(kwargs)
+
+
+class PlayRun:
+    '''
+    Runs playbooks against fake hosts, with the given settings (constants
+    overridden for the duration of the run), and keeps what came out of
+    it: the return code, the results given to the callback and the commands
+    the fake connections ran.
+    '''
+
+    def __init__(self, playbook, hosts=('h1', 'h2', 'h3'), inventory=None, settings=None, **options):
+        self.playbook = playbook
+        self.hosts = hosts
+        self.inventory = inventory
+        self.settings = settings or dict()
+        self.options = options
+        self.callback = None
+        self.rc = None
+        self.log = []
+        self.variable_manager = None
+
+    def run(self, tmpdir=None):
+        plugins.install()
+        own_tmpdir = tmpdir is None
+        if own_tmpdir:
+            tmpdir = tempfile.mkdtemp(prefix='ansiblite-test-')
+
+        saved = dict()
+        saved_env = os.environ.get(plugins.FAKE_LOG)
+        try:
+            for (key, value) in self.settings.items():
+                saved[key] = getattr(C, key)
+                setattr(C, key, value)
+
+            os.environ[plugins.FAKE_LOG] = os.path.join(tmpdir, 'fake.log')
+            playbook_path = os.path.join(tmpdir, 'playbook.yml')
+            with open(playbook_path, 'w') as f:
+                f.write(self.playbook)
+
+            if self.inventory is not None:
+                host_list = os.path.join(tmpdir, 'hosts')
+                with open(host_list, 'w') as f:
+                    f.write(self.inventory)
+            else:
+                host_list = ','.join(self.hosts) + ','
+
+            loader = DataLoader()
+            self.variable_manager = VariableManager()
+            inventory = Inventory(loader=loader, variable_manager=self.variable_manager, host_list=host_list)
+            self.variable_manager.set_inventory(inventory)
+
+            pbex = PlaybookExecutor(playbooks=[playbook_path], inventory=inventory, variable_manager=self.variable_manager,
+                                    loader=loader, options=Options(**self.options), passwords={})
+            self.callback = plugins.RecordingCallback()
+            pbex._tqm._stdout_callback = self.callback
+            self.rc = pbex.run()
+            self.log = plugins.read_log()
+        finally:
+            for (key, value) in saved.items():
+                setattr(C, key, value)
+            if saved_env is None:
+                os.environ.pop(plugins.FAKE_LOG, None)
+            else:
+                os.environ[plugins.FAKE_LOG] = saved_env
+            if own_tmpdir:
+                shutil.rmtree(tmpdir, ignore_errors=True)
+        return self
+
+    def execs(self, host=None):
+        '''
+        Returns the commands run through the fake connections (to the given
+        host only if set).
+        '''
+
+        return [r for r in self.log if r['event'] == 'exec' and (host is None or r['host'] == host)]
+
+
+def run_play(playbook, **kwargs):
+    return PlayRun(playbook, **kwargs).run()
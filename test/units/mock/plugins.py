@@ -0,0 +1,314 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import re
+import shlex
+import sys
+import threading
+import time
+import types
+import uuid
+
+from ansiblite.errors import AnsibleError
+from ansiblite.plugins import lookup_loader, module_loader
+from ansiblite.plugins.action import ActionBase
+from ansiblite.plugins.callback import CallbackBase
+from ansiblite.plugins.connection import ConnectionBase
+from ansiblite.plugins.lookup import LookupBase
+
+# Plugins for running plays in the unit tests.
+#
+# The tree ships neither connection nor lookup plugins, nor the normal
+# action, and its plugin loaders never find any plugin by name. install()
+# makes up for it: it registers the plugins below as modules of the plugin
+# packages, where PluginLoader.get() imports them from, and lets the module
+# and lookup loaders find the modules and lookups the tasks use.
+#
+# The fake connection runs nothing: every command is appended to the log
+# file of the run (set in FAKE_LOG), as a JSON line with the host, the pid,
+# the thread and the time it ran at, so tests can count what ran where,
+# whichever process or thread ran it. The normal action sends the module
+# arguments through it and returns them as its result:
+#
+#   - fake: msg=hi changed=yes fail=no sleep=0.1 rc=0 die=no error=oops
+#
+# error makes the action raise an AnsibleError with the given message, and
+# facts, add_host and add_group are returned as the results of the modules
+# of the same names are.
+#
+# Tasks run with async start a fake job, which the fake connection reports
+# as finished (with the msg 'done') as soon as it is polled by the async
+# job tracker.
+
+# the lookups the fake tasks can loop with
+FAKE_LOOKUPS = ('items',)
+
+# the modules the fake tasks can use
+FAKE_MODULES = ('fake', 'batch', 'on_controller', 'ping', 'setup', 'command', 'shell', 'debug', 'set_fact', 'assert', 'async_status', 'add_host', 'group_by')
+
+FAKE_LOG = 'ANSIBLITE_TEST_FAKE_LOG'
+
+# what the async_poll action precedes the status of each job with
+ASYNC_POLL_MARKER = '__ANSIBLE_ASYNC_POLL__'
+
+
+def _log(record):
+    path = os.environ.get(FAKE_LOG)
+    if not path:
+        return
+    record['pid'] = os.getpid()
+    record['thread'] = threading.current_thread().name
+    record['time'] = time.time()
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def read_log():
+    '''
+    Returns the commands the fake connections ran, oldest first.
+    '''
+
+    path = os.environ.get(FAKE_LOG)
+    if not path or not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _boolean(value):
+    return value in (True, 'yes', 'true', 'True', '1', 1)
+
+
+class FakeConnection(ConnectionBase):
+    '''
+    A connection to nowhere, logging the commands run through it.
+    '''
+
+    transport = 'fake'
+    allow_executable = False
+
+    def __init__(self, play_context, new_stdin, *args, **kwargs):
+        # no shell plugin ships with the tree either
+        self._play_context = play_context
+        self._new_stdin = new_stdin
+        self._connected = False
+        self._remote_cache = dict()
+        self._shell = None
+        self.success_key = None
+        self.prompt = None
+
+    def _connect(self):
+        if not self._connected:
+            _log(dict(event='connect', host=self._play_context.remote_addr))
+            self._connected = True
+        return self
+
+    def exec_command(self, cmd, in_data=None, sudoable=True):
+        self._connect()
+        _log(dict(event='exec', host=self._play_context.remote_addr, cmd=cmd))
+        if ASYNC_POLL_MARKER in cmd:
+            return (0, self._async_status(cmd), b'')
+        return (0, b'', b'')
+
+    def _async_status(self, cmd):
+        jids = shlex.split(re.search(r'for jid in (.*?); do', cmd).group(1))
+        status = json.dumps(dict(changed=True, msg='done', rc=0))
+        return ''.join('\n%s found %s\n%s\n' % (ASYNC_POLL_MARKER, jid, status) for jid in jids).encode('utf-8')
+
+    def put_file(self, in_path, out_path):
+        pass
+
+    def fetch_file(self, in_path, out_path):
+        pass
+
+    def close(self):
+        if self._connected:
+            _log(dict(event='close', host=self._play_context.remote_addr))
+        self._connected = False
+
+
+class FakeAction(ActionBase):
+    '''
+    Runs a fake module: logs its arguments through the connection and
+    returns them.
+    '''
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(FakeAction, self).run(tmp, task_vars)
+        args = self._task.args
+        self._connection.exec_command(json.dumps(dict(action=self._task.action, args=args), sort_keys=True))
+
+        if args.get('sleep'):
+            time.sleep(float(args['sleep']))
+        if _boolean(args.get('die', False)):
+            os._exit(1)
+        if args.get('error'):
+            raise AnsibleError(args['error'])
+
+        result['changed'] = _boolean(args.get('changed', False))
+        if 'msg' in args:
+            result['msg'] = args['msg']
+        if 'rc' in args:
+            result['rc'] = int(args['rc'])
+        if _boolean(args.get('fail', False)):
+            result['failed'] = True
+        if 'facts' in args:
+            result['ansible_facts'] = args['facts']
+        for key in ('add_host', 'add_group'):
+            if key in args:
+                result[key] = args[key]
+        return result
+
+
+class BatchAction(FakeAction):
+    '''
+    A fake module taking up to 3 loop items in one invocation.
+    '''
+
+    BATCH_ITEMS = 3
+
+    def run_batch(self, batch, tmp=None, task_vars=None):
+        self._connection.exec_command(json.dumps(dict(action=self._task.action, batch=[args for (item, args) in batch]), sort_keys=True))
+        results = []
+        for (item, args) in batch:
+            res = dict(changed=_boolean(args.get('changed', False)), msg=args.get('msg'))
+            if _boolean(args.get('fail', False)):
+                res['failed'] = True
+            results.append(res)
+        return results
+
+
+class AsyncAction(ActionBase):
+    '''
+    Starts a fake async job.
+    '''
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(AsyncAction, self).run(tmp, task_vars)
+        self._connection.exec_command(json.dumps(dict(action='async', args=self._task.args), sort_keys=True))
+        result.update(started=1, finished=0, ansible_job_id=uuid.uuid4().hex)
+        return result
+
+
+class ControllerAction(ActionBase):
+    '''
+    A fake action never using its connection.
+    '''
+
+    RUNS_ON_CONTROLLER = True
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ControllerAction, self).run(tmp, task_vars)
+        _log(dict(event='controller', host=task_vars.get('inventory_hostname'), args=self._task.args))
+        result['changed'] = False
+        result['msg'] = self._task.args.get('msg')
+        return result
+
+
+class ItemsLookup(LookupBase):
+    '''
+    The items lookup, which with_items loops over.
+    '''
+
+    def run(self, terms, variables=None, **kwargs):
+        return self._flatten(terms)
+
+
+class RecordingCallback(CallbackBase):
+    '''
+    A stdout callback keeping the task results it is given.
+    '''
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'stdout'
+    CALLBACK_NAME = 'recording'
+
+    def __init__(self):
+        super(RecordingCallback, self).__init__()
+        self.results = []
+        self.events = []
+        self.stats = None
+
+    def _record(self, status, result):
+        self.results.append((status, result._host.get_name(), result._task.get_name(), result._result))
+
+    def v2_runner_on_ok(self, result):
+        self._record('ok', result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record('failed', result)
+
+    def v2_runner_on_unreachable(self, result):
+        self._record('unreachable', result)
+
+    def v2_runner_on_skipped(self, result):
+        self._record('skipped', result)
+
+    def v2_runner_item_on_ok(self, result):
+        self._record('item_ok', result)
+
+    def v2_runner_item_on_failed(self, result):
+        self._record('item_failed', result)
+
+    def v2_runner_item_on_skipped(self, result):
+        self._record('item_skipped', result)
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self.events.append(('task_start', task.get_name()))
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.events.append(('handler_start', task.get_name()))
+
+    def v2_playbook_on_stats(self, stats):
+        self.stats = stats
+
+    def by_status(self, status, task=None):
+        return [r for r in self.results if r[0] == status and (task is None or r[2] == task)]
+
+    def hosts(self, status, task=None):
+        return sorted(r[1] for r in self.by_status(status, task))
+
+
+def _plugin_module(package, attrs):
+    module = types.ModuleType(package)
+    for (name, value) in attrs.items():
+        setattr(module, name, value)
+    sys.modules[package] = module
+    return module
+
+
+_installed = False
+
+
+def install():
+    '''
+    Registers the fake plugins with the plugin loaders (once).
+    '''
+
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    _plugin_module('ansiblite.plugins.connection.fake', dict(Connection=FakeConnection))
+    _plugin_module('ansiblite.plugins.action.normal', dict(ActionModule=FakeAction))
+    _plugin_module('ansiblite.plugins.action.batch', dict(ActionModule=BatchAction))
+    _plugin_module('ansiblite.plugins.action.async', dict(ActionModule=AsyncAction))
+    _plugin_module('ansiblite.plugins.action.on_controller', dict(ActionModule=ControllerAction))
+
+    # the tree does not find the modules, which tasks need to be loaded
+    def find_plugin(name, mod_type='', ignore_deprecated=False):
+        if name in FAKE_MODULES:
+            return name
+        return None
+    module_loader.find_plugin = find_plugin
+
+    _plugin_module('ansiblite.plugins.lookup.items', dict(LookupModule=ItemsLookup))
+
+    def find_lookup(name, mod_type='', ignore_deprecated=False):
+        if name in FAKE_LOOKUPS:
+            return name
+        return None
+    lookup_loader.find_plugin = find_lookup
@@ -0,0 +1,101 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansiblite.errors import AnsibleError, AnsibleUndefinedVariable
+from ansiblite.parsing.dataloader import DataLoader
+from ansiblite.playbook import conditional
+from ansiblite.playbook.conditional import Conditional
+from ansiblite.template import Templar
+from ansiblite.utils._text import to_text
+from ansiblite.vars.unsafe_proxy import wrap_var
+
+VARIABLES = dict(
+    x=1,
+    name='web',
+    groups=['wheel', 'adm'],
+    flag=True,
+    nested=u'x == 1',
+)
+
+
+@pytest.fixture
+def compiled(monkeypatch):
+    monkeypatch.setattr(conditional, '_compiled_conditionals', dict())
+    return conditional._compiled_conditionals
+
+
+def _check(when, **variables):
+    all_vars = dict(VARIABLES)
+    all_vars.update(variables)
+    loader = DataLoader()
+    templar = Templar(loader=loader, variables=all_vars)
+    # the conditionals are text once loaded from YAML
+    return Conditional(loader=loader)._check_conditional(to_text(when), templar, all_vars)
+
+
+@pytest.mark.parametrize('when, expected', [
+    ('x == 1', True),
+    ('x == 2', False),
+    ('name == "web" and x > 0', True),
+    ("'adm' in groups", True),
+    ('groups | length > 2', False),
+    ('flag', True),
+    ('not flag', False),
+    ('nested', True),
+    ('missing is defined', False),
+    ('missing is not defined', True),
+    ('missing is undefined and x == 1', True),
+    ('missing | default(false)', False),
+    ('', True),
+])
+def test_conditionals_evaluate_as_before(compiled, when, expected):
+    assert _check(when) is expected
+
+
+def test_compiled_conditionals_are_reused(compiled):
+    assert _check('x == 1')
+    assert len(compiled) == 1
+    code = list(compiled.values())[0]
+
+    # the variables the code is run against change, not the code
+    assert not _check('x == 1', x=2)
+    assert _check('x == 1', x=1)
+    assert list(compiled.values()) == [code]
+
+    assert not _check('x == 2')
+    assert len(compiled) == 2
+
+
+def test_cache_is_bounded(compiled, monkeypatch):
+    monkeypatch.setattr(conditional.C, 'DEFAULT_TEMPLATE_CACHE_SIZE', 2)
+    for i in range(5):
+        assert _check('x == %d' % i) is (i == 1)
+        assert len(compiled) <= 2
+
+    monkeypatch.setattr(conditional.C, 'DEFAULT_TEMPLATE_CACHE_SIZE', 0)
+    compiled.clear()
+    assert _check('x == 1')
+    assert compiled == {}
+
+
+def test_unsafe_conditionals_are_compiled_apart(compiled):
+    assert _check('x == 1')
+    assert _check(wrap_var(u'x == 1'))
+    assert len(compiled) == 2
+
+
+def test_undefined_variables_still_fail(compiled):
+    with pytest.raises(AnsibleUndefinedVariable):
+        _check('missing == 1')
+    with pytest.raises(AnsibleUndefinedVariable):
+        _check('x == 1 and missing.attr')
+    # and do so again once the code is cached
+    with pytest.raises(AnsibleUndefinedVariable):
+        _check('missing == 1')
+
+
+def test_disallowed_constructs_are_still_refused(compiled):
+    with pytest.raises(AnsibleError):
+        _check(wrap_var(u'x.__class__("__init__")'))
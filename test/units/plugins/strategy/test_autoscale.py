@@ -0,0 +1,41 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansiblite.executor.process.autoscale import ForkAutoscaler
+
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: sleep=0.3
+'''
+
+ADAPTIVE = dict(DEFAULT_FORKS_ADAPTIVE=True, DEFAULT_FORKS_MIN=1, DEFAULT_FORKS_MAX=4)
+
+
+def test_waits_recorded_once_per_dispatch(monkeypatch):
+    waits = []
+    record_wait = ForkAutoscaler.record_wait
+
+    def _record_wait(self):
+        waits.append(1)
+        record_wait(self)
+    monkeypatch.setattr(ForkAutoscaler, 'record_wait', _record_wait)
+
+    # waking up many times while waiting for the only worker
+    settings = dict(ADAPTIVE, DEFAULT_FORKS_ADJUST_INTERVAL=1000, DEFAULT_INTERNAL_WAIT_TIMEOUT=0.02)
+    run = run_play(PLAYBOOK, forks=1, settings=settings)
+
+    assert run.rc == 0
+    assert len(waits) == run.callback.stats.dispatch['waits'] == 2
+
+
+def test_waits_grow_the_limit():
+    settings = dict(ADAPTIVE, DEFAULT_FORKS_ADJUST_INTERVAL=0.1, DEFAULT_FORKS_MAX_LOAD=1000.0)
+    run = run_play(PLAYBOOK, hosts=['h%d' % i for i in range(8)], forks=1, settings=settings)
+
+    assert run.rc == 0
+    dispatch = run.callback.stats.dispatch
+    assert dispatch['max_forks'] > 1
@@ -0,0 +1,47 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from units.mock.play import run_play
+
+SETTINGS = dict(DEFAULT_COALESCE_DELEGATED=True)
+
+
+def _delegated(extra=''):
+    return '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - name: delegated
+      fake: msg=hi
+      delegate_to: h1
+%s
+''' % extra
+
+
+def test_delegated_task_run_once_for_all_hosts():
+    run = run_play(_delegated(), settings=SETTINGS)
+
+    assert run.rc == 0
+    assert len(run.execs()) == 1
+    assert run.callback.hosts('ok', 'delegated') == ['h1', 'h2', 'h3']
+
+
+def test_not_coalesced_unless_turned_on():
+    run = run_play(_delegated())
+
+    assert len(run.execs()) == 3
+
+
+@pytest.mark.parametrize('setting', [
+    'port: "{{ 22 if inventory_hostname == \'h1\' else 2222 }}"',
+    'become_flags: "{{ \'-H\' if inventory_hostname == \'h1\' else \'-E\' }}"',
+    'delegate_facts: "{{ inventory_hostname == \'h1\' }}"',
+])
+def test_hosts_with_other_settings_run_apart(setting):
+    run = run_play(_delegated('      ' + setting), settings=SETTINGS)
+
+    assert run.rc == 0
+    assert len(run.execs()) == 2
+    assert run.callback.hosts('ok', 'delegated') == ['h1', 'h2', 'h3']
@@ -0,0 +1,41 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - on_controller: msg={{ inventory_hostname }}
+    - fake: msg=remote
+'''
+
+
+def _controller_runs(run):
+    return [r for r in run.log if r['event'] == 'controller']
+
+
+def test_connection_free_actions_run_in_the_controller():
+    run = run_play(PLAYBOOK)
+
+    assert run.rc == 0
+    runs = _controller_runs(run)
+    assert sorted(r['host'] for r in runs) == ['h1', 'h2', 'h3']
+    assert set(r['pid'] for r in runs) == set([os.getpid()])
+    assert sorted(r[3]['msg'] for r in run.callback.by_status('ok', 'on_controller')) == ['h1', 'h2', 'h3']
+
+    # the other tasks still go to the workers
+    assert len(run.execs()) == 3
+    assert os.getpid() not in set(r['pid'] for r in run.execs())
+
+
+def test_controller_threads_turned_off():
+    run = run_play(PLAYBOOK, settings=dict(DEFAULT_CONTROLLER_THREADS=0))
+
+    assert run.rc == 0
+    runs = _controller_runs(run)
+    assert len(runs) == 3
+    assert os.getpid() not in set(r['pid'] for r in runs)
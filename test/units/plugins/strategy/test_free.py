@@ -0,0 +1,58 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from units.mock.play import run_play
+
+
+def _execs(run, msg, host=None):
+    return [r for r in run.execs(host) if '"msg": "%s"' % msg in r['cmd']]
+
+
+def test_fast_hosts_do_not_wait_for_slow_ones():
+    run = run_play('''
+- hosts: all
+  strategy: free
+  gather_facts: no
+  tasks:
+    - fake: msg=first sleep={{ 1 if inventory_hostname == 'h1' else 0 }}
+    - fake: msg=second
+    - fake: msg=third
+''', forks=3)
+
+    assert run.rc == 0
+    slow_done = _execs(run, 'first', 'h1')[0]['time'] + 1
+    for host in ('h2', 'h3'):
+        assert _execs(run, 'third', host)[0]['time'] < slow_done
+    assert len(run.execs()) == 9
+
+
+def test_handlers_flushed_per_host():
+    run = run_play('''
+- hosts: all
+  strategy: free
+  gather_facts: no
+  tasks:
+    - fake: msg=change changed={{ inventory_hostname != 'h3' }}
+      notify: restart
+    - fake: msg=slow sleep={{ 1 if inventory_hostname == 'h2' else 0 }}
+    - meta: flush_handlers
+    - fake: msg=after
+  handlers:
+    - name: restart
+      fake: msg=restarted
+''', forks=3)
+
+    assert run.rc == 0
+    assert sorted(r['host'] for r in _execs(run, 'restarted')) == ['h1', 'h2']
+    assert sorted(r['host'] for r in _execs(run, 'after')) == ['h1', 'h2', 'h3']
+
+    # h1 flushed its handlers and went on while h2 was still busy
+    slow_done = _execs(run, 'slow', 'h2')[0]['time'] + 1
+    assert _execs(run, 'restarted', 'h1')[0]['time'] < slow_done
+    assert _execs(run, 'after', 'h1')[0]['time'] < slow_done
+    assert _execs(run, 'after', 'h3')[0]['time'] < slow_done
+    # h2 ran its handler before its next task
+    assert _execs(run, 'restarted', 'h2')[0]['time'] < _execs(run, 'after', 'h2')[0]['time']
+
+    # and the handler did not run again at the end of the play
+    assert len([e for e in run.callback.events if e[0] == 'handler_start']) == 2
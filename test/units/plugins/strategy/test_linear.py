@@ -0,0 +1,71 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from units.mock.play import run_play
+
+
+def _task_of(record):
+    return record['cmd'].split('"msg": "')[1].split('"')[0]
+
+
+def test_hosts_run_in_lock_step():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: msg=one sleep={{ 0.3 if inventory_hostname == 'h1' else 0 }}
+    - fake: msg=two
+    - fake: msg=three
+''', forks=3)
+
+    assert run.rc == 0
+    order = [_task_of(r) for r in run.execs()]
+    assert order == ['one'] * 3 + ['two'] * 3 + ['three'] * 3
+
+
+def test_blocks_conditionals_and_run_once():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - block:
+        - fake: msg=try fail={{ inventory_hostname == 'h2' }}
+        - fake: msg=tried
+      rescue:
+        - fake: msg=rescued
+    - fake: msg=skipped
+      when: inventory_hostname == 'h3'
+    - fake: msg=once
+      run_once: yes
+''')
+
+    assert run.rc == 0
+    by_task = dict()
+    for r in run.execs():
+        by_task.setdefault(_task_of(r), []).append(r['host'])
+    assert sorted(by_task['try']) == ['h1', 'h2', 'h3']
+    assert sorted(by_task['tried']) == ['h1', 'h3']
+    assert by_task['rescued'] == ['h2']
+    assert by_task['skipped'] == ['h3']
+    assert len(by_task['once']) == 1
+    assert run.callback.hosts('skipped') == ['h1', 'h2']
+
+
+def test_handlers_run_for_notified_hosts():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: msg=change changed={{ inventory_hostname != 'h1' }}
+      notify: restart
+    - fake: msg=last
+  handlers:
+    - name: restart
+      fake: msg=restarted
+''')
+
+    assert run.rc == 0
+    assert sorted(r['host'] for r in run.execs() if _task_of(r) == 'restarted') == ['h2', 'h3']
+    # after all the tasks
+    assert [_task_of(r) for r in run.execs()][-2:] == ['restarted', 'restarted']
+    assert ('handler_start', 'restart') in run.callback.events
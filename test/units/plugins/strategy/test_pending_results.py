@@ -0,0 +1,50 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import time
+
+from units.mock.play import run_play
+
+PLAYBOOK = '''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: sleep=0.2
+    - fake: msg=one
+    - fake: msg=two
+'''
+
+
+def test_results_wake_up_the_strategy():
+    # were the strategy only woken up by its wait timing out, each task
+    # would take that long
+    start = time.time()
+    run = run_play(PLAYBOOK, forks=1, settings=dict(DEFAULT_INTERNAL_WAIT_TIMEOUT=30))
+    elapsed = time.time() - start
+
+    assert run.rc == 0
+    assert len(run.callback.by_status('ok')) == 9
+    assert elapsed < 15
+
+
+def test_all_results_are_processed():
+    run = run_play(PLAYBOOK, hosts=['h%d' % i for i in range(12)], forks=4)
+
+    assert run.rc == 0
+    assert len(run.callback.by_status('ok')) == 36
+    assert run.callback.stats.ok == dict(('h%d' % i, 3) for i in range(12))
+
+
+def test_results_are_processed_in_arrival_order():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - name: loop
+      fake: msg={{ item }}
+      with_items: [a, b, c, d, e, f]
+''', hosts=('h1',))
+
+    assert run.rc == 0
+    results = [(status, result.get('item')) for (status, host, task, result) in run.callback.results]
+    assert results == [('item_ok', item) for item in 'abcdef'] + [('ok', None)]
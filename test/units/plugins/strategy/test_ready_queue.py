@@ -0,0 +1,41 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from units.mock.play import run_play
+
+
+def test_dispatch_stats():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: sleep=0.1
+    - fake: msg=two
+''', hosts=['h%d' % i for i in range(4)], forks=2)
+
+    assert run.rc == 0
+    dispatch = run.callback.stats.dispatch
+    assert dispatch['dispatched'] == 8
+    # two hosts at a time for four hosts
+    assert dispatch['waits'] >= 2
+    assert dispatch['wait_time'] > 0
+    assert dispatch['min_ready'] == 0
+    assert dispatch['reaped'] == 0
+
+
+def test_dead_workers_are_reaped():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  tasks:
+    - fake: die={{ inventory_hostname == 'h2' }}
+    - fake: msg=after
+''', forks=1, settings=dict(DEFAULT_INTERNAL_WAIT_TIMEOUT=0.2))
+
+    assert run.rc != 0
+    failed = run.callback.by_status('failed')
+    assert [r[1] for r in failed] == ['h2']
+    assert 'exited unexpectedly' in failed[0][3]['msg']
+    assert run.callback.stats.dispatch['reaped'] == 1
+    # a new worker took over
+    assert sorted(r['host'] for r in run.execs() if 'after' in r['cmd']) == ['h1', 'h3']
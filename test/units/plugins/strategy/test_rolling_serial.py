@@ -0,0 +1,58 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from units.mock.play import run_play
+
+HOSTS = ('h1', 'h2', 'h3', 'h4')
+
+
+def _task_of(record):
+    return record['cmd'].split('"msg": "')[1].split('"')[0]
+
+
+def _order(run):
+    return [(r['host'], _task_of(r)) for r in run.execs()]
+
+
+def test_new_hosts_do_not_hold_back_running_ones():
+    # h1 fails right away, which lets h3 in while h2 is still running
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  serial: 2
+  tasks:
+    - fake: msg=one fail={{ inventory_hostname == 'h1' }}
+    - block:
+        - fake: msg=two
+    - block:
+        - fake: msg=three
+''', hosts=HOSTS, settings=dict(DEFAULT_ROLLING_SERIAL=True))
+
+    order = _order(run)
+    assert sorted(h for (h, t) in order if t == 'three') == ['h2', 'h3', 'h4']
+    # h2 goes on with its blocks while h3 runs the first one
+    assert order.index(('h2', 'three')) < order.index(('h3', 'two'))
+
+
+def test_handlers_are_flushed_per_batch():
+    run = run_play('''
+- hosts: all
+  gather_facts: no
+  serial: 2
+  tasks:
+    - fake: msg=change changed=yes fail={{ inventory_hostname == 'h1' }}
+      notify: restart
+    - fake: msg=two
+    - fake: msg=three
+    - meta: flush_handlers
+  handlers:
+    - name: restart
+      fake: msg=restart
+''', hosts=HOSTS, settings=dict(DEFAULT_ROLLING_SERIAL=True))
+
+    order = _order(run)
+    assert sorted(h for (h, t) in order if t == 'restart') == ['h2', 'h3', 'h4']
+    # the flush of h2's batch leaves the handlers h3 was notified of to the
+    # flush of its own batch
+    assert order.index(('h3', 'three')) < order.index(('h3', 'restart'))
+    assert order.index(('h4', 'three')) < order.index(('h4', 'restart'))
@@ -0,0 +1,134 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+
+import pytest
+
+from ansiblite.parsing.dataloader import DataLoader
+from ansiblite.template import Templar
+from ansiblite.template import cache
+from ansiblite.template.cache import CompiledTemplateCache, TemplateBytecodeCache
+
+# long enough for its code to be kept on disk
+SOURCE = 'x is {{ x }}' + ' ' * 256
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmpdir):
+    directory = str(tmpdir.join('jinja2_cache'))
+    monkeypatch.setattr(cache, '_bytecode_cache', None)
+    monkeypatch.setattr(cache.C, 'DEFAULT_TEMPLATE_BYTECODE_CACHE', directory)
+    monkeypatch.setattr(cache.C, 'DEFAULT_TEMPLATE_BYTECODE_CACHE_SIZE', 1)
+    return directory
+
+
+def _cache_files(directory):
+    return sorted(n for n in os.listdir(directory) if n.startswith('__ansible_jinja2_'))
+
+
+def _environment():
+    environment = Templar(loader=DataLoader()).environment
+    compiled = []
+    compile = environment.compile
+
+    def counting_compile(source, *args, **kwargs):
+        compiled.append(source)
+        return compile(source, *args, **kwargs)
+    environment.compile = counting_compile
+    return (environment, compiled)
+
+
+def test_code_is_read_back_from_disk(cache_dir):
+    (environment, compiled) = _environment()
+    CompiledTemplateCache(8).compile(environment, SOURCE)
+    assert len(compiled) == 1
+    assert len(_cache_files(cache_dir)) == 1
+
+    # another process, with a cache of its own
+    (environment, compiled) = _environment()
+    assert CompiledTemplateCache(8).compile(environment, SOURCE) is not None
+    assert compiled == []
+
+
+def test_short_sources_are_not_kept_on_disk(cache_dir):
+    (environment, compiled) = _environment()
+    CompiledTemplateCache(8).compile(environment, 'x is {{ x }}')
+    assert not os.path.exists(cache_dir) or _cache_files(cache_dir) == []
+
+
+def test_corrupted_files_are_compiled_again(cache_dir):
+    (environment, compiled) = _environment()
+    CompiledTemplateCache(8).compile(environment, SOURCE)
+    path = os.path.join(cache_dir, _cache_files(cache_dir)[0])
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+    (environment, compiled) = _environment()
+    CompiledTemplateCache(8).compile(environment, SOURCE)
+    assert len(compiled) == 1
+    with open(path, 'rb') as f:
+        assert f.read() == data
+
+
+def test_templates_render_through_the_disk_cache(cache_dir, monkeypatch):
+    monkeypatch.setattr('ansiblite.template.compiled_templates', CompiledTemplateCache(8))
+    templar = Templar(loader=DataLoader(), variables=dict(x=1))
+    assert templar.template(SOURCE) == SOURCE.replace('{{ x }}', '1')
+    assert len(_cache_files(cache_dir)) == 1
+
+    monkeypatch.setattr('ansiblite.template.compiled_templates', CompiledTemplateCache(8))
+    templar = Templar(loader=DataLoader(), variables=dict(x=2))
+    assert templar.template(SOURCE) == SOURCE.replace('{{ x }}', '2')
+
+
+def test_each_template_has_a_file_of_its_own(cache_dir):
+    sources = ['%d is {{ x }}%s' % (i, ' ' * 256) for i in range(5)]
+    (environment, compiled) = _environment()
+    templates = CompiledTemplateCache(8)
+    for source in sources:
+        templates.compile(environment, source)
+    assert len(_cache_files(cache_dir)) == len(sources)
+
+    # another process reads them all back
+    (environment, compiled) = _environment()
+    templates = CompiledTemplateCache(8)
+    for source in sources:
+        templates.compile(environment, source)
+    assert compiled == []
+
+
+def test_least_recently_used_files_are_evicted(tmpdir):
+    directory = str(tmpdir)
+    (environment, compiled) = _environment()
+    sources = ['%d is {{ x }}%s' % (i, ' ' * 256) for i in range(10)]
+
+    def _bucket(i):
+        return bytecode_cache.get_bucket(environment, 'source %d' % i, None, sources[i])
+
+    # sized for four files and a half
+    bytecode_cache = TemplateBytecodeCache(directory, 1024 * 1024)
+    bucket = _bucket(0)
+    bucket.code = environment.compile(sources[0])
+    bytecode_cache.set_bucket(bucket)
+    path = bytecode_cache._get_cache_filename(bucket)
+    size = os.path.getsize(path)
+    os.unlink(path)
+    bytecode_cache.max_size = size * 4 + size // 2
+
+    for i in range(len(sources)):
+        bucket = _bucket(i)
+        assert bucket.code is None
+        bucket.code = environment.compile(sources[i])
+        bytecode_cache.set_bucket(bucket)
+        # the files written first are the oldest ones
+        os.utime(bytecode_cache._get_cache_filename(bucket), (i, i))
+
+        assert len(_cache_files(directory)) <= 4
+        total = sum(os.path.getsize(os.path.join(directory, n)) for n in _cache_files(directory))
+        assert total <= bytecode_cache.max_size
+
+    # the last sources written are still cached, the first ones are not
+    assert [_bucket(i).code is not None for i in range(len(sources))] == [False] * 6 + [True] * 4
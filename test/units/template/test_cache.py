@@ -0,0 +1,80 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansiblite.parsing.dataloader import DataLoader
+from ansiblite.template import Templar
+from ansiblite.template import cache
+from ansiblite.template.cache import CompiledTemplateCache, compile_key
+
+
+@pytest.fixture
+def compiled(monkeypatch):
+    monkeypatch.setattr(cache, '_bytecode_cache', None)
+    monkeypatch.setattr(cache.C, 'DEFAULT_TEMPLATE_BYTECODE_CACHE', None)
+    templates = CompiledTemplateCache(8)
+    monkeypatch.setattr('ansiblite.template.compiled_templates', templates)
+    return templates
+
+
+def _counting(environment):
+    compiled = []
+    compile = environment.compile
+
+    def counting_compile(source, *args, **kwargs):
+        compiled.append(source)
+        return compile(source, *args, **kwargs)
+    environment.compile = counting_compile
+    return compiled
+
+
+def test_templar_instances_share_the_compiled_code(compiled):
+    loader = DataLoader()
+    for (value, expected) in ((1, 'x is 1'), (2, 'x is 2'), (3, 'x is 3')):
+        templar = Templar(loader=loader, variables=dict(x=value))
+        assert templar.template('x is {{ x }}') == expected
+
+    assert compiled.stats() == dict(hits=2, misses=1, size=1, capacity=8)
+
+
+def test_least_recently_used_code_is_evicted():
+    environment = Templar(loader=DataLoader()).environment
+    compiled = _counting(environment)
+    templates = CompiledTemplateCache(2)
+
+    templates.compile(environment, 'a {{ x }}')
+    templates.compile(environment, 'b {{ x }}')
+    templates.compile(environment, 'a {{ x }}')
+    templates.compile(environment, 'c {{ x }}')
+    assert templates.stats()['size'] == 2
+
+    # 'b' was used last before 'c' came in, 'a' is still cached
+    templates.compile(environment, 'a {{ x }}')
+    templates.compile(environment, 'b {{ x }}')
+    assert compiled == ['a {{ x }}', 'b {{ x }}', 'c {{ x }}', 'b {{ x }}']
+    assert templates.stats()['hits'] == 2
+
+
+def test_no_capacity_turns_the_cache_off():
+    environment = Templar(loader=DataLoader()).environment
+    compiled = _counting(environment)
+    templates = CompiledTemplateCache(0)
+
+    for i in range(3):
+        templates.compile(environment, 'a {{ x }}')
+
+    assert len(compiled) == 3
+    assert templates.stats() == dict(hits=0, misses=0, size=0, capacity=0)
+
+
+def test_code_is_keyed_on_the_environment_options(compiled):
+    environment = Templar(loader=DataLoader()).environment
+    other = environment.overlay(variable_start_string='[[', variable_end_string=']]')
+    assert compile_key(environment, 'a') != compile_key(other, 'a')
+    assert compile_key(environment, 'a') == compile_key(environment.overlay(), 'a')
+
+    templar = Templar(loader=DataLoader(), variables=dict(x=1))
+    assert templar.template('x is {{ x }} [[ x ]]') == 'x is 1 [[ x ]]'
+    assert templar.template('#jinja2:variable_start_string:"[[",variable_end_string:"]]"\nx is {{ x }} [[ x ]]') == 'x is {{ x }} 1'
+    assert compiled.stats()['misses'] == 2
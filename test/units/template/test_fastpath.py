@@ -0,0 +1,116 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+from ansiblite.errors import AnsibleUndefinedVariable
+from ansiblite.parsing.dataloader import DataLoader
+from ansiblite.template import Templar
+from ansiblite.template import fastpath
+from ansiblite.template.cache import CompiledTemplateCache
+from ansiblite.template.fastpath import benchmark, compile_fast_expression
+from ansiblite.vars.unsafe_proxy import wrap_var
+
+VARIABLES = dict(
+    name='web',
+    port=8080,
+    user=dict(name='admin', groups=['wheel', 'adm']),
+    items=[1, 2, 3],
+    empty='',
+    nested='{{ name }}-01',
+    unsafe=wrap_var('{{ name }}'),
+)
+
+FAST = [
+    '{{ name }}',
+    '{{ port }}',
+    '{{ user.name }}',
+    "{{ user['groups'][0] }}",
+    '{{ user.groups | last }}',
+    '{{ items | length }}',
+    "{{ missing | default('none') }}",
+    '{{ empty | default(name, true) }}',
+    '{{ port | string }}',
+    '{{ nested }}',
+    '{{ unsafe }}',
+    '{{ user }}',
+    '{{ items }}',
+]
+
+FULL = [
+    'name is {{ name }}',
+    '{{ port + 1 }}',
+    '{{ name ~ port }}',
+    '{{- name }}',
+    '{{ user.groups | join(",") }}',
+    '{{ [name, port] }}',
+    '{{ name }} {{ port }}',
+    '{% if name %}x{% endif %}',
+]
+
+
+@pytest.fixture
+def compiled(monkeypatch):
+    templates = CompiledTemplateCache(64)
+    monkeypatch.setattr('ansiblite.template.compiled_templates', templates)
+    return templates
+
+
+def _templar():
+    return Templar(loader=DataLoader(), variables=VARIABLES)
+
+
+def _render(data, fast, monkeypatch):
+    monkeypatch.setattr(fastpath, 'enabled', fast)
+    res = _templar().template(data, cache=False)
+    return (res, type(res), hasattr(res, '__UNSAFE__'))
+
+
+def test_trivial_expressions_are_parsed():
+    environment = _templar().environment
+    for data in FAST:
+        assert compile_fast_expression(data, environment) is not None, data
+    for data in FULL:
+        assert compile_fast_expression(data, environment) is None, data
+
+
+@pytest.mark.parametrize('data', FAST + FULL)
+def test_fast_path_renders_as_jinja2(data, monkeypatch):
+    assert _render(data, True, monkeypatch) == _render(data, False, monkeypatch)
+
+
+def test_fast_path_skips_jinja2(compiled, monkeypatch):
+    monkeypatch.setattr(fastpath, 'enabled', True)
+    templar = _templar()
+    assert templar.template('{{ user.name | upper }}', cache=False) == 'ADMIN'
+    assert compiled.stats()['misses'] == 0
+
+    # unless the expression yields an undefined value
+    assert templar.template('{{ user.missing | default(port) }}', cache=False) == '8080'
+    assert compiled.stats()['misses'] == 0
+    with pytest.raises(AnsibleUndefinedVariable):
+        templar.template('{{ user.missing }}', cache=False)
+    assert compiled.stats()['misses'] == 1
+
+
+@pytest.mark.parametrize('data', ['{{ missing }}', '{{ user.missing }}', '{{ items[5] }}', '{{ missing | lower }}'])
+def test_undefined_variables_fail_as_before(data, monkeypatch):
+    errors = []
+    for fast in (True, False):
+        monkeypatch.setattr(fastpath, 'enabled', fast)
+        with pytest.raises(AnsibleUndefinedVariable) as e:
+            _templar().template(data, cache=False)
+        errors.append(str(e.value))
+    assert errors[0] == errors[1]
+
+
+def test_benchmark(monkeypatch):
+    monkeypatch.setattr(fastpath, 'enabled', True)
+    res = benchmark(_templar(), FAST + FULL + ['{{ missing }}'], rounds=2)
+
+    # the undefined variable is left out
+    assert res['strings'] == len(FAST + FULL)
+    assert res['fast'] == len(FAST)
+    assert res['full_usec'] > 0
+    assert res['fast_usec'] > 0
+    assert fastpath.enabled is True